@@ -0,0 +1,118 @@
+"""``approx_count_distinct`` against ``COUNT(DISTINCT ...)`` in Metrics.
+
+Seeds contacts over ``--days`` days with emails drawn from ``--visitors``
+distinct values and counts the distinct emails by day, by month and in total,
+with ``count`` + ``distinct`` and with ``approx_count_distinct`` (cold, then
+with the day sketches cached). Reports time and relative error; exits 1 when
+an error is above ``--tolerance``.
+
+    python benchmarks/bench_approx_distinct.py --rows 200000 --days 90
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone as dt_timezone
+import random
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import override_settings
+import pytz
+
+from easyapi.calc import APPROX, get_results
+from modules.bench.models import Contact
+import fakeredis
+
+GROUPS = [None, 'day', 'month']
+
+
+def seed(rows, days, visitors):
+    Contact.objects.all().delete()
+    random.seed(1)
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    seconds = days * 86400
+
+    Contact.objects.bulk_create([
+        Contact(
+            name='', email=f'user{random.randrange(visitors)}@example.com', status=i % 3,
+            created_at=start + timedelta(seconds=random.randrange(seconds)),
+        )
+        for i in range(rows)
+    ], batch_size=2000)
+
+
+def body(formula, group_by, days, distinct=False):
+    data = {
+        'model': 'bench_Contact',
+        'calc': {'formula': [formula], 'field': 'email'},
+        'distinct': distinct,
+        'filter_by': {'period': {
+            'field': 'created_at', 'start_date': '2024-01-01',
+            'end_date': (datetime(2024, 1, 1) + timedelta(days=days)).strftime('%Y-%m-%d'),
+        }},
+        'raw': True,
+    }
+    if group_by:
+        data['group_by'] = {'date': {'field': 'created_at', 'group_by': group_by, 'fill': False}}
+
+    return data
+
+
+def counts(results, formula):
+    if 'total' in results:
+        return {None: results['total']}
+
+    return {row['extracted_created_at']: row[formula] for row in results['data']}
+
+
+async def timed(timezone, data):
+    start = time.perf_counter()
+    results = await get_results(timezone, data, False)
+    return results, (time.perf_counter() - start) * 1000
+
+
+async def run(rows, days, visitors, tolerance):
+    await sync_to_async(seed)(rows, days, visitors)
+    timezone = pytz.timezone('America/Sao_Paulo')
+    print(f'{rows} rows, {visitors} visitors, {days} days')
+    print(f'{"group":<6} {"exact ms":>9} {"approx ms":>10} {"cached ms":>10} {"max error":>10}')
+
+    failed = False
+    for group_by in GROUPS:
+        exact, exact_ms = await timed(timezone, body('count', group_by, days, distinct=True))
+
+        fakeredis.STORE.clear()
+        approx, approx_ms = await timed(timezone, body(APPROX, group_by, days))
+        cached, cached_ms = await timed(timezone, body(APPROX, group_by, days))
+
+        exact = counts(exact, 'count')
+        approx = counts(approx, APPROX)
+        error = max(abs(approx[key] - value) / value for key, value in exact.items())
+        ok = approx.keys() == exact.keys() and approx == counts(cached, APPROX) and error <= tolerance
+        failed = failed or not ok
+
+        print(f'{group_by or "total":<6} {exact_ms:>9.1f} {approx_ms:>10.1f} {cached_ms:>10.1f} '
+              f'{error * 100:>9.2f}%{"" if ok else "  FAIL"}')
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--visitors', type=int, default=50000)
+    parser.add_argument('--tolerance', type=float, default=0.06)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    with override_settings(EASYAPI_METRICS_CACHE={'ttl': 60}):
+        if asyncio.run(run(args.rows, args.days, args.visitors, args.tolerance)):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
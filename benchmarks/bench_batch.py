@@ -0,0 +1,152 @@
+"""Many objects by id: detail GETs against ``?ids=`` and ``POST <resource>/batch``.
+
+Seeds tagged contacts and fetches ``--ids`` of them (plus two missing ids)
+with one detail GET per id, with ``GET /contacts?ids=`` and with
+``POST /contacts/batch``. Prints the queries and p50 of each and exits 1
+when the batch objects differ from the detail responses, come in another
+order or the missing ids are not reported, when ``?ids=`` and the list page
+share a cached body with ``cache = True``, when a custom ``batch`` route
+loses its POST or when malformed ``Metrics`` batch items are not answered
+with a 400 in their own slot.
+
+    python benchmarks/bench_batch.py --ids 50 --iterations 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from bench_m2m import Counter
+from bench_tags import SESSION, SESSION_ID, seed
+from easyapi.calc_resource import Metrics
+from easyapi.exception import HTTPException
+from easyapi.queries import query_observers
+from fakeredis import FakeRedis
+from resources import ContactResource
+
+factory = RequestFactory()
+factory.cookies['sid'] = SESSION_ID
+
+
+class DetailResource(ContactResource):
+    edit_related_fields = {'company': ['id', 'name']}
+    edit_set = {'tags': ['id', 'name']}
+
+
+class CachedResource(DetailResource):
+    cache = True
+
+
+class ImportResource(DetailResource):
+    routes = [{'path': r'/batch$', 'func': 'import_batch', 'allowed_methods': ['post']}]
+
+    async def import_batch(self, request, match=None, body=None):
+        return {'imported': len(body['contacts'])}
+
+
+async def details(view, ids):
+    objects = []
+    for id in ids:
+        try:
+            response = await view(factory.get(f'/contacts/{id}'))
+        except HTTPException:
+            continue
+        objects.append(json.loads(response.content))
+    return objects
+
+
+async def by_query(view, ids):
+    response = await view(factory.get('/contacts', {'ids': ','.join(map(str, ids))}))
+    return json.loads(response.content)
+
+
+async def by_body(view, ids):
+    response = await view(factory.post('/contacts/batch', json.dumps({'ids': ids}), content_type='application/json'))
+    return json.loads(response.content)
+
+
+async def measure(call, iterations):
+    latencies = []
+    for _ in range(iterations):
+        counter = Counter()
+        token = query_observers.set((counter,))
+        start = time.perf_counter()
+        result = await call()
+        latencies.append((time.perf_counter() - start) * 1000)
+        query_observers.reset(token)
+
+    return result, counter.queries, statistics.median(latencies)
+
+
+async def run(rows, count, iterations):
+    await FakeRedis().set(f'bench:sessions:{SESSION_ID}', json.dumps(SESSION))
+    await asyncio.to_thread(seed, rows, 20)
+
+    ids = random.Random(1).sample(range(1, rows + 1), count) + [rows + 1, rows + 2]
+    view = DetailResource.as_view()
+    print(f'{count} ids and 2 missing ones')
+    print(f'{"case":<10} {"queries":>8} {"p50 ms":>9}')
+
+    expected = None
+    failed = False
+    for name, call in [('details', details), ('?ids=', by_query), ('batch', by_body)]:
+        result, queries, p50 = await measure(lambda: call(view, ids), iterations)
+        print(f'{name:<10} {queries:>8} {p50:>9.2f}')
+
+        if expected is None:
+            expected = result
+        elif result['objects'] != expected or result['missing'] != ids[-2:]:
+            print(f'  {name} differs from the detail responses')
+            failed = True
+
+    # ?ids= e a listagem têm o mesmo path: com cache um não pode receber o corpo do outro
+    view = CachedResource.as_view()
+    for _ in range(2):
+        cached = await by_query(view, ids)
+        page = json.loads((await view(factory.get('/contacts'))).content)
+    if cached.get('objects') != expected or 'missing' in page:
+        print('  ?ids= and the list page share the cached body')
+        failed = True
+
+    # Uma rota personalizada em /batch continua recebendo o POST
+    response = await ImportResource.as_view()(
+        factory.post('/contacts/batch', json.dumps({'contacts': [{}, {}]}), content_type='application/json')
+    )
+    if json.loads(response.content) != {'imported': 2}:
+        print(f'  custom batch route got {response.content[:80]}')
+        failed = True
+
+    # Itens malformados de um batch de métricas respondem 400 no seu lugar
+    good = {'model': 'bench_Contact', 'calc': {'formula': ['count'], 'field': 'id'}}
+    items = [good, 'x', {'calc': {'formula': ['count']}}, {'model': 'bench_Contact', 'calc': []}, good]
+    response = await Metrics.as_view()(factory.post('/metrics', json.dumps(items), content_type='application/json'))
+    results = json.loads(response.content) if response.status_code == 200 else []
+    if [result.get('status') for result in results] != [None, 400, 400, 400, None] or results[0] != results[-1]:
+        print(f'  metrics batch with bad items got {response.status_code} {response.content[:80]}')
+        failed = True
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--ids', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.rows, args.ids, args.iterations)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Request coalescing: bursts of identical GETs and ``Metrics`` POSTs.
+
+Fires ``--concurrency`` identical requests at once (a list page, a detail and
+an hourly ``Metrics`` series) with and without ``coalesce``, then bursts
+mixing two list pages, two users (with and without ``coalesce_tenant``) and
+a cached list. Prints the queries and wall time of each burst and exits 1
+when a coalesced body differs from the uncoalesced one, the two pages get
+the same body, two users share a list by default or the cache is written
+more than once.
+
+    python benchmarks/bench_coalesce.py --concurrency 50 --rounds 10
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from bench_compression import METRICS
+from bench_m2m import Counter
+from bench_pipeline import SESSION, SESSION_ID, seed
+from easyapi.calc_resource import Metrics
+from easyapi.coalesce import counters
+from easyapi.queries import query_observers
+from fakeredis import FakeRedis
+from resources import ContactResource
+
+OTHER_ID = 'benchmark-other'
+
+factory = RequestFactory()
+
+
+class CoalescedResource(ContactResource):
+    coalesce = True
+
+
+class TenantResource(CoalescedResource):
+    coalesce_tenant = True
+
+
+class CachedResource(CoalescedResource):
+    cache = True
+    compression = True
+
+
+class CoalescedMetrics(Metrics):
+    coalesce = True
+
+
+class Writes:
+    """Counts the cache transactions of ``FakeRedis``."""
+
+    def __init__(self):
+        self.count = 0
+        self.pipeline = FakeRedis.pipeline
+
+    def __enter__(self):
+        def pipeline(redis, *args, **kwargs):
+            self.count += 1
+            return self.pipeline(redis, *args, **kwargs)
+        FakeRedis.pipeline = pipeline
+        return self
+
+    def __exit__(self, *args):
+        FakeRedis.pipeline = self.pipeline
+
+
+def request(path, params=None, body=None, session=SESSION_ID):
+    factory.cookies['sid'] = session
+    if body is None:
+        return factory.get(path, params or {})
+    return factory.post(path, json.dumps(body), content_type='application/json')
+
+
+async def burst(view, requests, rounds):
+    """Queries of one burst and p50 of its wall time."""
+    latencies = []
+    for _ in range(rounds):
+        counter = Counter()
+        token = query_observers.set((counter,))
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(view(request(*args)) for args in requests))
+        latencies.append((time.perf_counter() - start) * 1000)
+        query_observers.reset(token)
+
+    return [response.content for response in responses], counter.queries, statistics.median(latencies)
+
+
+async def run(concurrency, rounds):
+    await FakeRedis().set(f'bench:sessions:{SESSION_ID}', json.dumps(SESSION))
+    other = {**SESSION, 'user': {**SESSION['user'], 'id': 2}}
+    await FakeRedis().set(f'bench:sessions:{OTHER_ID}', json.dumps(other))
+    await asyncio.to_thread(seed, 5000)
+
+    print(f'{concurrency} concurrent requests per burst')
+    print(f'{"case":<22} {"queries":>8} {"p50 ms":>9}')
+    failed = False
+
+    cases = [
+        ('list', ContactResource, CoalescedResource, ('/contacts', {'limit': '100'})),
+        ('detail', ContactResource, CoalescedResource, ('/contacts/10',)),
+        ('metrics', Metrics, CoalescedMetrics, ('/metrics', None, METRICS)),
+    ]
+    for name, plain, coalesced, args in cases:
+        expected = None
+        for label, resource in [(name, plain), (f'{name} coalesced', coalesced)]:
+            bodies, queries, p50 = await burst(resource.as_view(), [args] * concurrency, rounds)
+            print(f'{label:<22} {queries:>8} {p50:>9.2f}')
+
+            expected = expected or bodies[0]
+            if any(body != expected for body in bodies):
+                print(f'  {label}: bodies differ')
+                failed = True
+
+    # Páginas diferentes não podem dividir a resposta
+    pages = [('/contacts', {'limit': '10', 'page': str(i % 2 + 1)}) for i in range(concurrency)]
+    bodies, queries, p50 = await burst(CoalescedResource.as_view(), pages, rounds)
+    print(f'{"two pages coalesced":<22} {queries:>8} {p50:>9.2f}')
+    if bodies[0] == bodies[1] or bodies[0::2] != [bodies[0]] * len(bodies[0::2]):
+        print('  two pages: wrong bodies')
+        failed = True
+
+    # Por padrão cada usuário tem a sua resposta
+    users = [('/contacts', {'limit': '10'}, None, [SESSION_ID, OTHER_ID][i % 2]) for i in range(concurrency)]
+    for label, resource, expected in [('two users', CoalescedResource, 2), ('two users tenant', TenantResource, 1)]:
+        _, queries, p50 = await burst(resource.as_view(), users, 1)
+        print(f'{label:<22} {queries:>8} {p50:>9.2f}')
+        if queries != expected:
+            print(f'  {label}: expected {expected} queries')
+            failed = True
+
+    # Só a primeira requisição grava o cache
+    with Writes() as writes:
+        await burst(CachedResource.as_view(), [('/contacts', {'limit': '200'})] * concurrency, 1)
+    print(f'{"cached list coalesced":<22} {writes.count:>8} cache writes')
+    if writes.count != 1:
+        failed = True
+
+    print(f'leaders {counters["leader"]}, followers {counters["follower"]}')
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=10)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.concurrency, args.rounds)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Response compression of large list pages and ``Metrics`` series.
+
+Lists pages of ``--limit`` contacts and an hourly ``Metrics`` series with
+and without ``compression``, and a cached list (miss, hit with the compressed
+body, hit with the plain body only). Prints the bytes and p50 of each and
+exits 1 when a decompressed body differs from the uncompressed one or a
+compressed body outlives the plain one it was made from.
+Only the installed encodings are tried: gzip always, br and zstd with
+``brotli``/``zstandard``.
+
+    python benchmarks/bench_compression.py --limit 500 --iterations 30
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import statistics
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from bench_pipeline import SESSION, SESSION_ID, seed
+from easyapi.calc_resource import Metrics
+from easyapi.compression import available
+from easyapi.util import optional_import
+from fakeredis import STORE, FakeRedis
+from modules.bench.models import Contact
+from resources import ContactResource
+
+factory = RequestFactory()
+factory.cookies['sid'] = SESSION_ID
+
+METRICS = {
+    'model': 'bench_Contact',
+    'calc': {'formula': ['count', 'sum'], 'field': 'amount'},
+    'group_by': {'date': {'field': 'created_at', 'group_by': 'hour'}, 'fields': ['status']},
+    'filter_by': {'period': {'field': 'created_at', 'operator': 'last_30_days'}},
+}
+
+
+class CompressedResource(ContactResource):
+    compression = True
+
+
+class CachedResource(CompressedResource):
+    cache = True
+
+
+class CompressedMetrics(Metrics):
+    compression = True
+
+
+def decompress(content, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(content)
+    if encoding == 'br':
+        return optional_import('brotli').decompress(content)
+    if encoding == 'zstd':
+        return optional_import('zstandard').ZstdDecompressor().decompress(content)
+    return content
+
+
+def request(path, params, encoding, body=None):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    if body is None:
+        return factory.get(path, params, headers=headers)
+    return factory.post(path, json.dumps(body), content_type='application/json', headers=headers)
+
+
+async def measure(view, make_request, iterations, before=None):
+    latencies = []
+    for _ in range(iterations):
+        if before:
+            before()
+        start = time.perf_counter()
+        response = await view(make_request())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return response, statistics.median(latencies)
+
+
+async def run(limit, iterations):
+    await FakeRedis().set(f'bench:sessions:{SESSION_ID}', json.dumps(SESSION))
+    await asyncio.to_thread(seed, 5000)
+
+    print(f'encodings available: {", ".join(available())}')
+    print(f'{"case":<30} {"encoding":<9} {"bytes":>8} {"p50 ms":>8}')
+    failed = False
+
+    def clear_cache():
+        for key in [key for key in STORE if ':cache:' in key]:
+            del STORE[key]
+
+    def drop_encoded():
+        suffixes = tuple(f':{encoding}' for encoding in available())
+        for key in [key for key in STORE if ':cache:' in key and key.endswith(suffixes)]:
+            del STORE[key]
+
+    cases = [
+        ('list', ContactResource, '/contacts', {'limit': str(limit)}, None, None),
+        ('metrics', Metrics, '/metrics', {}, METRICS, None),
+    ]
+    for encoding in available():
+        cases += [
+            ('list', CompressedResource, '/contacts', {'limit': str(limit)}, None, encoding),
+            ('metrics', CompressedMetrics, '/metrics', {}, METRICS, encoding),
+            ('cached list miss', CachedResource, '/contacts', {'limit': str(limit)}, None, encoding),
+            ('cached list encoded hit', CachedResource, '/contacts', {'limit': str(limit)}, None, encoding),
+            ('cached list plain hit', CachedResource, '/contacts', {'limit': str(limit)}, None, encoding),
+        ]
+
+    plain = {}
+    for name, resource, path, params, body, encoding in cases:
+        before = {'cached list miss': clear_cache, 'cached list plain hit': drop_encoded}.get(name)
+
+        response, p50 = await measure(
+            resource.as_view(), lambda: request(path, params, encoding, body), iterations, before
+        )
+        used = response.headers.get('Content-Encoding')
+        print(f'{name:<30} {used or "identity":<9} {len(response.content):>8} {p50:>8.2f}')
+
+        content = decompress(response.content, used)
+        kind = 'metrics' if name == 'metrics' else 'list'
+        plain.setdefault(kind, content)
+        if used != encoding or content != plain[kind]:
+            print(f'  {name} {encoding}: wrong body or encoding')
+            failed = True
+
+    # Corpo recalculado por um cliente sem compressão: o comprimido antigo não pode voltar
+    view = CachedResource.as_view()
+    for encoding in available():
+        clear_cache()
+        await view(request('/contacts', {'limit': '50'}, encoding))
+        for key in [key for key in STORE if ':cache:' in key and not key.endswith(f':{encoding}')]:
+            del STORE[key]
+        await Contact.objects.filter(pk=1).aupdate(name=f'Changed {encoding}')
+        await view(request('/contacts', {'limit': '50'}, None))
+
+        response = await view(request('/contacts', {'limit': '50'}, encoding))
+        used = response.headers.get('Content-Encoding')
+        body = json.loads(decompress(response.content, used))
+        if used != encoding or body['objects'][0]['name'] != f'Changed {encoding}':
+            print(f'  stale {encoding} body after the plain one was recomputed')
+            failed = True
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.limit, args.iterations)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Conditional GETs: 304 against full responses for polling clients.
+
+Seeds tagged contacts and polls a detail with ``etag_field = 'updated_at'``,
+one with an integer ``etag_field = 'version'`` and a list page with
+``conditional = True``, first without validators, then with the
+``If-None-Match`` of the first answer and with ``If-Modified-Since``. After a
+PATCH, of a field or of the company, the old ETag must get the new body. Prints the status, body
+size, queries and p50 of each and exits 1 when a status is not the expected.
+
+    python benchmarks/bench_conditional.py --iterations 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from django.core.management import call_command
+from django.db.models import F
+from django.test import RequestFactory
+
+from bench_batch import DetailResource
+from bench_m2m import Counter
+from bench_tags import SESSION, SESSION_ID, seed
+from easyapi.queries import query_observers
+from fakeredis import FakeRedis
+from modules.bench.models import Contact
+
+factory = RequestFactory()
+factory.cookies['sid'] = SESSION_ID
+
+
+class VersionedResource(DetailResource):
+    etag_field = 'updated_at'
+    list_m2m_fields = {'tags': ['id', 'name']}
+
+
+class CounterResource(VersionedResource):
+    etag_field = 'version'
+
+
+class HashedResource(VersionedResource):
+    conditional = True
+    etag_field = None
+
+
+async def measure(view, path, headers, iterations):
+    latencies = []
+    for _ in range(iterations):
+        counter = Counter()
+        token = query_observers.set((counter,))
+        start = time.perf_counter()
+        response = await view(factory.get(path, {'limit': '100'}, headers=headers))
+        latencies.append((time.perf_counter() - start) * 1000)
+        query_observers.reset(token)
+
+    return response, counter.queries, statistics.median(latencies)
+
+
+async def run(iterations):
+    await FakeRedis().set(f'bench:sessions:{SESSION_ID}', json.dumps(SESSION))
+    await asyncio.to_thread(seed, 5000, 20)
+
+    print(f'{"case":<34} {"status":>6} {"bytes":>7} {"queries":>8} {"p50 ms":>8}')
+    failed = False
+
+    async def case(name, view, path, headers, expected):
+        nonlocal failed
+        response, queries, p50 = await measure(view, path, headers, iterations)
+        print(f'{name:<34} {response.status_code:>6} {len(response.content):>7} {queries:>8} {p50:>8.2f}')
+        if response.status_code != expected:
+            print(f'  expected {expected}')
+            failed = True
+        return response
+
+    for label, resource, path in [
+        ('detail updated_at', VersionedResource, '/contacts/10'),
+        ('detail version', CounterResource, '/contacts/10'),
+        ('detail body hash', HashedResource, '/contacts/10'),
+        ('list body hash', HashedResource, '/contacts'),
+    ]:
+        view = resource.as_view()
+        first = await case(f'{label}', view, path, {}, 200)
+        etag = first.headers['ETag']
+        await case(f'{label} If-None-Match', view, path, {'If-None-Match': etag}, 304)
+        if 'Last-Modified' in first.headers:
+            await case(
+                f'{label} If-Modified-Since', view, path, {'If-Modified-Since': first.headers['Last-Modified']}, 304
+            )
+
+        # Depois da alteração o ETag antigo não vale mais
+        await view(factory.patch('/contacts/10', json.dumps({'name': f'Changed {label}'}), content_type='application/json'))
+        await case(f'{label} after patch', view, path, {'If-None-Match': etag}, 200)
+
+    # Trocar a empresa muda o detalhe, mesmo sem tocar no etag_field
+    view = VersionedResource.as_view()
+    etag = (await view(factory.get('/contacts/10'))).headers['ETag']
+    await Contact.objects.filter(pk=10).aupdate(company_id=F('company_id') % 20 + 1)
+    await case('detail after company change', view, '/contacts/10', {'If-None-Match': etag}, 200)
+
+    try:
+        type('TagsVersion', (DetailResource,), {'etag_field': 'tags'})
+        print('  etag_field on a many to many was accepted')
+        failed = True
+    except ValueError:
+        pass
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.iterations)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
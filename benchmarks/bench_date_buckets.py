@@ -0,0 +1,165 @@
+"""Date grouped Metrics across daylight saving time changes.
+
+Seeds one contact every ``--step`` minutes through a year and groups them by
+hour, day, week day, month, quarter and year in timezones with DST changes,
+with a period and, by hour, without one. Every bucket is checked against
+pandas ``tz_convert`` labels and the hours around each spring forward and fall
+back are checked one by one; exits 1 on a wrong bucket or when the offset CASE
+of a query without period keeps transitions outside the data. Also counts how
+many rows the old single offset (``utcnow()``) bucketing, applied twice by
+``CONVERT_TZ``, put in the wrong bucket.
+
+    python benchmarks/bench_date_buckets.py --zones America/New_York,Europe/London
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone as dt_timezone
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+import pandas as pd
+import pytz
+
+from easyapi.calc import get_results, offset_table
+from easyapi.queries import query_observers
+from modules.bench.models import Contact
+
+GROUPS = {
+    'hour': '%Y-%m-%d %H',
+    'day': '%Y-%m-%d',
+    'weekday': '%A',
+    'month': '%Y-%m',
+    'quarter': None,
+    'year': '%Y',
+}
+
+
+def seed(year, step):
+    Contact.objects.all().delete()
+    start = datetime(year, 1, 1, tzinfo=dt_timezone.utc)
+    end = datetime(year + 1, 1, 1, tzinfo=dt_timezone.utc)
+
+    dates = []
+    current = start
+    while current < end:
+        dates.append(current)
+        current += timedelta(minutes=step)
+
+    Contact.objects.bulk_create([
+        Contact(name='', email='', status=i % 3, amount=1, created_at=date)
+        for i, date in enumerate(dates)
+    ], batch_size=2000)
+
+    return pd.Series(pd.to_datetime(dates, utc=True))
+
+
+def labels(dates, group_by):
+    if group_by == 'quarter':
+        return dates.dt.year.astype(str) + ' ' + dates.dt.quarter.astype(str) + 'Q'
+
+    return dates.dt.strftime(GROUPS[group_by])
+
+
+def expected(dates, zone, group_by):
+    return labels(dates.dt.tz_convert(zone), group_by).value_counts().to_dict()
+
+
+def old_labels(dates, zone, group_by):
+    # Offset de agora somado à data e convertido de novo pelo CONVERT_TZ
+    offset = pytz.timezone(zone).utcoffset(datetime.utcnow())
+    return labels((dates + offset).dt.tz_convert(zone), group_by)
+
+
+class Whens:
+    """Most ``WHEN``s in one SQL statement, the size of the offset CASE."""
+
+    def __init__(self):
+        self.count = 0
+
+    def add_query(self, sql, elapsed, alias):
+        self.count = max(self.count, sql.count(' WHEN '))
+
+
+def transition_hours(zone, year):
+    """Local hour labels around each offset change of ``zone`` in ``year``."""
+    table = offset_table(zone, datetime(year, 1, 1), datetime(year + 1, 1, 1))
+    instants = pd.Series(pd.to_datetime([since for since, _ in table[1:]], utc=True))
+    hours = [instants + pd.Timedelta(hours=delta) for delta in (-1, 0, 1)]
+    return set().union(*[labels(hour.dt.tz_convert(zone), 'hour') for hour in hours])
+
+
+async def run(zones, year, step):
+    dates = await sync_to_async(seed)(year, step)
+    print(f'{len(dates)} rows in {year}')
+    print(f'{"zone":<22} {"group":<10} {"buckets":>8} {"ms":>8} {"old wrong rows":>15}')
+
+    failed = False
+    for zone in zones:
+        timezone = pytz.timezone(zone)
+        period = {'field': 'created_at', 'start_date': f'{year}-01-01', 'end_date': f'{year + 1}-01-01'}
+        for group_by, name in [*[(group_by, group_by) for group_by in GROUPS], ('hour', 'hour all')]:
+            body = {
+                'model': 'bench_Contact',
+                'calc': {'formula': ['count'], 'field': 'id'},
+                'group_by': {'date': {'field': 'created_at', 'group_by': group_by, 'fill': False}},
+                'filter_by': {'period': period} if name == group_by else {},
+                'raw': True,
+            }
+
+            whens = Whens()
+            token = query_observers.set((whens,))
+            start = time.perf_counter()
+            results = await get_results(timezone, body, False)
+            elapsed = (time.perf_counter() - start) * 1000
+            query_observers.reset(token)
+
+            found = {row['extracted_created_at']: row['count'] for row in results['data']}
+            rows = dates
+            if name == group_by:
+                rows = dates[(dates.dt.tz_convert(zone) >= pd.Timestamp(f'{year}-01-01', tz=zone)) &
+                             (dates.dt.tz_convert(zone) <= pd.Timestamp(f'{year + 1}-01-01', tz=zone))]
+            wanted = expected(rows, zone, group_by)
+
+            wrong = int((old_labels(rows, zone, group_by) != labels(rows.dt.tz_convert(zone), group_by)).sum())
+            print(f'{zone:<22} {name:<10} {len(found):>8} {elapsed:>8.1f} {wrong:>15}')
+
+            # As horas da mudança de horário primeiro, depois o resto
+            checked = transition_hours(zone, year) & set(wanted) if group_by == 'hour' else set()
+            for label in sorted(checked) + sorted(set(wanted) - checked):
+                if found.get(label) != wanted[label]:
+                    print(f'  wrong bucket {label}: {found.get(label)} rows, expected {wanted[label]}')
+                    failed = True
+                    break
+
+            if set(found) - set(wanted):
+                print(f'  unexpected buckets {sorted(set(found) - set(wanted))[:5]}')
+                failed = True
+
+            # Com ou sem período o CASE só tem as mudanças de horário dentro dos dados
+            # (weekday e quarter têm CASEs próprios, a hora não)
+            transitions = len(offset_table(zone, datetime(year - 1, 12, 31), datetime(year + 1, 1, 2))) - 1
+            if group_by == 'hour' and whens.count > transitions:
+                print(f'  offset CASE with {whens.count} WHENs, {transitions} transitions in the data')
+                failed = True
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--zones', default='America/New_York,Europe/London,America/Sao_Paulo,Asia/Kolkata')
+    parser.add_argument('--year', type=int, default=2024)
+    parser.add_argument('--step', type=int, default=30, help='minutes between rows')
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.zones.split(','), args.year, args.step)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
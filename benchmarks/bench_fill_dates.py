@@ -0,0 +1,105 @@
+"""Gap filling of date grouped metrics: ``calc.fill_dates`` against a Python loop.
+
+Builds sparse hourly rows (``--buckets`` hours × ``--groups`` statuses, with
+``--density`` of the buckets present) and fills the missing buckets with zeros.
+Raises when the result differs from the Python loop or a created row does not
+carry the additional fields of its status.
+
+    python benchmarks/bench_fill_dates.py --buckets 10000 --groups 100
+"""
+import argparse
+import random
+import time
+
+import bootstrap  # noqa: F401
+
+import pandas as pd
+import pytz
+
+from easyapi.calc import fill_dates
+
+DATE_KEY = 'extracted_created_at'
+FORMAT = '%Y-%m-%d %H'
+
+
+def build(buckets, groups, density):
+    labels = pd.period_range('2024-01-01 00', periods=buckets, freq='h').strftime(FORMAT)
+    random.seed(1)
+
+    rows = []
+    for label in labels:
+        for group in range(groups):
+            if random.random() < density:
+                rows.append({DATE_KEY: label, 'status': group, 'count': random.randint(1, 100)})
+
+    return rows, labels[0], labels[-1]
+
+
+def python_fill(rows, start, end):
+    """Loop over every date and group, as the old ``normalize_dates`` attempted."""
+    current = pd.Timestamp(start + ':00')
+    last = pd.Timestamp(end + ':00')
+    dates = []
+    while current <= last:
+        dates.append(current.strftime(FORMAT))
+        current += pd.Timedelta(hours=1)
+
+    statuses = []
+    for row in rows:
+        if row['status'] not in statuses:
+            statuses.append(row['status'])
+
+    found = {(row[DATE_KEY], row['status']): row for row in rows}
+    filled = []
+    for date in dates:
+        for status in statuses:
+            row = found.get((date, status))
+            filled.append(row or {DATE_KEY: date, 'status': status, 'count': 0})
+
+    return filled
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buckets', type=int, default=10000)
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--density', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows, start, end = build(args.buckets, args.groups, args.density)
+    print(f'{len(rows)} rows, {args.buckets * args.groups} after filling')
+
+    expected, loop = timed(lambda: python_fill(rows, start, end), args.repeat)
+    filled, vectorized = timed(
+        lambda: fill_dates(rows, DATE_KEY, ['status'], ['count'], None, None, 'hour', pytz.utc),
+        args.repeat
+    )
+
+    key = lambda row: (row[DATE_KEY], row['status'])  # noqa: E731
+    if sorted(filled, key=key) != sorted(expected, key=key):
+        raise RuntimeError('fill_dates and the Python loop differ')
+
+    # As linhas criadas levam os campos adicionais da sua combinação
+    named = [{**row, 'status_name': f'status {row["status"]}'} for row in rows]
+    filled = fill_dates(named, DATE_KEY, ['status'], ['count'], None, None, 'hour', pytz.utc)
+    if any(row['status_name'] != f'status {row["status"]}' for row in filled):
+        raise RuntimeError('fill_dates created rows without the additional fields')
+
+    print(f'{"python loop":<12} {loop:>10.1f} ms')
+    print(f'{"fill_dates":<12} {vectorized:>10.1f} ms  ({loop / vectorized:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Time to reject expensive Metrics queries with the guardrails.
+
+Seeds ``--rows`` contacts over a year and runs an hourly grouping four ways:
+unguarded, with ``max_buckets`` one below the hours of the period (rejected
+with a 400 before any query), with ``max_buckets`` equal to them (answered)
+and with a ``statement_timeout`` shorter than the query (rejected with a 503
+by the database, SQLite's progress handler here). Prints the status and time
+of each and the ``guardrails.counters``; exits 1 when a case gets another
+status.
+
+    python benchmarks/bench_guardrails.py --rows 300000 --timeout 20
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone as dt_timezone
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+import pytz
+
+from easyapi.calc import get_results
+from easyapi.exception import HTTPException
+from easyapi.guardrails import QueryGuard, counters, statement_limit
+from modules.bench.models import Contact
+
+BODY = {
+    'model': 'bench_Contact',
+    'calc': {'formula': ['count', 'sum'], 'field': 'amount'},
+    'group_by': {'date': {'field': 'created_at', 'group_by': 'hour', 'fill': False}, 'fields': ['status']},
+    'filter_by': {'period': {'field': 'created_at', 'start_date': '2024-01-01', 'end_date': '2024-12-31'}},
+    'raw': True,
+}
+
+# Horas do período, as duas pontas incluídas
+HOURS = (datetime(2024, 12, 31) - datetime(2024, 1, 1)) // timedelta(hours=1) + 1
+
+
+def seed(rows):
+    Contact.objects.all().delete()
+    start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    step = timedelta(days=365) / rows
+
+    Contact.objects.bulk_create([
+        Contact(name='', email='', status=i % 5, amount=i % 100, created_at=start + step * i)
+        for i in range(rows)
+    ], batch_size=2000)
+
+
+async def run_case(timezone, guard, timeout):
+    start = time.perf_counter()
+    try:
+        with statement_limit(timeout):
+            results = await get_results(timezone, BODY, False, guard)
+        status, detail = 200, f'{len(results["data"])} rows'
+    except HTTPException as err:
+        status, detail = err.args
+
+    return status, detail, (time.perf_counter() - start) * 1000
+
+
+async def run(rows, timeout):
+    await sync_to_async(seed)(rows)
+    timezone = pytz.timezone('UTC')
+    print(f'{rows} rows, hourly grouping over a year')
+    print(f'{"case":<14} {"status":>6} {"ms":>10}  detail')
+
+    cases = [
+        ('unguarded', None, None, 200),
+        ('above buckets', QueryGuard(max_buckets=HOURS - 1), None, 400),
+        ('at buckets', QueryGuard(max_buckets=HOURS), None, 200),
+        ('timeout', None, timeout, 503),
+    ]
+
+    failed = False
+    for name, guard, case_timeout, expected in cases:
+        status, detail, elapsed = await run_case(timezone, guard, case_timeout)
+        print(f'{name:<14} {status:>6} {elapsed:>10.1f}  {str(detail)[:60]}')
+        if status != expected:
+            print(f'  {name}: expected {expected}')
+            failed = True
+
+    print('counters', dict(counters))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--timeout', type=int, default=20, help='statement timeout in milliseconds')
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.rows, args.timeout)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Import time and memory budget of ``import easyapi``.
+
+Each run starts a fresh interpreter, sets Django up and measures the wall time
+and the max RSS growth of ``import easyapi``, then lists which of the heavy
+modules (pandas, numpy, pyarrow, dateutil.rrule) got imported. Exits 1 when the
+median is above ``--max-ms``/``--max-mb`` or a heavy module is imported.
+
+    python benchmarks/bench_import.py --runs 5 --max-ms 150 --max-mb 20
+"""
+import argparse
+import compileall
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+HEAVY = ['pandas', 'numpy', 'pyarrow', 'dateutil.rrule']
+
+SNIPPET = '''
+import json, resource, sys, time
+sys.path[:0] = [{bench!r}]
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
+os.environ.setdefault('REDIS_SERVER', 'localhost')
+sys.path.insert(0, {root!r})
+import django
+django.setup()
+
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import easyapi
+elapsed = time.perf_counter() - start
+grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+
+print(json.dumps({{
+    'ms': elapsed * 1000,
+    'mb': grown / 1024,
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+def run_once():
+    code = SNIPPET.format(bench=BENCH_DIR, root=ROOT_DIR, heavy=HEAVY)
+    output = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=150)
+    parser.add_argument('--max-mb', type=float, default=20)
+    args = parser.parse_args()
+
+    # Mede o import com os .pyc já gravados, como em produção
+    compileall.compile_dir(os.path.join(ROOT_DIR, 'easyapi'), quiet=1)
+    runs = [run_once() for _ in range(args.runs)]
+
+    ms = statistics.median(run['ms'] for run in runs)
+    mb = statistics.median(run['mb'] for run in runs)
+    heavy = sorted({name for run in runs for name in run['heavy']})
+
+    print(f'import easyapi: {ms:.1f} ms (budget {args.max_ms:g}), {mb:.1f} MB (budget {args.max_mb:g})')
+    print(f'heavy modules imported: {", ".join(heavy) or "none"}')
+
+    if ms > args.max_ms or mb > args.max_mb or heavy:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
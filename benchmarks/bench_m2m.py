@@ -0,0 +1,98 @@
+"""Tags in list pages: ``list_m2m_fields`` against one query per row.
+
+Seeds ``--rows`` tagged contacts and lists pages of ``--limit`` rows with the
+tags of each contact added by ``dehydrate`` (one query per row) and by
+``list_m2m_fields`` (one query per page). Prints the queries and p50 of
+each and exits 1 when the tags differ.
+
+    python benchmarks/bench_m2m.py --rows 5000 --limit 100 --iterations 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from bench_tags import SESSION, SESSION_ID, seed
+from easyapi.queries import query_observers
+from fakeredis import FakeRedis
+from modules.bench.models import Contact
+from resources import ContactResource
+
+factory = RequestFactory()
+factory.cookies['sid'] = SESSION_ID
+
+
+class PerRowResource(ContactResource):
+
+    async def dehydrate(self, row):
+        links = Contact.tags.through.objects.filter(contact_id=row['id']).order_by('pk')
+        row['tags'] = [
+            {'id': id, 'name': name} async for id, name in links.values_list('tag__id', 'tag__name')
+        ]
+        return row
+
+
+class PrefetchResource(ContactResource):
+    list_m2m_fields = {'tags': ['id', 'name']}
+
+
+class Counter:
+    def __init__(self):
+        self.queries = 0
+
+    def add_query(self, sql, elapsed, alias):
+        self.queries += 1
+
+
+async def measure(resource, limit, iterations):
+    view = resource.as_view()
+    latencies = []
+    for _ in range(iterations):
+        counter = Counter()
+        token = query_observers.set((counter,))
+        start = time.perf_counter()
+        response = await view(factory.get('/contacts', {'limit': str(limit)}))
+        latencies.append((time.perf_counter() - start) * 1000)
+        query_observers.reset(token)
+
+    objects = json.loads(response.content)['objects']
+    return {row['id']: row['tags'] for row in objects}, counter.queries, statistics.median(latencies)
+
+
+async def run(rows, limit, iterations):
+    await FakeRedis().set(f'bench:sessions:{SESSION_ID}', json.dumps(SESSION))
+    await asyncio.to_thread(seed, rows, 20)
+
+    print(f'{rows} contacts, pages of {limit}')
+    print(f'{"resource":<10} {"queries":>8} {"p50 ms":>9}')
+
+    results = {}
+    for name, resource in [('per row', PerRowResource), ('prefetch', PrefetchResource)]:
+        results[name], queries, p50 = await measure(resource, limit, iterations)
+        print(f'{name:<10} {queries:>8} {p50:>9.2f}')
+
+    return results['per row'] != results['prefetch']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.rows, args.limit, args.iterations)):
+        print('tags differ')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Encode time and payload size of Metrics results: rows against columns.
+
+Builds date × group rows as returned by the grouped query and formats them
+with ``normalize_groups`` (one dict per x value) and ``columnar_groups``
+(``"format": "columns"``), then encodes both as JSON. Arrow IPC is measured
+too when pyarrow is installed.
+
+    python benchmarks/bench_metrics_format.py --buckets 2000 --groups 100
+"""
+import argparse
+import json
+import random
+import time
+
+import bootstrap  # noqa: F401
+
+import pandas as pd
+from django.core.serializers.json import DjangoJSONEncoder
+
+from easyapi.calc import columnar_groups, normalize_groups, to_arrow
+from easyapi.util import optional_import
+
+DATE_KEY = 'extracted_created_at'
+
+
+def build(buckets, groups):
+    labels = pd.period_range('2024-01-01', periods=buckets, freq='D').strftime('%Y-%m-%d')
+    random.seed(1)
+
+    return [
+        {DATE_KEY: label, 'status': group, 'count': random.randint(0, 1000)}
+        for label in labels
+        for group in range(groups)
+    ]
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return result, best * 1000
+
+
+def rows_format(rows):
+    data, keys = normalize_groups(rows, [], ['count'], None, None, None, None, [DATE_KEY, 'status'])
+    return json.dumps({'data': data, 'keys': keys}, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+def columns_format(rows):
+    data, keys = columnar_groups(rows, [], ['count'], [DATE_KEY, 'status'])
+    return json.dumps({**data, 'keys': keys}, cls=DjangoJSONEncoder).encode('utf-8')
+
+
+def arrow_format(rows):
+    data, keys = columnar_groups(rows, [], ['count'], [DATE_KEY, 'status'])
+    return to_arrow(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buckets', type=int, default=2000)
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = build(args.buckets, args.groups)
+    print(f'{len(rows)} rows')
+    print(f'{"format":<8} {"ms":>10} {"bytes":>12}')
+
+    formats = [('rows', rows_format), ('columns', columns_format)]
+    if optional_import('pyarrow') is not None:
+        formats.append(('arrow', arrow_format))
+
+    for name, function in formats:
+        content, elapsed = timed(lambda: function(rows), args.repeat)
+        print(f'{name:<8} {elapsed:>10.1f} {len(content):>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Relative date periods: fresh ``Dates`` per rule against ``resolve_period``.
+
+Resolves a mix of periods (``last_30_days``, ``this_month``, deltas and ages)
+the way a segment with many date rules does, with a new ``Dates`` each time
+and with the memoized ``resolve_period``, checks both give the same ranges
+(exits 1 otherwise) and times ``Filter.get_Q`` of a segment with ``--rules``
+date rules.
+
+    python benchmarks/bench_periods.py --rules 50 --repeat 200
+"""
+import argparse
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from easyapi.dates import Dates, resolve_period
+from easyapi.filters import Filter
+from modules.bench.models import Contact
+
+PERIODS = [
+    ('last_30_days', True, ()),
+    ('this_month', True, ()),
+    ('last_year', False, ()),
+    ('this_week', False, ()),
+    ('day_delta', False, ('7',)),
+    ('month_delta', True, ('-2',)),
+    ('age', True, ({'type': 'years', 'value': '30'}, 'gte')),
+]
+OPERATORS = ['last_30_days', 'this_month', 'last_7_days', 'this_year', 'yesterday']
+ZONES = ['America/Sao_Paulo', 'UTC', 'Europe/London']
+
+
+def fresh():
+    return [
+        getattr(Dates(zone, remove_tz), period)(*args)
+        for zone in ZONES for period, remove_tz, args in PERIODS
+    ]
+
+
+def memoized():
+    return [
+        resolve_period(period, zone, remove_tz, args)
+        for zone in ZONES for period, remove_tz, args in PERIODS
+    ]
+
+
+def segment(rules):
+    return {
+        'logical_operator': 'AND',
+        'rules': [
+            {'field': 'created_at', 'operator': OPERATORS[i % len(OPERATORS)]} for i in range(rules)
+        ],
+    }
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    expected, fresh_ms = timed(fresh, args.repeat)
+    found, memoized_ms = timed(memoized, args.repeat)
+    print(f'{len(expected)} periods: fresh Dates {fresh_ms:.3f} ms, resolve_period {memoized_ms:.3f} ms')
+
+    conditions = segment(args.rules)
+    _, get_q_ms = timed(
+        lambda: Filter(Contact, 'America/Sao_Paulo').get_Q(conditions['rules'], 'AND'), args.repeat
+    )
+    print(f'segment with {args.rules} date rules: get_Q {get_q_ms:.3f} ms')
+
+    if found != expected:
+        print('resolved periods differ from Dates')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
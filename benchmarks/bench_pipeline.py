@@ -0,0 +1,280 @@
+"""Throughput and latency of the BaseResource request pipeline.
+
+Runs list, detail, create, update, search, ``?filter=`` segments, count and
+``Metrics.post`` through the full ``dispatch`` (session lookup, filters,
+serialization) against an in-memory SQLite database and a fake Redis, at
+several data sizes. Results are saved as JSON so releases can be compared.
+
+    python benchmarks/bench_pipeline.py --label 0.0.54
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/0.0.54.json
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+import django
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from easyapi.calc_resource import Metrics
+from easyapi.rollup import registry
+from fakeredis import FakeRedis
+
+from modules.bench.models import Company, Contact
+from resources import ContactResource
+
+RESULTS_DIR = os.path.join(bootstrap.BENCH_DIR, 'results')
+SESSION_ID = 'benchmark'
+SESSION = {'user': {'id': 1, 'timezone': 'UTC'}, 'account': None}
+
+factory = RequestFactory()
+factory.cookies['sid'] = SESSION_ID
+
+
+def seed(size):
+    Contact.objects.all().delete()
+    Company.objects.all().delete()
+
+    companies = Company.objects.bulk_create([Company(name=f'Company {i}') for i in range(20)])
+    now = datetime.now(timezone.utc)
+    Contact.objects.bulk_create([
+        Contact(
+            name=f'User {i}',
+            email=f'user{i}@example.com',
+            status=i % 4,
+            score=i % 100,
+            amount=(i * 7) % 1000,
+            company=companies[i % len(companies)],
+            created_at=now - timedelta(hours=i),
+        )
+        for i in range(size)
+    ], batch_size=1000)
+
+    for rollup in registry.all():
+        rollup.rebuild()
+
+    return Contact.objects.order_by('id').values_list('id', flat=True)[size // 2]
+
+
+def segment():
+    return json.dumps({
+        'logical_operator': 'AND',
+        'rules': [
+            {'field': 'status', 'operator': 'in', 'value': [1, 2]},
+            {'field': 'score', 'operator': 'gte', 'value': 20},
+            {'field': 'created_at', 'operator': 'last_30_days'},
+        ],
+    })
+
+
+class SourceMetrics(Metrics):
+    use_rollups = False
+
+
+def cases(obj_id):
+    contacts = ContactResource.as_view()
+    metrics = Metrics.as_view()
+    source_metrics = SourceMetrics.as_view()
+
+    def get(view, path, **params):
+        return lambda: view(factory.get(path, params))
+
+    def post(view, path, body):
+        return lambda: view(factory.post(path, json.dumps(body), content_type='application/json'))
+
+    def patch(view, path, body):
+        return lambda: view(factory.patch(path, json.dumps(body), content_type='application/json'))
+
+    created_at = datetime.now(timezone.utc).isoformat()
+
+    return {
+        'list': get(contacts, '/contacts'),
+        'list_filtered': get(contacts, '/contacts', status='2', score__gte='50'),
+        'list_ordered': get(contacts, '/contacts', order_by='-score', page='2'),
+        'count': get(contacts, '/contacts', count='true'),
+        'detail': get(contacts, f'/contacts/{obj_id}'),
+        'search': get(contacts, '/contacts', search='user12'),
+        'segment': get(contacts, '/contacts', filter=segment()),
+        'create': post(contacts, '/contacts', {
+            'name': 'New', 'email': 'new@example.com', 'status': 1, 'score': 1,
+            'amount': 10, 'created_at': created_at,
+        }),
+        'update': patch(contacts, f'/contacts/{obj_id}', {'name': 'Changed', 'score': 3}),
+        'metrics_total': post(metrics, '/metrics', {
+            'model': 'bench_Contact',
+            'calc': {'formula': ['sum'], 'field': 'amount'},
+        }),
+        'metrics_group': post(metrics, '/metrics', {
+            'model': 'bench_Contact',
+            'calc': {'formula': ['count'], 'field': 'id'},
+            'group_by': {'fields': ['status']},
+        }),
+        'metrics_source': post(source_metrics, '/metrics', {
+            'model': 'bench_Contact',
+            'calc': {'formula': ['count'], 'field': 'id'},
+            'group_by': {'fields': ['status']},
+        }),
+        'metrics_month': post(metrics, '/metrics', {
+            'model': 'bench_Contact',
+            'calc': {'formula': ['sum'], 'field': 'amount'},
+            'group_by': {'date': {'field': 'created_at', 'group_by': 'month'}, 'fields': ['status']},
+        }),
+        'metrics_formula': post(metrics, '/metrics', {
+            'model': 'bench_Contact',
+            'calc': {'formula': ['sum'], 'field': ['(', 'amount', '-', 10, ')', '*', 'score']},
+            'group_by': {'fields': ['status']},
+        }),
+        'metrics_columns': post(metrics, '/metrics', {
+            'model': 'bench_Contact',
+            'calc': {'formula': ['sum'], 'field': 'amount'},
+            'group_by': {'fields': ['company_id', 'status']},
+            'format': 'columns',
+        }),
+        'metrics_batch': post(metrics, '/metrics', [
+            {
+                'model': 'bench_Contact',
+                'calc': {'formula': [formula], 'field': field},
+                'group_by': {'fields': [group]},
+            }
+            for formula, field in [('count', 'id'), ('sum', 'amount'), ('avg', 'score')]
+            for group in ['status', 'company_id']
+        ] + [
+            {'model': 'bench_Contact', 'calc': {'formula': [formula], 'field': 'amount'}}
+            for formula in ['sum', 'avg', 'min', 'max']
+        ]),
+    }
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def measure(call, iterations, warmup):
+    for _ in range(warmup):
+        await call()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = await call()
+        latencies.append((time.perf_counter() - start) * 1000)
+    total = time.perf_counter() - started
+
+    if response.status_code >= 400:
+        raise RuntimeError(f'{response.status_code}: {response.content[:200]}')
+
+    return {
+        'iterations': iterations,
+        'rps': round(iterations / total, 1),
+        'mean': round(statistics.mean(latencies), 3),
+        'p50': round(percentile(latencies, 50), 3),
+        'p95': round(percentile(latencies, 95), 3),
+        'p99': round(percentile(latencies, 99), 3),
+    }
+
+
+async def run(sizes, iterations, warmup, only):
+    await FakeRedis().set(f'bench:sessions:{SESSION_ID}', json.dumps(SESSION))
+
+    results = {}
+    for size in sizes:
+        obj_id = await asyncio.to_thread(seed, size)
+        for name, call in cases(obj_id).items():
+            if only and name not in only:
+                continue
+
+            result = await measure(call, iterations, warmup)
+            results[f'{name}[{size}]'] = result
+            print(
+                f'{name:<16} {size:>7} {result["rps"]:>9} {result["mean"]:>9} '
+                f'{result["p50"]:>9} {result["p95"]:>9} {result["p99"]:>9}',
+                flush=True
+            )
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=bootstrap.ROOT_DIR, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(results, path, threshold):
+    with open(path) as file:
+        baseline = json.load(file)['results']
+
+    print(f'\nCompared with {path} (p50, ms)')
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        before = baseline[name]['p50']
+        after = result['p50']
+        change = (after - before) / before * 100 if before else 0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<26} {before:>9} {after:>9} {change:>+8.1f}%{flag}')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help='rows seeded per run')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--only', default='', help='comma separated case names')
+    parser.add_argument('--label', help='save results to benchmarks/results/<label>.json')
+    parser.add_argument('--compare', help='results file to compare with')
+    parser.add_argument('--threshold', type=float, default=10, help='p50 regression percent')
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    only = [name for name in args.only.split(',') if name]
+
+    print(f'{"case":<16} {"rows":>7} {"req/s":>9} {"mean ms":>9} {"p50":>9} {"p95":>9} {"p99":>9}')
+    results = asyncio.run(run(sizes, args.iterations, args.warmup, only))
+
+    if args.label:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f'{args.label}.json')
+        with open(path, 'w') as file:
+            json.dump({
+                'label': args.label,
+                'commit': git_commit(),
+                'date': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'iterations': args.iterations,
+                'results': results,
+            }, file, indent=2)
+        print(f'\nSaved {path}')
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Dispatch cost of custom resource routes.
+
+Compares the compiled ``RouteTable`` used by ``BaseResource.get_method``
+against the previous approach of running ``re.search`` for every route on
+every request, for resources declaring dozens of custom routes.
+
+    python benchmarks/bench_routes.py
+"""
+import re
+import timeit
+
+import bootstrap  # noqa: F401
+
+from django.test import RequestFactory
+
+from easyapi import BaseResource
+
+SIZES = [5, 25, 50, 100]
+NUMBER = 20000
+
+
+def make_resource(size):
+    routes = [
+        {
+            'path': rf'(?P<id>\d+)/action_{i}$',
+            'func': 'action',
+            'allowed_methods': ['post'],
+        }
+        for i in range(size)
+    ]
+    return type(f'Resource{size}', (BaseResource,), {'routes': routes, 'action': None})
+
+
+def legacy_get_method(resource, request):
+    for route in resource.routes:
+        match = re.search(route['path'], request.path)
+        if match:
+            return getattr(resource, route['func']), match.groupdict(), route.get('allowed_methods')
+
+    return None, None, None
+
+
+def main():
+    factory = RequestFactory()
+    print(f'{"routes":>6} {"target":>8} {"legacy us":>10} {"table us":>10} {"speedup":>8}')
+
+    for size in SIZES:
+        resource = make_resource(size)()
+        targets = {
+            'first': factory.get('/api/items/10/action_0'),
+            'middle': factory.get(f'/api/items/10/action_{size // 2}'),
+            'last': factory.get(f'/api/items/10/action_{size - 1}'),
+            'miss': factory.get('/api/items/10'),
+        }
+
+        for name, request in targets.items():
+            assert legacy_get_method(resource, request)[1:] == resource.get_method(request, (), {})[1:]
+
+            legacy = timeit.timeit(lambda: legacy_get_method(resource, request), number=NUMBER)
+            table = timeit.timeit(lambda: resource.get_method(request, (), {}), number=NUMBER)
+
+            print(
+                f'{size:>6} {name:>8} {legacy / NUMBER * 1e6:>10.2f} '
+                f'{table / NUMBER * 1e6:>10.2f} {legacy / table:>7.1f}x'
+            )
+
+
+if __name__ == '__main__':
+    main()
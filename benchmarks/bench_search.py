@@ -0,0 +1,171 @@
+"""``?search=`` latency and results of the search backends.
+
+Seeds ``--rows`` contacts and runs the same terms through ``ContactResource``
+with ``LikeSearch`` (``icontains``), ``PrefixSearch`` and ``TokenSearch`` (the
+token table is built with ``rebuild``). Prints the p50 of each term and the
+first results; exits 1 when a prefix or token search misses a contact whose
+name starts with the term, a search with ``?filter=`` or a unicode digit fails
+or a subclass with another model shares the backend of its parent.
+``FullTextSearch`` needs MySQL and falls back to ``LikeSearch`` here.
+
+    python benchmarks/bench_search.py --rows 50000 --iterations 30
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import statistics
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from django.core.management import call_command
+from django.test import RequestFactory
+
+from easyapi.search import LikeSearch, PrefixSearch, TokenSearch
+from fakeredis import FakeRedis
+from modules.bench.models import Company, Contact, ContactToken
+from resources import ContactResource
+
+SESSION_ID = 'benchmark'
+SESSION = {'user': {'id': 1, 'timezone': 'UTC'}, 'account': None}
+TERMS = ['maria', 'mar', 'maria silva', 'silva12', 'user7']
+FIRST = ['Maria', 'Mario', 'Marta', 'João', 'José', 'Ana', 'Pedro', 'Lucas']
+LAST = ['Silva', 'Souza', 'Santos', 'Oliveira', 'Pereira', 'Lima']
+SEGMENT = json.dumps({
+    'logical_operator': 'AND',
+    'rules': [{'field': 'created_at', 'operator': 'last_30_days'}],
+})
+
+factory = RequestFactory()
+factory.cookies['sid'] = SESSION_ID
+
+
+class LikeResource(ContactResource):
+    search_backend = LikeSearch()
+
+
+class PrefixResource(ContactResource):
+    search_backend = PrefixSearch()
+
+
+class TokenResource(ContactResource):
+    search_backend = TokenSearch(ContactToken)
+
+
+class CompanyResource(PrefixResource):
+    model = Company
+    search_fields = ['name']
+
+
+def seed(rows):
+    Contact.objects.all().delete()
+    now = datetime.now(timezone.utc)
+    Contact.objects.bulk_create([
+        Contact(
+            name=f'{FIRST[i % len(FIRST)]} {LAST[i // len(FIRST) % len(LAST)]}{i % 50}',
+            email=f'user{i}@example.com',
+            created_at=now,
+        )
+        for i in range(rows)
+    ], batch_size=2000)
+
+    start = time.perf_counter()
+    tokens = TokenResource.search_backend.rebuild()
+    print(f'{rows} contacts, {tokens} tokens built in {time.perf_counter() - start:.2f} s')
+
+
+def expected(term, backend):
+    """Ids of the contacts whose name the backend must find."""
+    term = term.lower()
+    names = Contact.objects.values_list('id', 'name')
+    if backend == 'prefix':
+        return {id for id, name in names if name.lower().startswith(term)}
+
+    # Palavras do termo como prefixo de alguma palavra do nome
+    return {
+        id for id, name in names
+        if all(any(part.lower().startswith(word) for part in name.split()) for word in term.split())
+    }
+
+
+async def search(view, term, limit, **params):
+    response = await view(factory.get('/contacts', {'search': term, 'limit': str(limit), **params}))
+    results = json.loads(response.content)
+    if response.status_code >= 400:
+        raise RuntimeError(f'{response.status_code}: {results}')
+
+    return results['objects'] if isinstance(results, dict) else results
+
+
+async def measure(view, term, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        results = await search(view, term, 25)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return results, statistics.median(latencies)
+
+
+async def run(rows, iterations):
+    await FakeRedis().set(f'bench:sessions:{SESSION_ID}', json.dumps(SESSION))
+    await asyncio.to_thread(seed, rows)
+
+    backends = [('like', LikeResource), ('prefix', PrefixResource), ('token', TokenResource)]
+    print(f'{"term":<14} {"backend":<8} {"found":>6} {"p50 ms":>9}  first page')
+
+    failed = False
+    for term in TERMS:
+        for name, resource in backends:
+            view = resource.as_view()
+            results, p50 = await measure(view, term, iterations)
+            found = {row['id'] for row in await search(view, term, rows)}
+
+            first = ', '.join(row['name'] for row in results[:3])
+            print(f'{term:<14} {name:<8} {len(found):>6} {p50:>9.2f}  {first}')
+
+            if name != 'like':
+                missed = await asyncio.to_thread(expected, term, name) - found
+                if missed:
+                    print(f'  {name} missed {len(missed)} contacts')
+                    failed = True
+
+    # A relevância vale também depois do ?filter=, que troca o queryset
+    for name, resource in backends:
+        try:
+            await search(resource.as_view(), TERMS[0], 25, filter=SEGMENT)
+        except Exception as error:
+            print(f'  {name} search with ?filter= failed: {error!r}')
+            failed = True
+
+        # Dígitos unicode não são um id
+        try:
+            await search(resource.as_view(), '²', 25)
+        except Exception as error:
+            print(f'  {name} search for a unicode digit failed: {error!r}')
+            failed = True
+
+    # A subclasse com outro model tem a sua cópia do backend
+    backend = CompanyResource.search_backend
+    if backend is PrefixResource.search_backend or (backend.source, backend.fields) != (Company, ['name']):
+        print(f'  CompanyResource searches {backend.source.__name__} {backend.fields}')
+        failed = True
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.rows, args.iterations)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
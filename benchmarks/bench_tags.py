@@ -0,0 +1,151 @@
+"""``?tags=`` filtering with ``tags_operator`` OR, AND and NOT.
+
+Seeds ``--rows`` contacts with a few of ``--tags`` tags each, runs every
+operator through ``ContactResource`` and compares the ids with the ones
+computed in Python from the through table (exits 1 when they differ or a
+contact comes twice). Also times the old ``tags__id__in`` join and the AND
+built from a Python list of ids to compare with the subqueries.
+
+    python benchmarks/bench_tags.py --rows 50000 --iterations 20
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+import json
+import random
+import statistics
+import sys
+import time
+
+import bootstrap  # noqa: F401
+
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import RequestFactory
+
+from easyapi.filter_schema import m2m_filter
+from fakeredis import FakeRedis
+from modules.bench.models import Contact, Tag
+from resources import ContactResource
+
+SESSION_ID = 'benchmark'
+SESSION = {'user': {'id': 1, 'timezone': 'UTC'}, 'account': None}
+CASES = [('OR', [1, 2]), ('AND', [1, 2]), ('AND', [1, 2, 3]), ('NOT', [1]), ('OR', [7, 9, 11])]
+
+factory = RequestFactory()
+factory.cookies['sid'] = SESSION_ID
+Through = Contact.tags.through
+
+
+def seed(rows, tags):
+    Through.objects.all().delete()
+    Contact.objects.all().delete()
+    Tag.objects.all().delete()
+
+    Tag.objects.bulk_create([Tag(id=i, name=f'Tag {i}') for i in range(1, tags + 1)])
+    now = datetime.now(timezone.utc)
+    Contact.objects.bulk_create([
+        Contact(id=i, name=f'User {i}', email=f'user{i}@example.com', created_at=now) for i in range(1, rows + 1)
+    ], batch_size=2000)
+
+    # Cada contato recebe de 0 a 4 tags, as primeiras mais frequentes
+    rand = random.Random(1)
+    weights = [1 / i for i in range(1, tags + 1)]
+    Through.objects.bulk_create([
+        Through(contact_id=i, tag_id=tag_id)
+        for i in range(1, rows + 1)
+        for tag_id in {rand.choices(range(1, tags + 1), weights)[0] for _ in range(i % 5)}
+    ], batch_size=5000)
+
+
+def expected(operator, ids):
+    tags = defaultdict(set)
+    for contact_id, tag_id in Through.objects.values_list('contact_id', 'tag_id'):
+        tags[contact_id].add(tag_id)
+
+    contacts = Contact.objects.values_list('id', flat=True)
+    if operator == 'AND':
+        return {id for id in contacts if set(ids) <= tags[id]}
+    if operator == 'NOT':
+        return {id for id in contacts if not set(ids) & tags[id]}
+    return {id for id in contacts if set(ids) & tags[id]}
+
+
+def old_or(ids):
+    return list(Contact.objects.filter(tags__id__in=ids).values_list('id', flat=True))
+
+
+def python_and(ids):
+    pks = [
+        row['contact_id'] for row in Through.objects.filter(tag_id__in=ids).values('contact_id')
+        .annotate(total=Count('tag_id')).filter(total=len(ids))
+    ]
+    return list(Contact.objects.filter(pk__in=pks).values_list('id', flat=True))
+
+
+def subquery(operator, ids):
+    return list(Contact.objects.filter(m2m_filter(Contact, 'tags', ids, operator)).values_list('id', flat=True))
+
+
+def timed(function, iterations):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(latencies)
+
+
+async def request(operator, ids, rows):
+    view = ContactResource.as_view()
+    response = await view(factory.get('/contacts', {
+        'tags': ','.join(map(str, ids)), 'tags_operator': operator, 'limit': str(rows),
+    }))
+    return [row['id'] for row in json.loads(response.content)['objects']]
+
+
+async def run(rows, tags, iterations):
+    await FakeRedis().set(f'bench:sessions:{SESSION_ID}', json.dumps(SESSION))
+    await asyncio.to_thread(seed, rows, tags)
+    print(f'{rows} contacts, {await Through.objects.acount()} tag links')
+    print(f'{"case":<16} {"found":>7} {"subquery ms":>12} {"old ms":>8}')
+
+    failed = False
+    for operator, ids in CASES:
+        found = await request(operator, ids, rows)
+        wanted = await asyncio.to_thread(expected, operator, ids)
+        _, elapsed = await asyncio.to_thread(timed, lambda: subquery(operator, ids), iterations)
+
+        old = ''
+        if operator == 'OR':
+            duplicated, old_ms = await asyncio.to_thread(timed, lambda: old_or(ids), iterations)
+            old = f'{old_ms:>8.2f} ({len(duplicated)} rows)'
+        elif operator == 'AND':
+            _, old_ms = await asyncio.to_thread(timed, lambda: python_and(ids), iterations)
+            old = f'{old_ms:>8.2f} (python ids)'
+
+        case = f'{operator} {",".join(map(str, ids))}'
+        print(f'{case:<16} {len(found):>7} {elapsed:>12.2f} {old}')
+
+        if len(found) != len(set(found)) or set(found) != wanted:
+            print(f'  {case}: {len(set(found) ^ wanted)} wrong, {len(found) - len(set(found))} duplicated')
+            failed = True
+
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--tags', type=int, default=20)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    if asyncio.run(run(args.rows, args.tags, args.iterations)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
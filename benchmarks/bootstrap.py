@@ -0,0 +1,27 @@
+"""Offline environment for the benchmarks.
+
+Puts the repository root on ``sys.path``, points Django at the in-memory
+SQLite settings in ``benchmarks/settings``, sets up Django and replaces
+``redis.asyncio.Redis`` with ``fakeredis.FakeRedis``, so the benchmarks run
+without MySQL or Redis.
+"""
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+for path in (BENCH_DIR, ROOT_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
+os.environ.setdefault('REDIS_SERVER', 'localhost')
+
+import django  # noqa: E402
+
+django.setup()
+
+import fakeredis  # noqa: E402
+
+fakeredis.install()
@@ -0,0 +1,97 @@
+"""In-memory stand-in for ``redis.asyncio.Redis``.
+
+Implements only the calls easyapi makes, so the benchmarks measure the
+request pipeline and not the network round trip to Redis.
+"""
+import time
+
+STORE = {}
+
+
+class FakeRedis:
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __await__(self):
+        yield from ()
+        return self
+
+    def client(self):
+        return self
+
+    async def get(self, key):
+        value = STORE.get(key)
+        if not value:
+            return None
+
+        value, expires = value
+        if expires and expires < time.monotonic():
+            del STORE[key]
+            return None
+
+        return value
+
+    async def mget(self, *keys):
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None, nx=False, **kwargs):
+        if nx and await self.get(key) is not None:
+            return None
+
+        value = value if isinstance(value, bytes) else str(value)
+        STORE[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    async def expire(self, key, seconds):
+        if key in STORE:
+            STORE[key] = (STORE[key][0], time.monotonic() + seconds)
+        return True
+
+    async def delete(self, *keys):
+        return sum(STORE.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key, amount=1):
+        value, expires = STORE.get(key, (0, None))
+        value = int(value) + amount
+        STORE[key] = (str(value), expires)
+        return value
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+
+class FakePipeline:
+    """Queues the calls and runs them on ``execute``, like a MULTI/EXEC."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((getattr(self.redis, name), args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls, self.calls = self.calls, []
+        return [await call(*args, **kwargs) for call, args, kwargs in calls]
+
+
+def install():
+    from redis import asyncio as aioredis
+
+    aioredis.Redis = FakeRedis
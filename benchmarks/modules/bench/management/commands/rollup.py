@@ -0,0 +1 @@
+from easyapi.rollup import RollupCommand as Command  # noqa: F401
@@ -0,0 +1,52 @@
+from django.db import models
+
+
+class Company(models.Model):
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        app_label = 'bench'
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'bench'
+
+
+class Contact(models.Model):
+    name = models.CharField(max_length=100)
+    email = models.CharField(max_length=100, db_index=True)
+    status = models.IntegerField(default=1)
+    score = models.FloatField(default=0)
+    amount = models.FloatField(default=0)
+    company = models.ForeignKey(Company, null=True, on_delete=models.SET_NULL)
+    tags = models.ManyToManyField(Tag, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+    version = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'bench'
+
+
+class ContactDaily(models.Model):
+    bucket = models.DateTimeField(null=True, db_index=True)
+    status = models.IntegerField(null=True)
+    company_id = models.IntegerField(null=True)
+    count_id = models.IntegerField(default=0)
+    sum_amount = models.FloatField(null=True)
+
+    class Meta:
+        app_label = 'bench'
+        constraints = [models.UniqueConstraint(fields=['bucket', 'status'], name='contactdaily_cell')]
+
+
+class ContactToken(models.Model):
+    object_id = models.IntegerField(db_index=True)
+    token = models.CharField(max_length=32, db_index=True)
+    weight = models.IntegerField(default=1)
+
+    class Meta:
+        app_label = 'bench'
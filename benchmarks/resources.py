@@ -0,0 +1,24 @@
+from easyapi import BaseResource
+from easyapi.rollup import Rollup
+
+from modules.bench.models import Contact, ContactDaily
+
+
+class ContactResource(BaseResource):
+    model = Contact
+
+    list_fields = ['id', 'name', 'email', 'status', 'score', 'created_at']
+    list_related_fields = {'company': ['id', 'name']}
+    edit_fields = ['id', 'name', 'email', 'status', 'score', 'amount', 'company_id', 'created_at']
+    filter_fields = ['status', 'score', 'company', 'created_at']
+    search_fields = ['name', 'email']
+    order_fields = ['id', 'name', 'score', 'created_at']
+    create_fields = ['name', 'email', 'status', 'score', 'amount', 'created_at']
+    update_fields = ['name', 'status', 'score']
+
+    rollups = [
+        Rollup(
+            ContactDaily, date_field='created_at', granularity='day',
+            groups=['status'], measures=[('count', 'id'), ('sum', 'amount')],
+        ),
+    ]
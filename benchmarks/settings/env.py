@@ -0,0 +1 @@
+REDIS_PREFIX = 'bench'
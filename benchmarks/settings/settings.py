@@ -0,0 +1,22 @@
+SECRET_KEY = 'easyapi-benchmarks'
+DEBUG = False
+USE_TZ = True
+TIME_ZONE = 'UTC'
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'modules.bench',
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # Memória compartilhada entre as threads do sync_to_async
+        'NAME': 'file:easyapi_bench?mode=memory&cache=shared',
+    }
+}
+
+ROOT_URLCONF = 'urls'
+
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -0,0 +1,7 @@
+from easyapi import get_routes
+
+from resources import ContactResource
+
+urlpatterns = get_routes({
+    'contacts': ContactResource,
+})
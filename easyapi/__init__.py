@@ -4,3 +4,4 @@ from easyapi.middleware import ExceptionMiddleware
 from easyapi.routes import get_routes
 from easyapi.tenant.db_router import DBRouter
 from easyapi.tenant.tenant import db_state, get_master_user, set_tenant
+from easyapi.timing import TimingMiddleware
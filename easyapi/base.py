@@ -1,6 +1,7 @@
 # from typing import Any
 
 # import importlib
+from datetime import datetime
 import json
 import os
 import re
@@ -8,21 +9,34 @@ from functools import reduce
 from urllib import parse
 
 from asgiref.sync import sync_to_async
-from django.db import connections
-from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.db import connections, models
 from django.forms.models import model_to_dict
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
 from django.views import View
-import operator
 from redis import asyncio as aioredis
 
 from .filters import Filter as OrmFilter
+from .budget import QueryBudget, get_budget_action
+from .coalesce import coalesce, request_key
+from .compression import available, compress_response, negotiate
+from .conditional import conditional_response, etag_validators, not_modified, version_etag
 from .exception import HTTPException
+from .filter_schema import M2M_OPERATORS, FilterSchema, coercer, m2m_filter, m2m_path
+from .guardrails import QueryGuard, statement_limit
+from .metrics_cache import invalidate as invalidate_metrics
+from .queries import query_observers
+from .rollup import registry as rollups_registry
+from .search import RELEVANCE, LikeSearch
+from .route_table import RouteTable
 from .tenant.tenant import set_tenant
+from .timing import NULL_TIMING, get_timing
+from .util import make_list
 from settings.env import REDIS_PREFIX
 
 re_id = re.compile(r'(.*)\/(\d+)(\/.)?$')
-search_regex = re.compile(r'__isnull|__gte|__lte|__lt|__gt|__startswith')
+re_batch = re.compile(r'\/batch\/?$')
 
 REDIS_SERVER = os.environ['REDIS_SERVER']
 REDIS_DB = 1
@@ -88,6 +102,13 @@ class BaseResource(View):
     list_related_fields = {}
     many_to_many_models = {}
 
+    # Many to many incluídos nas listagens, ex: {'tags': ['id', 'name']}
+    list_m2m_fields = {}
+
+    # Máximo de ids em ?ids= e POST <resource>/batch
+    max_batch_ids = 100
+    batch = False
+
     filter_fields = []
     search_fields = []
     order_fields = []
@@ -102,6 +123,11 @@ class BaseResource(View):
     default_filter = None
     search_operator = 'icontains'
 
+    # Backend do ?search=, ver easyapi.search (LikeSearch, PrefixSearch, FullTextSearch, TokenSearch)
+    search_backend = LikeSearch()
+    search_term = None
+    search_ranked = False
+
     obj = None
     obj_id = None
     data = None
@@ -114,63 +140,170 @@ class BaseResource(View):
     user = None
     account = None
 
-    def __init__(self):
-
-        self.diff = {}
+    timing = NULL_TIMING
+
+    # Máximo de queries por requisição: um número ou um dict por tipo
+    # ('list', 'detail', 'batch', 'post', 'patch', 'delete' ou o nome da rota)
+    max_queries = None
+    query_budget = None
+
+    # Tempo máximo de cada query em milissegundos (503 ao estourar) e máximo de
+    # linhas estimadas pelo EXPLAIN para as listagens (400 ao passar)
+    statement_timeout = None
+    max_estimated_rows = None
+
+    # Tabelas pré-agregadas do model usadas pelo Metrics, ver easyapi.rollup.Rollup
+    rollups = []
+
+    # GETs com ETag/Last-Modified, respondendo 304 a If-None-Match/If-Modified-Since.
+    # Com etag_field (ex: 'updated_at') o detalhe é validado por esse campo antes
+    # do get_obj, sem ele o ETag é o hash do corpo
+    conditional = False
+    etag_field = None
+    validators = None
+
+    # Comprime as respostas com ao menos compression_min_size bytes em br, zstd
+    # (se instalados) ou gzip, conforme o Accept-Encoding
+    compression = False
+    compression_min_size = 1024
+    encoded_body = None
+    cache_body = None
+
+    # GETs idênticos e simultâneos (mesmo tenant, path, query e usuário) fazem uma
+    # única consulta no processo e dividem a resposta, com ou sem cache.
+    # coalesce_tenant divide entre os usuários do tenant: só quando a resposta
+    # não depende do usuário (model_filter, self.user)
+    coalesce = False
+    coalesce_tenant = False
+    coalesce_methods = ['get']
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        for rollup in cls.__dict__.get('rollups', []):
+            if rollup.source is None:
+                rollup.source = cls.model
+            rollups_registry.register(rollup)
+
+        if cls.model:
+            # Cada resource tem a sua cópia do backend, com o seu model e search_fields
+            cls.search_backend = cls.search_backend.bound(cls)
+
+        if cls.etag_field and cls.model:
+            # Erro na declaração, não um 500 no primeiro GET
+            field = cls.model._meta.get_field(cls.etag_field)
+            if not field.concrete or field.is_relation:
+                raise ValueError(f'{cls.__name__}.etag_field must be a column of {cls.model.__name__}')
+
+    @classmethod
+    def model_fields(cls):
+        """Field lists of a resource instance, from the model for the ones not declared.
+
+        ``fields``, ``m2m_fields``, ``fk_fields``, ``all_fields``, ``list_fields``
+        and ``edit_fields``. Also used by the OpenAPI schema.
+        """
+        # Cópias, para não acumular campos nas listas da classe a cada requisição
+        m2m_fields = list(cls.m2m_fields)
+        fk_fields = list(cls.fk_fields)
+
+        fields = []
+        for field in cls.model._meta.get_fields():
+            if not field.is_relation:
+                fields.append(field.name)
+                continue
 
-        if self.model:
-            fields = []
-            for field in self.model._meta.get_fields():
-                if not field.is_relation:
-                    fields.append(field.name)
-                    continue
+            if field.concrete and field.many_to_many:
+                m2m_fields.append(field.name)
+                continue
 
-                if field.concrete and field.many_to_many:
-                    self.m2m_fields.append(field.name)
-                    continue
+            if field.concrete and field.many_to_one:
+                fk_fields.append(field.name)
+                fields.append(f'{field.name}_id')
+                continue
 
-                if field.concrete and field.many_to_one:
-                    self.fk_fields.append(field.name)
-                    fields.append(f'{field.name}_id')
-                    continue
+            # if not field.concrete and field.one_to_many:
+            #     self.related_fields.append(field.name)
+            #     continue
 
-                # if not field.concrete and field.one_to_many:
-                #     self.related_fields.append(field.name)
-                #     continue
+        local_fields = cls.model._meta.local_fields
+        return {
+            'fields': fields,
+            'm2m_fields': m2m_fields,
+            'fk_fields': fk_fields,
+            'all_fields': [field.name for field in local_fields] + m2m_fields,
+            'list_fields': cls.list_fields or fields,
+            'edit_fields': cls.edit_fields or [field.column for field in local_fields],  # + m2m_fields
+        }
 
-            all_fields = [
-                field.name for field in self.model._meta.local_fields
-            ]
-            self.all_fields = all_fields + self.m2m_fields
+    def __init__(self):
 
-            self.fields = fields
-            self.list_fields = self.list_fields or fields
+        self.diff = {}
 
-            if not self.edit_fields:
-                self.edit_fields = [field.column for field in self.model._meta.local_fields]  # + m2m_fields
+        if self.model:
+            for name, value in self.model_fields().items():
+                setattr(self, name, value)
 
             self.queryset = self.model.objects
 
     def get_method(self, request, args, kwargs):
         self.request = request
-        for route in self.routes:
-            match = re.search(route['path'], request.path)
-            if match:
-                allowed_methods = route.get('allowed_methods')
-                return getattr(self, route['func']), match.groupdict(), allowed_methods
+        if not self.routes:
+            return None, None, None
+
+        route, match = RouteTable.for_resource(type(self)).match(request.path)
+        if route:
+            allowed_methods = route.get('allowed_methods')
+            return getattr(self, route['func']), match, allowed_methods
 
         return None, None, None
 
     async def dispatch(self, request, *args, **kwargs) -> None:
+        self.timing = get_timing(request)
+
+        action = get_budget_action()
+        if action and self.max_queries is not None:
+            self.query_budget = QueryBudget(self.max_queries, action)
+
+        observers = tuple(
+            observer for observer in (self.timing, self.query_budget)
+            if observer and observer is not NULL_TIMING
+        )
+        token = query_observers.set(query_observers.get() + observers)
+        try:
+            with statement_limit(self.statement_timeout):
+                response = await self._dispatch(request, *args, **kwargs)
+        finally:
+            query_observers.reset(token)
+
+        if self.query_budget:
+            self.query_budget.check(self)
+
+        if request.method in ('GET', 'HEAD') and (self.conditional or self.validators):
+            response = conditional_response(request, response, *(self.validators or ()))
+
+        encoding = None
+        if self.compression:
+            response, encoding = compress_response(
+                request, response, self.compression_min_size, self.encoded_body
+            )
+
+        # Corpo calculado nesta requisição: grava junto a versão comprimida
+        if self.cache_body is not None:
+            await self.save_cache(self.cache_body, response.content if encoding else None, encoding)
+
+        return response
+
+    async def _dispatch(self, request, *args, **kwargs):
         session_key = request.COOKIES.get('sid')
         if session_key:
-            redis = await aioredis.Redis(
-                host=REDIS_SERVER, db=REDIS_DB, decode_responses=True
-            ).client()
-            prefix = f'{REDIS_PREFIX}:' if REDIS_PREFIX else ''
-            session_key = f'{prefix}sessions:{session_key}'
-            session = await redis.get(session_key)
-            await redis.close()
+            with self.timing.measure('session'):
+                redis = await aioredis.Redis(
+                    host=REDIS_SERVER, db=REDIS_DB, decode_responses=True
+                ).client()
+                prefix = f'{REDIS_PREFIX}:' if REDIS_PREFIX else ''
+                session_key = f'{prefix}sessions:{session_key}'
+                session = await redis.get(session_key)
+                await redis.close()
         else:
             session = None
 
@@ -185,7 +318,8 @@ class BaseResource(View):
             if self.account:
                 tenant = self.account['id']
                 self.account_id = tenant
-                self.account_db = await set_tenant(tenant)
+                with self.timing.measure('tenant'):
+                    self.account_db = await set_tenant(tenant)
             else:
                 self.account_db = 'default'
 
@@ -194,6 +328,12 @@ class BaseResource(View):
         # func é o método que será executado, caso exista rota personalizada
         func, match, allowed_methods = self.get_method(request, args, kwargs)
 
+        # POST <resource>/batch é uma leitura de vários ids, tratada pelo get,
+        # se nenhuma rota personalizada do resource responder por esse path
+        self.batch = not func and request.method == 'POST' and bool(re_batch.search(request.path))
+        if self.batch:
+            self.method = 'get'
+
         if func:
             self.allowed_methods = allowed_methods or self.allowed_methods
 
@@ -203,24 +343,60 @@ class BaseResource(View):
         if self.method not in self.allowed_methods:
             raise HTTPException(405, f'{self.method.upper()} not allowed')
 
-        if not func:
-            handler = getattr(self, self.method, method_not_allowed)
+        handler = None if func else getattr(self, self.method, method_not_allowed)
+
+        if self.query_budget:
+            self.query_budget.alias = getattr(self, 'account_db', None)
+            if func:
+                self.query_budget.kind = func.__name__
+            elif self.batch or request.GET.get('ids'):
+                self.query_budget.kind = 'batch'
+            elif self.method == 'get':
+                self.query_budget.kind = 'detail' if re_id.match(request.path) else 'list'
+            else:
+                self.query_budget.kind = self.method
+
+        # Detalhe sem alteração desde a versão do cliente, antes do cache e do get_obj
+        if self.etag_field and self.method == 'get' and not func and not self.batch:
+            match = re_id.match(request.path)
+            if match:
+                self.validators = await self.object_validators(request, match[2])
+                response = self.validators and not_modified(request, *self.validators)
+                if response:
+                    return response
 
-        self.cache = self.cache and self.method == 'get'
+        # O cache é por path: ?ids= e POST batch não entram, a listagem tem o mesmo path
+        self.cache = self.cache and self.method == 'get' and not self.batch and not request.GET.get('ids')
         if self.cache:
             self.cache_key = f'{REDIS_PREFIX}:cache' if REDIS_PREFIX else 'easyapi:cache'
             if self.session_cache:
                 self.cache_key += f':{session_key}'
             self.cache_key += f':{request.path}'
 
-            redis = await aioredis.Redis(
-                host=REDIS_SERVER, db=REDIS_DB, decode_responses=True
-            ).client()
-            response = await redis.get(self.cache_key)
-            await redis.close()
+        # Leituras idênticas e simultâneas esperam a primeira e copiam sua resposta
+        if self.coalesce and self.method in self.coalesce_methods:
+            key = request_key(
+                getattr(self, 'account_db', None), request.method, request.path, self.coalesce_scope(session_key),
+                query=request.GET, body=request.body if self.method != 'get' or self.batch else None,
+            )
+            return await coalesce(key, lambda: self.respond(request, func, match, handler))
 
-            if response:
-                return JsonResponse(json.loads(response), safe=False)
+        return await self.respond(request, func, match, handler)
+
+    async def respond(self, request, func, match, handler):
+        if self.cache:
+            # Com compressão, o corpo já comprimido na codificação pedida vem junto
+            encoding = self.compression and negotiate(request.headers.get('Accept-Encoding', ''))
+            keys = [self.cache_key, f'{self.cache_key}:{encoding}'] if encoding else [self.cache_key]
+
+            with self.timing.measure('cache'):
+                redis = await aioredis.Redis(host=REDIS_SERVER, db=REDIS_DB).client()
+                values = await redis.mget(*keys)
+                await redis.close()
+
+            if values[0]:
+                self.encoded_body = values[1] if encoding else None
+                return HttpResponse(values[0], content_type='application/json')
 
         if self.method in ['post', 'patch']:
             try:
@@ -236,20 +412,22 @@ class BaseResource(View):
 
         request = await self.pre_process(request)
 
-        self.build_filters(request)
-        self.paginate(request)
-        self.ordenate(request)
+        with self.timing.measure('filters'):
+            self.build_filters(request)
+            self.paginate(request)
+            self.ordenate(request)
 
-        if func:
-            if self.method in ['post', 'patch']:
-                response = await func(request, match=match, body=body)
+        with self.timing.measure('handler'):
+            if func:
+                if self.method in ['post', 'patch']:
+                    response = await func(request, match=match, body=body)
+                else:
+                    response = await func(request, match=match)
             else:
-                response = await func(request, match=match)
-        else:
-            response = await handler(request)
+                response = await handler(request)
 
-        if type(response) == dict:
-            response = await self.serialize(response)
+            if type(response) == dict:
+                response = await self.serialize(response)
 
         return response
 
@@ -261,40 +439,13 @@ class BaseResource(View):
             self.queryset = self.queryset.filter(**self.model_filter)
 
         if request.GET.get('search'):
-            self.search_fields += ['id']
-            filters = reduce(
-                operator.or_, [
-                    Q((f'{field}__{self.search_operator}',
-                      request.GET.get('search')))
-                    for field in self.search_fields
-                ]
-            )
-            self.queryset = self.queryset.filter(filters)
+            self.search_term = request.GET.get('search')
+            self.queryset = self.search_backend.filter(self, self.queryset, self.search_term)
 
-        params = dict(request.GET)
         if self.filter_fields:
-            filter = {}
-            for key in params:
-                if search_regex.search(key):
-                    keys = key.split('__')
-                    if len(keys) == 3:
-                        field = f'{keys[0]}__{keys[1]}'
-                    else:
-                        field = keys[0]
-
-                else:
-                    field = key
-
-                if field in self.filter_fields:
-                    param = params[key][0]
-                    if param.lower() == 'false':
-                        param = False
-                    elif param.lower() == 'true':
-                        param = True
-
-                    filter[key] = param
-
-            self.queryset = self.queryset.filter(**filter)
+            timezone_name = self.user.get('timezone', 'UTC') if self.user else 'UTC'
+            filters = FilterSchema.for_resource(type(self)).filters(request.GET, timezone_name)
+            self.queryset = self.queryset.filter(**filters)
 
         if (
             self.model and f'{self.model._meta.app_label}_{self.model._meta.model_name}' == 'core_tag'
@@ -305,30 +456,33 @@ class BaseResource(View):
 
         tags = request.GET.get('tags')
         if tags and hasattr(self.model, 'tags'):
-            tags_operator = request.GET.get('tags_operator', 'OR')
-            tags_ids = tags.split(',')
-            if tags_operator == 'OR':
-                self.queryset = self.queryset.filter(tags__id__in=tags_ids)
-
-            # try:
-            #     tags = self.Meta.related_tag_model['model'].objects.filter(
-            #         tag_id__in=tag_values
-            #     ).values(self.Meta.related_tag_model['field']).annotate(count=Count('tag_id'))
-            # except Exception:
-            #     orm_filters['pk__in'] = []
-            #     return orm_filters
+            tags_operator = request.GET.get('tags_operator', 'OR').upper()
+            if tags_operator not in M2M_OPERATORS:
+                raise HTTPException(400, f'tags_operator must be one of {", ".join(M2M_OPERATORS)}')
 
-            # if filters.get('tags_operator', 'AND').upper() == ConditionOperator.AND:
-            #     total_tags = len(tag_values)
-            #     tags = tags.filter(count=total_tags)
-
-            # orm_filters['pk__in'] = [obj[self.Meta.related_tag_model['field']] for obj in tags]
+            self.queryset = self.queryset.filter(
+                m2m_filter(self.model, 'tags', tags.split(','), tags_operator)
+            )
 
     def ordenate(self, request):
         order_by = request.GET.get('order_by')
         if order_by and order_by.split('-')[-1] in self.order_fields:
             self.order_by = order_by
 
+        # Sem ordem pedida, buscas saem pela relevância do backend (ver rank_search)
+        elif self.search_term:
+            self.search_ranked = True
+
+    def rank_search(self):
+        """Order a search by the backend relevance, on the final queryset (after ``?filter=``)."""
+        if not self.search_ranked:
+            return
+
+        relevance = self.search_backend.relevance(self.queryset, self.search_term)
+        if relevance is not None:
+            self.queryset = self.queryset.alias(**{RELEVANCE: relevance})
+            self.order_by = [f'-{RELEVANCE}', *make_list(self.order_by)]
+
     def paginate(self, request):
         page = request.GET.get('page')
         if page:
@@ -356,32 +510,46 @@ class BaseResource(View):
         if response:
             return response
 
-        if not self.count_results:
-            if isinstance(result, list):
-                for row in result:
-                    await self.dehydrate(row)
+        with self.timing.measure('serialize'):
+            if not self.count_results:
+                if isinstance(result, list):
+                    for row in result:
+                        await self.dehydrate(row)
 
-            elif type(result) == dict and 'objects' in result:
-                for row in result['objects']:
-                    await self.dehydrate(row)
-            else:
-                result = await self.dehydrate(result)
+                elif type(result) == dict and 'objects' in result:
+                    for row in result['objects']:
+                        await self.dehydrate(row)
+                else:
+                    result = await self.dehydrate(result)
+
+            result = await self.post_process(result)
+            response = JsonResponse(result, safe=False)
 
-        result = await self.post_process(result)
-        await self.save_cache(result)
+        # Gravado no fim do dispatch, junto com o corpo comprimido
+        if self.cache:
+            self.cache_body = response.content
+
+        return response
 
-        return JsonResponse(result, safe=False)
+    async def save_cache(self, content, encoded=None, encoding=None):
+        """Cache the response body and its ``encoded`` version, if any, in one transaction.
 
-    async def save_cache(self, content):
+        The other encodings are deleted, so a compressed body never outlives its plain one.
+        """
         if not self.cache:
             return
 
-        redis = await aioredis.Redis(
-            host=REDIS_SERVER, db=REDIS_DB, decode_responses=True
-        ).client()
-        await redis.set(self.cache_key, json.dumps(content))
-        await redis.expire(self.cache_key, self.cache_ttl)
-        await redis.close()
+        stale = [f'{self.cache_key}:{name}' for name in available() if name != encoding]
+        with self.timing.measure('cache'):
+            redis = await aioredis.Redis(host=REDIS_SERVER, db=REDIS_DB).client()
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.set(self.cache_key, content, ex=self.cache_ttl)
+                if encoded is not None:
+                    pipe.set(f'{self.cache_key}:{encoding}', encoded, ex=self.cache_ttl)
+                if stale:
+                    pipe.delete(*stale)
+                await pipe.execute()
+            await redis.close()
 
     def filter_objs(self):
         pass
@@ -407,6 +575,21 @@ class BaseResource(View):
     async def post_process(self, response):
         return response
 
+    async def invalidate_metrics(self):
+        await invalidate_metrics(self.model, getattr(self, 'account_db', 'default'))
+
+    async def rollup_values(self, id):
+        """Date and group fields of the object read by the model rollups."""
+        fields = rollups_registry.fields(self.model)
+        if not fields:
+            return None
+
+        return await self.model.objects.filter(pk=id).values(*fields).afirst()
+
+    async def refresh_rollups(self, *values):
+        for rollup in rollups_registry.for_model(self.model):
+            await rollup.refresh(values)
+
     #########################################################
     # GET
     #########################################################
@@ -450,7 +633,7 @@ class BaseResource(View):
         if OrmFilter:
             queryset = OrmFilter(
                 self.model,
-                self.user.timezone if self.user else 'UTC'
+                self.user.get('timezone', 'UTC') if self.user else 'UTC'
             )
             queryset = queryset.filter_by(conditions)
             self.queryset = queryset.distinct()
@@ -492,8 +675,11 @@ class BaseResource(View):
         return result
 
     async def get_objs(self, request):
-        self.get_filters(request)
-        self.filter_objs()
+        with self.timing.measure('filters'):
+            self.get_filters(request)
+            self.filter_objs()
+
+        await QueryGuard(max_estimated_rows=self.max_estimated_rows).check_estimate(self.queryset)
 
         if request.GET.get('count'):
             return await self.count()
@@ -506,8 +692,9 @@ class BaseResource(View):
         if self.list_related_fields:
             self.queryset = self.queryset.select_related(*self.list_related_fields.keys())
 
+        self.rank_search()
         self.queryset = self.queryset.order_by(
-            self.order_by
+            *make_list(self.order_by)
         )
 
         if self.limit:
@@ -523,6 +710,7 @@ class BaseResource(View):
             list_fields = self.list_fields
             related = True
 
+        ids = []
         async for row in self.queryset:
             result = {}
             if related:
@@ -537,9 +725,31 @@ class BaseResource(View):
                 result[field] = getattr(row, field, None)
 
             results.append(result)
+            ids.append(row.pk)
+
+        if related and self.list_m2m_fields and results:
+            await self.prefetch_m2m(results, ids)
 
         return results
 
+    async def prefetch_m2m(self, results, ids):
+        """Add the ``list_m2m_fields`` to the rows of the page, one query per many to many."""
+        for name, fields in self.list_m2m_fields.items():
+            through, source, target, _ = m2m_path(self.model, name)
+            columns = [f'{target}__{field}' for field in fields]
+
+            # Só as colunas pedidas, agrupadas pelo id do objeto
+            related = {id: [] for id in ids}
+            links = through.objects.using(self.queryset.db).filter(
+                **{f'{source}__in': ids}
+            ).order_by('pk').values_list(source, *columns)
+
+            async for source_id, *values in links:
+                related[source_id].append(dict(zip(fields, values)))
+
+            for result, id in zip(results, ids):
+                result[name] = related[id]
+
     async def get_objs_old(self, request):
         self.get_filters(request)
         self.filter_objs()
@@ -560,7 +770,7 @@ class BaseResource(View):
                     self.list_fields.append(f'{key}__{field}')
 
         self.queryset = self.queryset.order_by(
-            self.order_by
+            *make_list(self.order_by)
         )
 
         if self.limit:
@@ -621,48 +831,61 @@ class BaseResource(View):
 
         return result
 
-    async def get_obj(self, id):
-        if self.edit_related_fields:
-            self.queryset = self.queryset.select_related(*self.edit_related_fields.keys())
+    async def object_validators(self, request, id):
+        """ETag and Last-Modified of the object from its ``etag_field``, None when not found.
 
-        self.obj = await self.queryset.filter(pk=id).afirst()
-        if not self.obj:
-            raise HTTPException(404, 'Object does not exist')
+        Any column works as ``etag_field``, ex: an integer version; Last-Modified is
+        only sent for datetimes. The ETag also changes when an ``edit_related_fields``
+        foreign key points to another row, not when that row is edited.
+        """
+        queryset = self.queryset
+        if hasattr(self, 'model_filter'):
+            queryset = queryset.filter(**self.model_filter)
 
-        result = {}
+        related = [f'{key}__pk' for key in self.edit_related_fields]
+        row = await queryset.filter(pk=id).values_list(self.etag_field, *related).afirst()
+        if row is None or row[0] is None:
+            return None
 
-        def get_field(args, model):
-            obj = args[0]
-            result = args[1]
-            count = args[2]
-            parent = args[3]
-            model_obj = getattr(obj, model, None)
-
-            if count == 0:
-                # Adicionado para não ser excluído no return_result
-                if model not in self.related_models:
-                    self.related_models[model] = []
-
-                if model_obj:
-                    result[model] = {}
-                    for field in self.edit_related_fields[parent]:
-                        result[model][field] = getattr(model_obj, field, None)
-                        self.related_models[model].append(field)
-                else:
-                    result[model] = None
+        version, *related = row
+        modified = version if isinstance(version, datetime) else None
+        version = version.isoformat() if modified else str(version)
 
-            else:
-                return model_obj, result, count - 1, parent
+        user = self.user['id'] if self.user else None
+        etag = version_etag(type(self).__name__, request.get_full_path(), user, version, *related)
+        return etag_validators(etag, modified)
+
+    def coalesce_scope(self, session_key):
+        """Who may share a coalesced response: the user, or the whole tenant with ``coalesce_tenant``."""
+        if self.coalesce_tenant:
+            return None
+
+        return self.user['id'] if self.user else session_key
 
+    def detail_result(self, obj):
+        """``edit_fields`` and ``edit_related_fields`` of ``obj``."""
+        result = {}
         for key, value in self.edit_related_fields.items():
             model = key.split('__')
             count = len(model) - 1
             reduce(
-                get_related_objects, model, (self.obj, result, count, key, self.related_models, self.edit_related_fields)
+                get_related_objects, model, (obj, result, count, key, self.related_models, self.edit_related_fields)
             )
 
         for field in self.edit_fields:
-            result[field] = getattr(self.obj, field, None)
+            result[field] = getattr(obj, field, None)
+
+        return result
+
+    async def get_obj(self, id):
+        if self.edit_related_fields:
+            self.queryset = self.queryset.select_related(*self.edit_related_fields.keys())
+
+        self.obj = await self.queryset.filter(pk=id).afirst()
+        if not self.obj:
+            raise HTTPException(404, 'Object does not exist')
+
+        result = self.detail_result(self.obj)
 
         # results = {}
         for key, value in self.edit_set.items():
@@ -673,6 +896,61 @@ class BaseResource(View):
 
         return result
 
+    def batch_ids(self, request):
+        """Ids of ``?ids=1,2,3`` or of the ``{"ids": [...]}`` body of ``POST <resource>/batch``."""
+        if self.batch:
+            try:
+                ids = json.loads(request.body.decode('utf-8'))['ids']
+            except Exception:
+                raise HTTPException(400, 'Body must be {"ids": [...]}')
+        else:
+            ids = request.GET['ids'].split(',')
+
+        coerce = coercer(self.model._meta.pk)
+        try:
+            ids = list(dict.fromkeys(coerce(id) for id in make_list(ids) if id != ''))
+        except (ValidationError, ValueError, TypeError):
+            raise HTTPException(400, 'Invalid ids')
+
+        if self.max_batch_ids and len(ids) > self.max_batch_ids:
+            raise HTTPException(400, f'At most {self.max_batch_ids} ids')
+
+        return ids
+
+    async def get_batch(self, ids):
+        """Objects of ``ids`` in the requested order, with one query and the detail fields."""
+        if self.edit_related_fields:
+            self.queryset = self.queryset.select_related(*self.edit_related_fields.keys())
+
+        objects = {}
+        async for obj in self.queryset.filter(pk__in=ids):
+            objects[obj.pk] = self.detail_result(obj)
+
+        for key, fields in self.edit_set.items():
+            await self.batch_set(objects, key, fields)
+
+        return {
+            'objects': [objects[id] for id in ids if id in objects],
+            'missing': [id for id in ids if id not in objects],
+        }
+
+    async def batch_set(self, objects, key, fields):
+        """``edit_set`` ``key`` of all ``objects``, one query for the batch."""
+        for result in objects.values():
+            result[key] = []
+
+        # Consulta pelo model relacionado, com a mesma ordem do get_obj
+        descriptor = getattr(self.model, key)
+        if getattr(descriptor, 'reverse', True):
+            model, source = descriptor.rel.related_model, descriptor.rel.field.name
+        else:
+            model, source = descriptor.rel.model, descriptor.rel.field.related_query_name()
+
+        rows = model.objects.filter(**{f'{source}__in': list(objects)}).values_list(source, *fields)
+
+        async for source_id, *values in rows.using(self.queryset.db):
+            objects[source_id][key].append(dict(zip(fields, values)))
+
     async def _get_objs(self, request):
         data = await self.get_objs(request)
         return await self.return_results(data)
@@ -683,6 +961,9 @@ class BaseResource(View):
             id = match[2]
             data = await self.get_obj(id)
             return await self.serialize(data)
+        elif self.batch or request.GET.get('ids'):
+            data = await self.get_batch(self.batch_ids(request))
+            return await self.serialize(data)
         else:
             data = await self._get_objs(request)
             return await self.serialize(data)
@@ -702,7 +983,11 @@ class BaseResource(View):
         match = re_id.match(request.path_info)
         if match:
             id = match[2]
+            old = await self.rollup_values(id)
             results = await self.delete_obj(id)
+            await self.refresh_rollups(old)
+            await self.search_backend.remove(id)
+            await self.invalidate_metrics()
             return await self.serialize(results)
         else:
             raise HTTPException(404, 'Item not found')
@@ -787,13 +1072,25 @@ class BaseResource(View):
 
                 setattr(self.obj, key, value)
 
+        # O update não passa pelo auto_now, a versão do etag_field muda aqui
+        if self.etag_field and self.etag_field not in to_update:
+            field = self.model._meta.get_field(self.etag_field)
+            if isinstance(field, models.DateTimeField):
+                to_update[self.etag_field] = timezone.now()
+            elif isinstance(field, models.IntegerField):
+                to_update[self.etag_field] = models.F(self.etag_field) + 1
+
         await self.model.objects.filter(pk=id).aupdate(**to_update)
 
         return await self.get_obj(id)
 
     async def _update_obj(self, id, body):
         self.obj_id = id
+        old = await self.rollup_values(id)
         result = await self.update_obj(id, body)
+        await self.refresh_rollups(old, await self.rollup_values(id))
+        await self.search_backend.index(id)
+        await self.invalidate_metrics()
         return await self.return_result(result)
 
     async def patch(self, request):
@@ -891,6 +1188,9 @@ class BaseResource(View):
             error = err.__str__()
             raise HTTPException(400, error)
 
+        await self.refresh_rollups(await self.rollup_values(self.obj_id))
+        await self.search_backend.index(self.obj_id)
+        await self.invalidate_metrics()
         return await self.serialize(result)
 
 
@@ -0,0 +1,78 @@
+from collections import Counter
+import logging
+import re
+
+from django.conf import settings
+
+from .exception import QueryBudgetExceeded
+
+logger = logging.getLogger('easyapi.budget')
+
+# Listas de placeholders de tamanhos diferentes (IN) são o mesmo template
+re_placeholders = re.compile(r'\((?:%s|\?)(?:,\s*(?:%s|\?))*\)')
+
+
+def sql_template(sql):
+    return re_placeholders.sub('(...)', sql)
+
+
+def get_budget_action():
+    """``raise``, ``log`` or None (disabled).
+
+    Set with ``settings.EASYAPI_QUERY_BUDGET``; by default budgets are only
+    enforced, raising, when ``settings.DEBUG`` is on.
+    """
+    action = getattr(settings, 'EASYAPI_QUERY_BUDGET', None)
+    if action is None:
+        return 'raise' if settings.DEBUG else None
+
+    return action or None
+
+
+class QueryBudget:
+    """Counts the queries a request runs on the tenant connection."""
+
+    def __init__(self, max_queries, action, alias=None):
+        self.max_queries = max_queries
+        self.action = action
+        self.alias = alias
+        self.kind = None
+        self.templates = []
+
+    def add_query(self, sql, elapsed, alias):
+        if self.alias and alias != self.alias:
+            return
+        self.templates.append(sql_template(sql))
+
+    @property
+    def limit(self):
+        if isinstance(self.max_queries, dict):
+            return self.max_queries.get(self.kind)
+
+        return self.max_queries
+
+    def duplicated(self):
+        return [
+            (template, count) for template, count in Counter(self.templates).most_common()
+            if count > 1
+        ]
+
+    def check(self, resource):
+        limit = self.limit
+        if limit is None or len(self.templates) <= limit:
+            return
+
+        message = (
+            f'{resource.__class__.__name__} ({self.kind}) ran {len(self.templates)} '
+            f'queries, budget is {limit}'
+        )
+        duplicated = self.duplicated()
+        if duplicated:
+            message += '. Duplicated:\n' + '\n'.join(
+                f'  {count}x {template}' for template, count in duplicated
+            )
+
+        if self.action == 'raise':
+            raise QueryBudgetExceeded(message)
+
+        logger.warning(message)
@@ -1,15 +1,36 @@
+import asyncio
+from bisect import bisect_right
 from collections import OrderedDict
-from datetime import datetime
-from importlib import import_module
+from datetime import datetime, time, timedelta
+from functools import lru_cache, partial
+import hashlib
+from itertools import islice, repeat
+import json
 import re
 
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models import Func, Count, Sum, Max, Min, Avg, Variance, StdDev
-import pandas as pd
-
-from .dates import Dates
+from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_date, parse_datetime
+import pytz
+
+from .dates import resolve_period
+from .exception import HTTPException
+from .formula import compile_formula, formula_fields
+from .hll import HyperLogLog, sketches
+from .metrics_cache import cached_sketches, normalize_body, store_sketches
+from .registry import registry
+from .rollup import registry as rollups_registry
+from .tenant.tenant import db_state
+from .util import LazyModule, optional_import
+
+# Importados no primeiro uso, fora do import easyapi
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
 
 USE_TZ = settings.USE_TZ
 
@@ -26,85 +47,85 @@ CALC = {
 }
 
 
-class Year(Func):
-    template = """DATE_FORMAT(
-        CONVERT_TZ(
-            %(expressions)s  + INTERVAL %(interval)s SECOND,
-            "UTC",
-            "%(tzinfo)s"
-        ),
-        "%%%%Y")"""
+class DateFormat(Func):
+    """Bucket label of a date already moved to local time (see ``local_date``).
+
+    ``sqlite_template`` lets the offline benchmarks run the same grouping.
+    """
     output_field = models.CharField()
+    sqlite_template = None
 
+    def as_sql(self, compiler, connection, template=None, **extra_context):
+        template = template or self.template
+        sql, params = super().as_sql(compiler, connection, template=template, **extra_context)
+        # A data pode aparecer mais de uma vez no template
+        return sql, tuple(params) * template.count('%(expressions)s')
 
-class Quarter(Func):
-    template = """CONCAT(DATE_FORMAT(
-        CONVERT_TZ(
-            %(expressions)s  + INTERVAL %(interval)s SECOND,
-            "UTC",
-            "%(tzinfo)s"
-        ),
-        "%%%%Y"),
-        " ",
-        CEIL(EXTRACT(MONTH from %(expressions)s + INTERVAL %(interval)s SECOND)/3),
-        "Q"
-    )"""
-    output_field = models.CharField()
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template=self.sqlite_template, **extra_context)
 
 
-class Month(Func):
-    template = """DATE_FORMAT(
-        CONVERT_TZ(
-            %(expressions)s  + INTERVAL %(interval)s SECOND,
-            "UTC",
-            "%(tzinfo)s"
-        ),
-        "%%%%Y-%%%%m")"""
-    output_field = models.CharField()
+class Year(DateFormat):
+    template = 'DATE_FORMAT(%(expressions)s, "%%%%Y")'
+    sqlite_template = "strftime('%%%%Y', %(expressions)s)"
 
 
-class Day(Func):
-    template = """DATE_FORMAT(
-        CONVERT_TZ(
-            %(expressions)s  + INTERVAL %(interval)s SECOND,
-            "UTC",
-            "%(tzinfo)s"
-        ),
-        "%%%%Y-%%%%m-%%%%d")"""
-    output_field = models.CharField()
+class Quarter(DateFormat):
+    template = 'CONCAT(YEAR(%(expressions)s), " ", QUARTER(%(expressions)s), "Q")'
+    sqlite_template = (
+        "strftime('%%%%Y', %(expressions)s) || ' ' || "
+        "((CAST(strftime('%%%%m', %(expressions)s) AS INTEGER) + 2) / 3) || 'Q'"
+    )
 
 
-class WeekDay(Func):
-    template = """DATE_FORMAT(
-        CONVERT_TZ(
-            %(expressions)s  + INTERVAL %(interval)s SECOND,
-            "UTC",
-            "%(tzinfo)s"
-        ),
-        "%%%%W")"""
-    output_field = models.CharField()
+class Month(DateFormat):
+    template = 'DATE_FORMAT(%(expressions)s, "%%%%Y-%%%%m")'
+    sqlite_template = "strftime('%%%%Y-%%%%m', %(expressions)s)"
 
 
-class WeekDayHour(Func):
-    template = """DATE_FORMAT(
-        CONVERT_TZ(
-            %(expressions)s  + INTERVAL %(interval)s SECOND,
-            "UTC",
-            "%(tzinfo)s"
-        ),
-        "%%%%W %%%%H")"""
-    output_field = models.CharField()
+class Day(DateFormat):
+    template = 'DATE_FORMAT(%(expressions)s, "%%%%Y-%%%%m-%%%%d")'
+    sqlite_template = "strftime('%%%%Y-%%%%m-%%%%d', %(expressions)s)"
 
 
-class Hour(Func):
-    template = """DATE_FORMAT(
-        CONVERT_TZ(
-            %(expressions)s  + INTERVAL %(interval)s SECOND,
-            "UTC",
-            "%(tzinfo)s"
-        ),
-        "%%%%Y-%%%%m-%%%%d %%%%H")"""
-    output_field = models.CharField()
+SQLITE_WEEKDAY = (
+    "CASE strftime('%%%%w', %(expressions)s) WHEN '0' THEN 'Sunday' WHEN '1' THEN 'Monday' "
+    "WHEN '2' THEN 'Tuesday' WHEN '3' THEN 'Wednesday' WHEN '4' THEN 'Thursday' "
+    "WHEN '5' THEN 'Friday' ELSE 'Saturday' END"
+)
+
+
+class WeekDay(DateFormat):
+    template = 'DATE_FORMAT(%(expressions)s, "%%%%W")'
+    sqlite_template = SQLITE_WEEKDAY
+
+
+class WeekDayHour(DateFormat):
+    template = 'DATE_FORMAT(%(expressions)s, "%%%%W %%%%H")'
+    sqlite_template = SQLITE_WEEKDAY + " || ' ' || strftime('%%%%H', %(expressions)s)"
+
+
+class Hour(DateFormat):
+    template = 'DATE_FORMAT(%(expressions)s, "%%%%Y-%%%%m-%%%%d %%%%H")'
+    sqlite_template = "strftime('%%%%Y-%%%%m-%%%%d %%%%H', %(expressions)s)"
+
+
+class Week(DateFormat):
+    template = 'DATE_FORMAT(%(expressions)s, "%%%%x-W%%%%v")'
+    sqlite_template = "strftime('%%%%G-W%%%%V', %(expressions)s)"
+
+
+class Shift(Func):
+    """A UTC date moved by ``offset`` seconds (a number or a CASE expression)."""
+    template = '(%(expressions)s SECOND)'
+    arg_joiner = ' + INTERVAL '
+    output_field = models.DateTimeField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="datetime(%(expressions)s || ' seconds')", arg_joiner=', ',
+            **extra_context
+        )
 
 
 EXTRACT = {
@@ -112,74 +133,197 @@ EXTRACT = {
     'hour': Hour,
     'month': Month,
     'quarter': Quarter,
+    'week': Week,
     'weekday': WeekDay,
     'weekdayhour': WeekDayHour,
     'year': Year
 }
 
+# Frequência do pandas e formato dos rótulos gerados por EXTRACT, para preencher lacunas
+BUCKETS = {
+    'hour': ('h', '%Y-%m-%d %H'),
+    'day': ('D', '%Y-%m-%d'),
+    'week': ('W-SUN', '%G-W%V'),
+    'month': ('M', '%Y-%m'),
+    'quarter': ('Q', '%Y %qQ'),
+    'year': ('Y', '%Y'),
+}
 
-def get_model(model_name):
-    module, _class_name = model_name.split('_')
+DATETIME_UNITS = {'hour': 'h', 'day': 'D', 'month': 'M', 'year': 'Y'}
 
-    try:
-        model = getattr(
-            import_module('modules.{}.models'.format(module.lower())),
-            _class_name
-        )
-    except ImportError:
-        return
+# Contagem aproximada de valores distintos por HyperLogLog, calculada em Python
+APPROX = 'approx_count_distinct'
+
+# Linhas lidas do banco por vez ao montar os sketches
+APPROX_CHUNK = 20000
+
+# Agrupamentos com hora usam sketches por hora, os outros por dia
+SKETCH_UNITS = {'hour': 'hour', 'weekdayhour': 'hour'}
+
+# Formatos de resposta com uma lista por série em vez de um dict por linha
+COLUMNAR = ['columns', 'arrow']
+
+
+# Tabelas de offsets começam aqui quando a consulta não tem período
+EPOCH = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=256)
+def offset_table(zone, start=None, end=None):
+    """UTC offsets of ``zone`` in force between ``start`` and ``end`` (naive UTC).
+
+    A tuple of ``(since, seconds)`` in chronological order, where ``since`` is the
+    UTC instant the offset starts (None for the first one). Built from the pytz
+    transitions, so daylight saving time changes inside the period are kept.
+    """
+    tz = pytz.timezone(zone)
+    transitions = getattr(tz, '_utc_transition_times', None)
+    if not transitions:
+        return ((None, int(tz.utcoffset(EPOCH).total_seconds())),)
+
+    first = max(bisect_right(transitions, start or EPOCH) - 1, 0)
+    last = bisect_right(transitions, end) if end else len(transitions)
+
+    table = []
+    for since, info in zip(transitions[first:last], tz._transition_info[first:last]):
+        seconds = int(info[0].total_seconds())
+        if not table:
+            table.append((None, seconds))
+        elif seconds != table[-1][1]:
+            table.append((since, seconds))
+
+    return tuple(table)
 
-    return model
+
+def utc_day(value, days=0):
+    """Day of an aware datetime in UTC, naive, moved ``days`` for margin."""
+    if not isinstance(value, datetime) or django_timezone.is_naive(value):
+        return None
+
+    value = value.astimezone(pytz.utc).replace(tzinfo=None)
+    return datetime.combine(value.date(), time.min) + timedelta(days=days)
+
+
+async def date_bounds(queryset, field, timezone, start_date=None, end_date=None):
+    """``start_date`` and ``end_date`` for ``local_date``, the missing ones read from the rows.
+
+    Without them the offset CASE would have every transition since 1970; with
+    the first and last dates of ``queryset`` it only has the ones in the data,
+    or none (a single shift).
+    """
+    if not USE_TZ or (start_date and end_date) or len(offset_table(timezone.zone)) == 1:
+        return start_date, end_date
+
+    bounds = await queryset.aaggregate(first=Min(field), last=Max(field))
+    return start_date or bounds['first'], end_date or bounds['last']
+
+
+def local_date(field, timezone, start_date=None, end_date=None):
+    """``field`` moved from UTC to local time in ``timezone``, row by row.
+
+    Each row gets the offset in force at its own instant, from ``offset_table``,
+    instead of one offset for the whole query or the timezone tables of the
+    database. Pass the period bounds (see ``date_bounds``) to keep the CASE to
+    the transitions inside them.
+    """
+    if not USE_TZ:
+        # Sem USE_TZ as datas já estão no horário local
+        return models.F(field)
+
+    table = offset_table(timezone.zone, utc_day(start_date, -1), utc_day(end_date, 1))
+    if len(table) == 1:
+        if not table[0][1]:
+            return models.F(field)
+        return Shift(field, models.Value(table[0][1]))
+
+    # Mais recentes primeiro: a maioria das linhas para no primeiro WHEN
+    offset = models.Case(
+        *[
+            models.When(**{f'{field}__gte': since.replace(tzinfo=pytz.utc)}, then=models.Value(seconds))
+            for since, seconds in reversed(table[1:])
+        ],
+        default=models.Value(table[0][1]),
+        output_field=models.IntegerField(),
+    )
+    return Shift(field, offset)
+
+
+def get_model(model_name):
+    return registry.get(model_name).model
 
 
 def get_fields(model, fields):
     return model._meta.get_fields()
 
 
-async def aggregate(
-    model, on_field, calc, timezone, distinct
-):
+def get_aggregation(model, on_field):
+    if isinstance(on_field, list):
+        return compile_formula(model, on_field)
 
+    return on_field
+
+
+def get_aggregate(model, on_field, calc, distinct):
+    """Expression used by ``aggregate`` (only the first formula is used)."""
     calc = CALC[calc[0]]
+    aggregation = get_aggregation(model, on_field)
 
-    aggregation = ''
     if isinstance(on_field, list):
-        for key in on_field:
-            if key in ['*', '+', '-', '/', '^']:
-                aggregation += key
-            else:
-                aggregation += f'models.F("{key}")'
-        aggregation = eval(aggregation)
-    else:
-        aggregation = on_field
+        return calc(aggregation, output_field=models.FloatField(), distinct=distinct)
+
+    return calc(aggregation, distinct=distinct)
+
+
+def get_formulas(model, on_field, calc, distinct, prefix=''):
+    """Expressions annotated by ``group_by``, one per formula, keyed by ``prefix + formula``."""
+    if not on_field:
+        on_field = 'id'
+
+    aggregation = get_aggregation(model, on_field)
 
-    if on_field == 'id':
-        data = await model.aaggregate(aggregated_total=calc(aggregation, distinct=distinct))
+    formulas = {}
+    for formula in calc:
+        function = CALC[formula]
 
-    elif isinstance(on_field, list):
-        data = await model.aaggregate(
-            aggregated_total=calc(
+        # Sum retorna Decimal e precisamos de Float/Int para exibir o gráfico corretamente
+        if formula == 'sum':
+            formulas[prefix + formula] = function(
                 aggregation,
                 output_field=models.FloatField(),
                 distinct=distinct
             )
-        )
+        else:
+            formulas[prefix + formula] = function(aggregation, distinct=distinct)
+
+    return formulas
 
-    elif on_field:
-        data = await model.values(
-            on_field
-        ).aaggregate(aggregated_total=calc(aggregation, distinct=distinct))
+
+async def aggregate(
+    model, on_field, calc, timezone, distinct
+):
+    data = await model.aaggregate(
+        aggregated_total=get_aggregate(model.model, on_field, calc, distinct)
+    )
 
     return {'total': data['aggregated_total']}
 
 
 async def group_by(
     model, on_field, additional_fields, calc, groups, order,
-    timezone, date_group, limit, distinct
+    timezone, date_group, limit, distinct, start_date=None, end_date=None
 ):
+    formulas = get_formulas(model.model, on_field, calc, distinct)
+
+    return await group_by_formulas(
+        model, formulas, additional_fields, groups, order, timezone, date_group, limit,
+        start_date, end_date
+    )
 
-    if not on_field:
-        on_field = 'id'
+
+async def group_by_formulas(
+    model, formulas, additional_fields, groups, order, timezone, date_group, limit,
+    start_date=None, end_date=None
+):
 
     if not groups:
         groups = []
@@ -190,18 +334,10 @@ async def group_by(
         extracted = 'extracted_' + date_field
         truncate = EXTRACT[group_by.lower()]
 
-        if USE_TZ:
-            # Para ajustar a busca no db de acordo com o timezone
-            seconds_offset = timezone.utcoffset(datetime.utcnow()).total_seconds()
-            exp = {extracted: truncate(date_field, tzinfo=timezone, interval=seconds_offset)}
-        else:
-            exp = {extracted: truncate(date_field, tzinfo=timezone, interval=0)}
-            # exp = {extracted: truncate(date_field, interval=0)}
-
-
-        model = model.annotate(
-            **exp
-        )
+        start_date, end_date = await date_bounds(model, date_field, timezone, start_date, end_date)
+        model = model.annotate(**{
+            extracted: truncate(local_date(date_field, timezone, start_date, end_date))
+        })
 
         if order:
             order.insert(0, extracted)
@@ -209,34 +345,6 @@ async def group_by(
 
     model = model.values(*groups)
 
-    formulas = {}
-    keys = []
-    aggregation = ''
-
-    if isinstance(on_field, list):
-        for key in on_field:
-            if key in ['*', '+', '-', '/', '^']:
-                aggregation += key
-            else:
-                aggregation += f'models.F("{key}")'
-        aggregation = eval(aggregation)
-    else:
-        aggregation = on_field
-
-    for formula in calc:
-        calc = CALC[formula]
-        keys.append(formula)
-
-        # Sum retorna Decimal e precisamos de Float/Int para exibir o gráfico corretamente
-        if formula == 'sum':
-            formulas[formula] = calc(
-                aggregation,
-                output_field=models.FloatField(),
-                distinct=distinct
-            )
-        else:
-            formulas[formula] = calc(aggregation, distinct=distinct)
-
     model = model.annotate(
         **formulas
     )
@@ -248,7 +356,7 @@ async def group_by(
         model = model[0:limit]
 
     # Valores a serem retornados
-    model = model.values(*groups, *keys, *additional_fields)
+    model = model.values(*groups, *formulas, *additional_fields)
 
     results = []
     async for result in model:
@@ -263,15 +371,35 @@ def get_dates(match, timezone):
 
     remove_tz = False if USE_TZ else True
     if delta_time == 'd':
-        func = Dates(tz=timezone, remove_tz=remove_tz).day_delta
+        period = 'day_delta'
 
     elif delta_time == 'm':
-        func = Dates(tz=timezone, remove_tz=remove_tz).month_delta
+        period = 'month_delta'
 
     elif delta_time == 'y':
-        func = Dates(tz=timezone, remove_tz=remove_tz).year_delta
+        period = 'year_delta'
+
+    return resolve_period(period, timezone, remove_tz, (delta_int,))
+
+
+def localize(value, timezone):
+    """Dates without timezone sent in a period are in the user's ``timezone``."""
+    if isinstance(value, str):
+        try:
+            parsed = parse_datetime(value) or parse_date(value)
+        except ValueError:
+            parsed = None
+
+        if parsed is None:
+            return value
+        if not isinstance(parsed, datetime):
+            parsed = datetime.combine(parsed, time.min)
+        value = parsed
 
-    return func(delta_int)
+    if USE_TZ and isinstance(value, datetime) and django_timezone.is_naive(value):
+        return pytz.timezone(timezone).localize(value)
+
+    return value
 
 
 def get_period(period, timezone):
@@ -290,9 +418,11 @@ def get_period(period, timezone):
     date_filter = {}
 
     if start_date:
+        start_date = localize(start_date, timezone)
         date_filter[f'{field}__gte'] = start_date
 
     if end_date:
+        end_date = localize(end_date, timezone)
         date_filter[f'{field}__lte'] = end_date
 
     if start_delta:
@@ -310,56 +440,118 @@ def get_period(period, timezone):
     return [date_filter, start_date, end_date]
 
 
-def normalize_dates(results, timezone, start_date, end_date, group_by, groups):
-    if not results:
-        return results
+def label_period(label, group_by):
+    """Period of a bucket label returned by ``EXTRACT``."""
+    freq, _ = BUCKETS[group_by]
+    if group_by == 'hour':
+        return pd.Period(pd.Timestamp(label + ':00'), freq=freq)
+    if group_by == 'week':
+        return pd.Period(pd.to_datetime(label + '-1', format='%G-W%V-%u'), freq=freq)
+    if group_by == 'quarter':
+        year, quarter = label.split(' ')
+        return pd.Period(f'{year}Q{quarter[:-1]}', freq=freq)
 
-    start = results[0]
-    end = results[-1]
+    return pd.Period(label, freq=freq)
 
-    if not start_date:
-        start_date = start['date']
 
-    if not end_date:
-        end_date = end['date']
+def date_period(value, group_by, timezone):
+    """Period of a ``start_date``/``end_date`` in the local ``timezone``."""
+    freq, _ = BUCKETS[group_by]
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert(timezone).tz_localize(None)
 
-    FREQ = {
-        'hour': 'H',
-        'day': 'D',
-        'month': 'MS',
-        'year': 'YS'
-    }
+    return timestamp.to_period(freq)
 
-    if USE_TZ:
-        dates = pd.date_range(
-            start_date, end_date, freq=FREQ[group_by.lower()], tz=timezone
-        )
+
+def bucket_labels(labels, start_date, end_date, group_by, timezone):
+    """Every bucket label between the period dates (or the first and last labels)."""
+    freq, fmt = BUCKETS[group_by]
+
+    observed = sorted(set(labels))
+    start = date_period(start_date, group_by, timezone) if start_date else label_period(observed[0], group_by)
+    end = date_period(end_date, group_by, timezone) if end_date else label_period(observed[-1], group_by)
+
+    periods = pd.period_range(start, end, freq=freq)
+    if group_by in DATETIME_UNITS:
+        # Bem mais rápido que Period.strftime para hora, dia, mês e ano
+        unit = DATETIME_UNITS[group_by]
+        dates = periods.to_timestamp().to_numpy().astype(f'datetime64[{unit}]')
+        complete = np.char.replace(np.datetime_as_string(dates, unit=unit), 'T', ' ').astype(object)
     else:
-        dates = pd.date_range(
-            start_date, end_date, freq=FREQ[group_by.lower()],
-        )
+        complete = periods.strftime(fmt).to_numpy(dtype=object)
 
-    distinct = {}
-    for result in results:
-        for group in groups:
-            if group not in distinct:
-                distinct[group] = [result[group]]
+    # Rótulos fora do período (ex: datas sem timezone) são mantidos
+    if (pd.Index(complete).get_indexer(observed) == -1).any():
+        return np.union1d(complete, np.array(observed, dtype=object))
+
+    return complete
+
+
+def fill_dates(results, date_key, groups, values, start_date, end_date, group_by, timezone):
+    """Date grouped rows with the missing buckets filled with zeros.
+
+    Every combination of ``groups`` seen in ``results`` gets a row for each
+    bucket of the period, ordered by date. The other columns (``additional_fields``)
+    of a created row come from the first row of its combination. Bucket
+    positions are computed with NumPy; only the missing rows are created, the
+    existing ones are reused.
+    """
+    group_by = (group_by or '').lower()
+    if not results or group_by not in BUCKETS:
+        return results
+
+    frame = pd.DataFrame({
+        column: [row[column] for row in results] for column in [date_key, *groups]
+    }, dtype=object)
+    if frame[date_key].isna().any():
+        return results
+
+    labels = bucket_labels(frame[date_key].unique(), start_date, end_date, group_by, timezone)
+
+    if groups:
+        combinations = frame[groups].drop_duplicates()
+        combination_codes = frame.groupby(groups, dropna=False, sort=False).ngroup().to_numpy()
+    else:
+        combinations = frame.iloc[:1, 0:0]
+        combination_codes = np.zeros(len(frame), dtype=np.int64)
+
+    # Linha i do resultado: bucket i // total de combinações, combinação i % total
+    width = len(combinations)
+    size = len(labels) * width
+    positions = pd.Index(labels).get_indexer(frame[date_key]) * width + combination_codes
+
+    present = np.zeros(size, dtype=bool)
+    present[positions] = True
+    if present.sum() != len(results):
+        # Linhas repetidas: não é um group by completo
+        return results
 
-            elif result[group] not in distinct[group]:
-                distinct[group].append(result[group])
+    missing = np.flatnonzero(~present)
+    if not len(missing):
+        return [results[i] for i in np.argsort(positions).tolist()]
 
-    data = {}
-    for i in range(len(dates)):
-        date = dates[i]
-        data[date] = []
+    others = [column for column in results[0] if column not in [date_key, *groups]]
+    zeros = [column for column in others if column in values]
+    copied = [column for column in others if column not in values]
 
-        for group in distinct:
+    # Os campos adicionais vêm da primeira linha da mesma combinação, não None
+    _, first = np.unique(combination_codes, return_index=True)
+    sources = first[missing % width].tolist()
 
-            for item in distinct[group]:
-                line = {}
-                line['date'] = date
-                line['y'] = 0
-                line[group] = item
+    names = [date_key, *groups, *copied, *zeros]
+    columns = [labels[missing // width].tolist()]
+    columns += [combinations[group].to_numpy()[missing % width].tolist() for group in groups]
+    columns += [[results[i][column] for i in sources] for column in copied]
+    columns += [repeat(0) for _ in zeros]
+    created = [dict(zip(names, keys)) for keys in zip(*columns)]
+
+    order = np.empty(size, dtype=np.int64)
+    order[positions] = np.arange(len(results))
+    order[missing] = np.arange(len(results), len(results) + len(created))
+
+    rows = results + created
+    return [rows[i] for i in order.tolist()]
 
 
 def normalize_groups(
@@ -426,28 +618,144 @@ def normalize_groups(
     return values, keys
 
 
-async def get_results(timezone, data):
-    model = data['model']
-    model = get_model(model)
-    model = model.objects
+def x_label(value):
+    # factorize devolve NaN no lugar de None
+    if value is None or value != value:
+        return 'Null'
+    elif value:
+        return value
 
-    additional_fields = data.get('additional_fields', [])
-    order = data.get('order', [])
-    limit = data.get('limit')
-    raw = data.get('raw')
-    keys = data.get('keys')
+    return 'Empty'
 
-    distinct = data.get('distinct', False)
 
-    formulas = data.get('calc', {'formula': ['count'], 'field': 'id'})
-    calc = formulas.get('formula', ['count'])
+def factorize(values):
+    """Codes and uniques of ``values`` in order of appearance, None included."""
+    return pd.factorize(np.array(values, dtype=object), use_na_sentinel=False)
+
+
+def columnar_groups(results, additional_fields, calc, groups):
+    """``{'x': [...], 'series': {key: [...]}}`` built straight from the query rows.
+
+    The same series ``normalize_groups`` returns as one dict per x value, as
+    one list per key aligned with ``x``. Keys missing for an x value are None.
+    """
+    x_codes, labels = factorize([row[groups[0]] for row in results])
+    width = len(labels)
+
+    def column(field):
+        # O último valor de cada x, como em normalize_groups
+        codes, last = np.unique(x_codes[::-1], return_index=True)
+        values = np.full(width, None, dtype=object)
+        values[codes] = np.array([row[field] for row in results], dtype=object)[::-1][last]
+        return values.tolist()
+
+    series = {field: column(field) for field in additional_fields}
+
+    if len(groups) == 1:
+        keys = list(calc)
+        for formula in calc:
+            series[formula] = column(formula)
+
+    else:
+        # Agrupamentos com 2 ou mais itens só podem ter uma fórmula de cálculo
+        key_codes, keys = factorize([str(row[groups[1]]) for row in results])
+        keys = keys.tolist()
+
+        # O primeiro valor de cada par (x, chave)
+        cells, first = np.unique(x_codes * len(keys) + key_codes, return_index=True)
+        table = np.full(width * len(keys), None, dtype=object)
+        table[cells] = np.array([row[calc[0]] for row in results], dtype=object)[first]
+        table = table.reshape(width, len(keys))
+
+        for position, key in enumerate(keys):
+            series[key] = table[:, position].tolist()
+
+    return {'x': [x_label(label) for label in labels.tolist()], 'series': series}, keys
+
+
+def to_arrow(results):
+    """Arrow IPC stream of a columnar result, with ``x`` and one column per key."""
+    pyarrow = optional_import('pyarrow')
+    if pyarrow is None:
+        raise HTTPException(400, 'Arrow format requires pyarrow')
+
+    if 'series' in results:
+        columns = {'x': results['x'], **results['series']}
+    else:
+        columns = {key: [value] for key, value in results.items()}
+
+    table = pyarrow.table({str(key): values for key, values in columns.items()})
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+
+def check_body(data):
+    """400 when ``data`` does not have the shape of a metrics body, before any query is built."""
+    if not isinstance(data, dict):
+        raise HTTPException(400, 'Metrics body must be an object')
+
+    if not isinstance(data.get('model'), str):
+        raise HTTPException(400, 'Invalid model')
+
+    calc = data.get('calc', {})
+    if not isinstance(calc, dict):
+        raise HTTPException(400, 'calc must be an object')
+
+    formulas = calc.get('formula', ['count'])
+    if not isinstance(formulas, list) or not all(isinstance(formula, str) for formula in formulas):
+        raise HTTPException(400, 'calc.formula must be a list of formulas')
+
+    if not isinstance(calc.get('field', 'id'), (str, list)):
+        raise HTTPException(400, 'calc.field must be a field or a formula')
+
+    for key in ['group_by', 'filter_by']:
+        if not isinstance(data.get(key, {}), dict):
+            raise HTTPException(400, f'{key} must be an object')
 
-    on_field = formulas.get('field', 'id')
 
+def get_query(timezone, data):
+    """Validated options and filtered queryset of a metrics body."""
+    check_body(data)
+    metric = registry.get(data.get('model'))
+    model = metric.model.objects
+
+    formulas = data.get('calc', {'formula': ['count'], 'field': 'id'})
     groups = data.get('group_by', {})
 
-    date_group = groups.get('date', {})
-    groups = groups.get('fields', [])
+    query = {
+        'metric': metric,
+        'additional_fields': data.get('additional_fields', []),
+        'order': list(data.get('order', [])),
+        'limit': data.get('limit'),
+        'raw': data.get('raw'),
+        'format': data.get('format'),
+        'keys': data.get('keys'),
+        'distinct': data.get('distinct', False),
+        'calc': formulas.get('formula', ['count']),
+        'on_field': formulas.get('field', 'id'),
+        'date_group': groups.get('date', {}),
+        'groups': list(groups.get('fields', [])),
+        'start_date': None,
+        'end_date': None,
+        'filters': {},
+        'period': None,
+        'extra': data.get('extra'),
+    }
+
+    on_field = query['on_field']
+    date_group = query['date_group']
+
+    unknown = [formula for formula in query['calc'] if formula not in CALC and formula != APPROX]
+    if unknown:
+        raise HTTPException(400, f'Unknown formula {", ".join(map(str, unknown))}')
+
+    metric.check_group(query['groups'])
+    metric.check_calc(formula_fields(on_field) if isinstance(on_field, list) else [on_field])
+    if date_group and not metric.is_date(date_group.get('field')):
+        raise HTTPException(400, f'{date_group.get("field")} is not a date field')
 
     extra = data.get('extra')
 
@@ -456,59 +764,539 @@ async def get_results(timezone, data):
     # Filtro por fields específicos
     filter_by_fields = filter_by.get('fields', {})
     model = model.filter(**filter_by_fields)
+    query['filters'] = filter_by_fields
 
     # Filtro por um período específico
     filter_by_period = filter_by.get('period')
-    start_date = end_date = None
+    query['period'] = filter_by_period
 
     if filter_by_period:
-        period_filter, start_date, end_date = get_period(filter_by_period, timezone.zone)
+        if filter_by_period.get('field') and not metric.is_date(filter_by_period['field']):
+            raise HTTPException(400, f'{filter_by_period["field"]} is not a date field')
+
+        period_filter, query['start_date'], query['end_date'] = get_period(
+            filter_by_period, timezone.zone
+        )
         model = model.filter(**period_filter)
 
     if extra:
         model = model.extra(**extra)
 
-    if groups or date_group:
-        results, groups = await group_by(
-            model, on_field, additional_fields, calc, groups,
-            order, timezone, date_group, limit, distinct
+    query['model'] = model
+    return query
+
+
+def is_grouped(query):
+    return bool(query['groups'] or query['date_group'])
+
+
+def format_results(query, results, groups, timezone):
+    calc = query['calc']
+    keys = query['keys']
+    additional_fields = query['additional_fields']
+    date_group = query['date_group']
+
+    results_keys = []
+    if results and date_group and date_group.get('fill', True) and not query['limit']:
+        results = fill_dates(
+            results, groups[0], groups[1:], calc, query['start_date'], query['end_date'],
+            date_group.get('group_by'), timezone
         )
 
-        results_keys = []
+    columnar = query['format'] in COLUMNAR
+    if columnar and not query['raw']:
         if results:
-            if raw:
-                results_keys = groups
-            else:
-                results, results_keys = normalize_groups(
-                    results, additional_fields, calc, timezone, start_date, end_date,
-                    date_group.get('group_by'), groups
-                )
+            results, results_keys = columnar_groups(results, additional_fields, calc, groups)
+        else:
+            results = {'x': [], 'series': {}}
 
         if keys:
-            new_keys = []
-            new_results = []
-            for key in results_keys:
-                new_keys.append(keys[key])
+            results['series'] = {keys.get(key, key): values for key, values in results['series'].items()}
+            results_keys = [keys.get(key, key) for key in results_keys]
+
+        return {**results, 'keys': results_keys}
+
+    if results:
+        if query['raw']:
+            results_keys = groups
+        else:
+            results, results_keys = normalize_groups(
+                results, additional_fields, calc, timezone, query['start_date'],
+                query['end_date'], date_group.get('group_by'), groups
+            )
+
+    if keys:
+        new_keys = []
+        new_results = []
+        for key in results_keys:
+            new_keys.append(keys[key])
+
+        for result in results:
+            new_result = {**result}
+            for key, value in result.items():
+                if key in keys:
+                    new_result[keys[key]] = value
+
+            new_results.append(new_result)
+
+        results = new_results
+        results_keys = new_keys
+
+    return {
+        'data': results,
+        'keys': results_keys
+    }
+
+
+def local_timestamp(value, timezone):
+    """Naive local ``pd.Timestamp`` of a period date."""
+    value = pd.Timestamp(value)
+    if value.tzinfo is not None:
+        value = value.tz_convert(timezone).tz_localize(None)
 
-            for result in results:
-                new_result = {**result}
-                for key, value in result.items():
-                    if key in keys:
-                        new_result[keys[key]] = value
+    return value
 
-                new_results.append(new_result)
 
-            results = new_results
-            results_keys = new_keys
+def aware(value, timezone):
+    value = value.to_pydatetime()
+    return timezone.localize(value) if USE_TZ else value
 
-        data = {
-            'data': results,
-            'keys': results_keys
-        }
 
+def sketch_units(start_date, end_date, unit, timezone):
+    """Local units (days or hours) of the period: labels, bounds and whether complete.
+
+    A unit is complete when it is entirely inside the period and already over,
+    so its sketch does not change anymore and can be cached.
+    """
+    freq, fmt = BUCKETS[unit]
+    start = local_timestamp(start_date, timezone)
+    end = local_timestamp(end_date, timezone)
+
+    periods = pd.period_range(start.to_period(freq), end.to_period(freq), freq=freq)
+    starts = periods.start_time
+    ends = (periods + 1).start_time
+    now = pd.Timestamp.now(tz=timezone).tz_localize(None)
+
+    # O fim do período é inclusivo (__lte)
+    complete = (starts >= start) & (ends <= min(end + pd.Timedelta(microseconds=1), now))
+    return periods.strftime(fmt).tolist(), starts, ends, complete
+
+
+def unit_labels(labels, unit, group_by):
+    """Bucket label of ``group_by`` of each unit label (day or hour)."""
+    if not group_by or group_by == unit:
+        return {label: label for label in labels}
+
+    known = [label for label in labels if label is not None]
+    dates = pd.to_datetime(pd.Index(known), format=BUCKETS[unit][1])
+    if group_by == 'quarter':
+        buckets = dates.year.astype(str) + ' ' + dates.quarter.astype(str) + 'Q'
+    elif group_by == 'weekday':
+        buckets = dates.strftime('%A')
+    elif group_by == 'weekdayhour':
+        buckets = dates.strftime('%A %H')
     else:
-        data = await aggregate(
-            model, on_field, calc, timezone, distinct
+        buckets = dates.strftime(BUCKETS[group_by][1])
+
+    return {None: None, **dict(zip(known, buckets))}
+
+
+def merge_sketches(result, rows):
+    """Add rows ``(*key, value)`` to the sketches by key in ``result``."""
+    if not rows:
+        return
+
+    # Bem mais rápido que zip(*rows) com milhares de linhas
+    rows = np.array(rows, dtype=object)
+    for key, sketch in sketches(list(rows[:, :-1].T), rows[:, -1]).items():
+        if key in result:
+            result[key].merge(sketch)
+        else:
+            result[key] = sketch
+
+
+@sync_to_async
+def stream_sketches(model, field, unit_expression, groups, ranges):
+    """Sketches of ``field`` by ``(unit, *groups)`` read from ``model`` in chunks.
+
+    Runs in a thread: the rows go from the cursor into the sketches chunk by
+    chunk, without building the whole result in memory.
+    """
+    model = model.filter(**{f'{field}__isnull': False})
+    if ranges is not None:
+        model = model.filter(ranges)
+
+    if unit_expression is None:
+        unit_expression = models.Value(None, output_field=models.CharField())
+    model = model.annotate(sketch_unit=unit_expression).values_list('sketch_unit', *groups, field)
+
+    result = {}
+    rows = model.iterator(chunk_size=APPROX_CHUNK)
+    while chunk := list(islice(rows, APPROX_CHUNK)):
+        merge_sketches(result, chunk)
+
+    # Grupos no formato do JSON, iguais aos lidos do cache
+    return {
+        (key[0], *json.loads(json.dumps(key[1:], cls=DjangoJSONEncoder))): sketch
+        for key, sketch in result.items()
+    }
+
+
+def missing_ranges(date_field, starts, ends, missing, timezone):
+    """Filter on the runs of consecutive units without a cached sketch."""
+    runs = []
+    for start, end, is_missing in zip(starts, ends, missing):
+        if not is_missing:
+            continue
+        if runs and runs[-1][1] == start:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+
+    ranges = models.Q()
+    for start, end in runs:
+        ranges |= models.Q(**{
+            f'{date_field}__gte': aware(start, timezone),
+            f'{date_field}__lt': aware(end, timezone),
+        })
+
+    return ranges
+
+
+async def unit_sketches(timezone, query, date_field, unit):
+    """Sketches by ``(unit label, *groups)``, reusing the cached complete units.
+
+    Only the units without a cached sketch are read from the database; the
+    complete ones read are cached for the next queries.
+    """
+    period = query['period'] or {}
+    start_date, end_date = query['start_date'], query['end_date']
+    cacheable = bool(date_field and start_date and end_date and period.get('field') == date_field)
+
+    labels, starts, ends, complete = [], [], [], []
+    if cacheable:
+        labels, starts, ends, complete = sketch_units(start_date, end_date, unit, timezone)
+
+    name = query['metric'].name
+    tenant = db_state.get()
+    digest = hashlib.sha1(normalize_body({
+        'field': query['on_field'], 'date_field': date_field, 'unit': unit, 'timezone': timezone.zone,
+        'groups': query['groups'], 'filters': query['filters'], 'extra': query['extra'],
+    }).encode('utf-8')).hexdigest()
+
+    complete_labels = [label for label, is_complete in zip(labels, complete) if is_complete]
+    version, cached = await cached_sketches(tenant, name, digest, complete_labels)
+
+    ranges = None
+    if cached:
+        missing = [label not in cached for label in labels]
+        if not any(missing):
+            ranges = models.Q(pk__in=[])
+        else:
+            ranges = missing_ranges(date_field, starts, ends, missing, timezone)
+
+    unit_expression = None
+    if date_field:
+        first, last = await date_bounds(query['model'], date_field, timezone, start_date, end_date)
+        unit_expression = EXTRACT[unit](local_date(date_field, timezone, first, last))
+
+    result = {}
+    if ranges is None or ranges.children:
+        result = await stream_sketches(query['model'], query['on_field'], unit_expression, query['groups'], ranges)
+
+    # Unidades completas lidas agora vão para o cache, mesmo as sem linhas
+    computed = {label: {} for label in complete_labels if label not in cached}
+    for key, sketch in result.items():
+        if key[0] in computed:
+            computed[key[0]][json.dumps(key[1:])] = sketch.dumps()
+    await store_sketches(tenant, name, version, digest, computed)
+
+    for label, content in cached.items():
+        for group, registers in content.items():
+            result[(label, *json.loads(group))] = HyperLogLog.loads(registers)
+
+    return result
+
+
+def sort_value(value):
+    # Nulos por último
+    return (value is None, value if value is not None else 0)
+
+
+async def approx_results(timezone, query):
+    """``approx_count_distinct`` of ``on_field`` by merging HyperLogLog sketches.
+
+    Sketches are built by day (or hour) and group, then merged into the buckets
+    of the date grouping, so a wider period reuses the cached days.
+    """
+    if query['calc'] != [APPROX]:
+        raise HTTPException(400, f'{APPROX} can not be combined with other formulas')
+    if not isinstance(query['on_field'], str):
+        raise HTTPException(400, f'{APPROX} needs a field')
+
+    date_group = query['date_group']
+    group_by = date_group.get('group_by') if date_group else None
+    date_field = date_group.get('field') if date_group else (query['period'] or {}).get('field')
+    unit = SKETCH_UNITS.get(group_by, 'day')
+
+    units = await unit_sketches(timezone, query, date_field, unit)
+
+    labels = {key[0] for key in units}
+    if date_group:
+        labels = unit_labels(labels, unit, group_by)
+    else:
+        labels = dict.fromkeys(labels)
+    merged = {}
+    for key, sketch in units.items():
+        bucket = (labels[key[0]], *key[1:])
+        if bucket in merged:
+            merged[bucket].merge(sketch)
+        else:
+            merged[bucket] = HyperLogLog(sketch.precision, sketch.registers.copy())
+
+    if not is_grouped(query):
+        sketch = merged.get((None,))
+        return {'total': sketch.count() if sketch else 0}
+
+    groups = list(query['groups'])
+    if date_group:
+        groups.insert(0, 'extracted_' + date_group['field'])
+
+    results = []
+    for bucket, sketch in merged.items():
+        if not date_group:
+            bucket = bucket[1:]
+        results.append({**dict(zip(groups, bucket)), APPROX: sketch.count()})
+
+    results.sort(key=lambda row: tuple(sort_value(row[group]) for group in groups))
+    # Ordenação estável: o primeiro campo de order é aplicado por último
+    for field in reversed(query['order']):
+        name = field.lstrip('-')
+        if name in groups or name == APPROX:
+            results.sort(key=lambda row: sort_value(row[name]), reverse=field.startswith('-'))
+
+    if query['limit']:
+        results = results[:query['limit']]
+
+    return format_results(query, results, groups, timezone)
+
+
+def bucket_count(date_group, start_date, end_date, timezone):
+    """Date buckets of the grouping in the period, None when it has no start."""
+    group_by = (date_group.get('group_by') or '').lower()
+    if group_by == 'weekday':
+        return 7
+    if group_by == 'weekdayhour':
+        return 7 * 24
+    if group_by not in BUCKETS:
+        raise HTTPException(400, f'Invalid date group_by {group_by}')
+    if not start_date:
+        return None
+
+    start = date_period(start_date, group_by, timezone)
+    end = date_period(end_date or django_timezone.now(), group_by, timezone)
+    return max(end.ordinal - start.ordinal + 1, 0)
+
+
+async def check_guard(guard, query, timezone, source=True):
+    """Reject the query before running it when over the ``guard`` limits.
+
+    The ``EXPLAIN`` estimate is only checked for queries on the source table
+    (``source``), not for the ones answered by a rollup.
+    """
+    if guard is None:
+        return
+
+    if query['date_group'] and guard.max_buckets is not None:
+        guard.check_buckets(bucket_count(query['date_group'], query['start_date'], query['end_date'], timezone))
+
+    if source:
+        await guard.check_estimate(query['model'])
+
+
+def get_rollup(timezone, query, rollups):
+    if not rollups:
+        return None
+
+    return rollups_registry.find(query, timezone)
+
+
+async def get_results(timezone, data, rollups=True, guard=None):
+    query = get_query(timezone, data)
+
+    rollup = get_rollup(timezone, query, rollups)
+    await check_guard(guard, query, timezone, source=rollup is None)
+
+    if APPROX in query['calc']:
+        return await approx_results(timezone, query)
+
+    if rollup:
+        if is_grouped(query):
+            results, groups = await rollup.group_by(query)
+            return format_results(query, results, groups, timezone)
+
+        return await rollup.aggregate(query)
+
+    if is_grouped(query):
+        results, groups = await group_by(
+            query['model'], query['on_field'], query['additional_fields'], query['calc'],
+            query['groups'], query['order'], timezone, query['date_group'], query['limit'],
+            query['distinct'], query['start_date'], query['end_date']
         )
+        return format_results(query, results, groups, timezone)
+
+    return await aggregate(
+        query['model'], query['on_field'], query['calc'], timezone, query['distinct']
+    )
+
+
+def merge_key(data):
+    """Bodies with the same key differ only in their calc and can share one query.
+
+    Bodies with ``limit`` or ordered by a formula are never merged, since the
+    rows returned depend on their own calc.
+    """
+    if not isinstance(data, dict) or data.get('limit'):
+        return None
+
+    if APPROX in (data.get('calc') or {}).get('formula', []):
+        return None
+
+    if any(str(field).lstrip('-') in CALC for field in data.get('order', [])):
+        return None
+
+    body = {
+        key: value for key, value in data.items() if key not in ['calc', 'keys', 'distinct', 'format']
+    }
+    return json.dumps(body, sort_keys=True, default=str)
+
+
+def merge_signature(query):
+    """Everything but the calc a merged body must share: model, filters, grouping and dates."""
+    return json.dumps([
+        query['metric'].model._meta.label, query['groups'], query['order'], query['date_group'],
+        query['limit'], query['additional_fields'], query['filters'], query['period'], query['extra'],
+        query['raw'], query['start_date'], query['end_date'],
+    ], sort_keys=True, default=str)
+
+
+def merged_formulas(query, prefix):
+    """Expressions of the calc of ``query``, aliased with ``prefix``."""
+    if is_grouped(query):
+        return get_formulas(
+            query['metric'].model, query['on_field'], query['calc'], query['distinct'], prefix=prefix
+        )
+
+    return {f'{prefix}aggregated_total': get_aggregate(
+        query['metric'].model, query['on_field'], query['calc'], query['distinct']
+    )}
+
+
+class MergedQuery:
+    """Metrics bodies sharing model, filters and grouping computed by one query.
+
+    Every body gets its formulas aliased with its own prefix in a single
+    aggregation; the rows are then split back and formatted per body.
+    ``queries`` are already validated, see ``get_computations``.
+    """
+
+    def __init__(self, timezone, queries, guard=None):
+        self.timezone = timezone
+        self.queries = queries
+        self.guard = guard
+        self.task = None
+
+    def run(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.compute())
+
+        return self.task
+
+    async def compute(self):
+        queries = self.queries
+        first = queries[0]
+        model = first['model']
+        await check_guard(self.guard, first, self.timezone)
+
+        formulas = {}
+        for i, query in enumerate(queries):
+            formulas.update(merged_formulas(query, f'b{i}_'))
+
+        if not is_grouped(first):
+            data = await model.aaggregate(**formulas)
+            return [{'total': data[f'b{i}_aggregated_total']} for i in range(len(queries))]
+
+        # Cópias: group_by_formulas insere o agrupamento de data nas listas
+        rows, groups = await group_by_formulas(
+            model, formulas, first['additional_fields'], list(first['groups']), list(first['order']),
+            self.timezone, first['date_group'], first['limit'], first['start_date'], first['end_date']
+        )
+
+        results = []
+        for i, query in enumerate(queries):
+            prefix = f'b{i}_'
+            member = [
+                {
+                    **{group: row[group] for group in groups},
+                    **{formula: row[prefix + formula] for formula in query['calc']},
+                    **{field: row[field] for field in first['additional_fields']},
+                }
+                for row in rows
+            ]
+            results.append(format_results(query, member, list(groups), self.timezone))
+
+        return results
+
+    def computation(self, index):
+        async def compute():
+            return (await self.run())[index]
+
+        return compute
+
+
+def is_routed(timezone, body):
+    """Whether ``body`` is answered by a rollup (invalid bodies are not)."""
+    if not rollups_registry.rollups:
+        return False
+
+    try:
+        return get_rollup(timezone, get_query(timezone, body), True) is not None
+    except HTTPException:
+        return False
+
+
+def get_computations(timezone, bodies, rollups=True, guard=None):
+    """One ``compute()`` per body; bodies differing only in calc share a query.
+
+    Bodies answered by a rollup are computed on their own, from the rollup.
+    """
+    merged = {}
+    for index, body in enumerate(bodies):
+        key = merge_key(body)
+        if key is None or (rollups and is_routed(timezone, body)):
+            continue
+
+        # Um body inválido (campo, fórmula) fica fora da junção e falha sozinho;
+        # o annotate resolve os campos sem executar a query
+        try:
+            query = get_query(timezone, body)
+            query['model'].annotate(**merged_formulas(query, 'check_'))
+        except Exception:
+            continue
+
+        merged.setdefault((key, merge_signature(query)), []).append((index, query))
+
+    computations = [None] * len(bodies)
+    for members in merged.values():
+        if len(members) == 1:
+            continue
+
+        merged_query = MergedQuery(timezone, [query for _, query in members], guard)
+        for position, (index, _) in enumerate(members):
+            computations[index] = merged_query.computation(position)
+
+    for index, body in enumerate(bodies):
+        if computations[index] is None:
+            computations[index] = partial(get_results, timezone, body, rollups, guard)
 
-    return data
+    return computations
@@ -1,14 +1,97 @@
+import asyncio
+
+from django.core.exceptions import FieldError
+from django.http import HttpResponse
 import pytz
 
 from .base import BaseResource
-from .calc import get_results
+from .calc import check_body, get_computations, get_results, to_arrow
+from .exception import HTTPException
+from .guardrails import QueryGuard, statement_limit
+from .metrics_cache import cached_results
+
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
 
 
 class Metrics(BaseResource):
     allowed_methods = ['post']
 
+    # Máximo de gráficos por requisição e quantos são calculados ao mesmo tempo
+    batch_limit = 50
+    batch_concurrency = 4
+
+    # Responde pelos rollups declarados nos resources quando cobrem a consulta
+    use_rollups = True
+
+    # Máximo de buckets de data por gráfico (400 ao passar)
+    max_buckets = None
+
+    # O corpo é só leitura: com coalesce = True, POSTs iguais dividem a resposta
+    coalesce_methods = ['post']
+
+    def coalesce_scope(self, session_key):
+        # As datas são agrupadas no fuso do usuário
+        timezone = self.user.get('timezone', 'UTC') if self.user else None
+        return super().coalesce_scope(session_key), timezone
+
     async def post(self, request):
         body = request.json
         timezone = pytz.timezone(self.user.get('timezone', 'UTC'))
-        results = await get_results(timezone, body)
+        tenant = getattr(self, 'account_db', 'default')
+        self.guard = QueryGuard(self.max_buckets, self.max_estimated_rows)
+
+        if isinstance(body, list):
+            results = await self.post_batch(tenant, timezone, body)
+            return await self.serialize(results)
+
+        check_body(body)
+        results = await cached_results(
+            tenant, timezone, body, lambda: get_results(timezone, body, self.use_rollups, self.guard)
+        )
+
+        if body.get('format') == 'arrow':
+            return HttpResponse(to_arrow(results), content_type=ARROW_CONTENT_TYPE)
+
         return results
+
+    async def post_batch(self, tenant, timezone, bodies):
+        """Results for a list of metrics bodies, in the same order.
+
+        Bodies differing only in ``calc`` are merged into one aggregation and
+        each result is cached on its own. An invalid body gets its error in
+        place of its result, without failing the others.
+        """
+        if len(bodies) > self.batch_limit:
+            raise HTTPException(400, f'Maximum of {self.batch_limit} metrics per request')
+
+        # Um item com formato inválido recebe o erro no seu lugar, sem entrar nos cálculos
+        errors = {}
+        for index, body in enumerate(bodies):
+            try:
+                check_body(body)
+            except HTTPException as err:
+                status, detail = err.args
+                errors[index] = {'success': False, 'status': status, 'detail': detail}
+
+        valid = [body for index, body in enumerate(bodies) if index not in errors]
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        computations = iter(get_computations(timezone, valid, self.use_rollups, self.guard))
+
+        async def run(index, body):
+            if index in errors:
+                return errors[index]
+
+            compute = next(computations)
+            async with semaphore:
+                try:
+                    # Timeout de um gráfico vira o erro dele, sem falhar os outros
+                    with statement_limit(self.statement_timeout):
+                        return await cached_results(tenant, timezone, body, compute)
+                except HTTPException as err:
+                    status, detail = err.args
+                    return {'success': False, 'status': status, 'detail': detail}
+                except FieldError as err:
+                    # Campo inexistente no body, só esse gráfico falha
+                    return {'success': False, 'status': 400, 'detail': str(err)}
+
+        return await asyncio.gather(*[run(index, body) for index, body in enumerate(bodies)])
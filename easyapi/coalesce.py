@@ -0,0 +1,68 @@
+import asyncio
+import hashlib
+from collections import Counter
+
+from django.http import HttpResponse
+
+# Leituras em andamento no processo: chave -> future com o snapshot da resposta
+flights = {}
+
+# 'leader' para as requisições que calcularam, 'follower' para as que esperaram
+counters = Counter()
+
+
+def request_key(*parts, query=None, body=None):
+    """Key of a read: ``parts`` (ex: tenant, method, path, scope), the query string
+    with its items sorted and a hash of the body, if any."""
+    query = tuple(sorted((key, tuple(values)) for key, values in query.lists())) if query else ()
+    body = hashlib.sha1(body).hexdigest() if body else None
+    return (*parts, query, body)
+
+
+def snapshot(response):
+    """``(status, content, headers)`` of a response that can be shared, else None."""
+    if response.streaming:
+        return None
+
+    return response.status_code, response.content, dict(response.headers)
+
+
+def clone(snapshot):
+    status, content, headers = snapshot
+    return HttpResponse(content, status=status, headers=headers)
+
+
+async def coalesce(key, compute):
+    """Run ``compute()`` once for concurrent calls with the same ``key``.
+
+    The first call (leader) runs it, the others await it and get a copy of its
+    response, or its exception. If the leader is cancelled or answers with a
+    streaming response the others run ``compute()`` themselves.
+    """
+    future = flights.get(key)
+    if future is not None:
+        counters['follower'] += 1
+        # shield: o cancelamento de quem espera não cancela o future dos outros
+        shared = await asyncio.shield(future)
+        if shared is None:
+            return await compute()
+        return clone(shared)
+
+    counters['leader'] += 1
+    future = asyncio.get_running_loop().create_future()
+    flights[key] = future
+    try:
+        response = await compute()
+    except asyncio.CancelledError:
+        future.set_result(None)
+        raise
+    except Exception as error:
+        future.set_exception(error)
+        # Sem ninguém esperando, evita o aviso de exceção não lida
+        future.exception()
+        raise
+    else:
+        future.set_result(snapshot(response))
+        return response
+    finally:
+        del flights[key]
@@ -0,0 +1,93 @@
+from functools import lru_cache
+import gzip
+
+from django.utils.cache import patch_vary_headers
+
+from .util import optional_import
+
+# Nível de cada codificação, rápidos o bastante para respostas dinâmicas
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+
+def gzip_compress(content):
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def brotli_compress(content):
+    return optional_import('brotli').compress(content, quality=BROTLI_QUALITY)
+
+
+def zstd_compress(content):
+    return optional_import('zstandard').ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+
+
+# Content-Encoding: (módulo opcional, função), na ordem de preferência
+CODECS = {
+    'br': ('brotli', brotli_compress),
+    'zstd': ('zstandard', zstd_compress),
+    'gzip': (None, gzip_compress),
+}
+
+
+@lru_cache(maxsize=None)
+def available():
+    """Encodings whose module is installed, best first."""
+    return [encoding for encoding, (module, _) in CODECS.items() if module is None or optional_import(module)]
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding):
+    """Best available encoding allowed by an ``Accept-Encoding`` header, or None."""
+    weights = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.strip().partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name:
+            weights[name.strip()] = weight
+
+    default = weights.get('*', 0.0)
+    choices = [
+        (weights.get(encoding, default), -i, encoding) for i, encoding in enumerate(available())
+    ]
+    weight, _, encoding = max(choices)
+    return encoding if weight > 0 else None
+
+
+def compress(content, encoding):
+    return CODECS[encoding][1](content)
+
+
+def compress_response(request, response, min_size, encoded=None):
+    """Compress ``response`` with the encoding negotiated for ``request``.
+
+    Only 200 responses of at least ``min_size`` bytes are compressed.
+    ``encoded`` is the body already compressed, ex: from the cache. Returns the
+    response and the encoding used, or None.
+    """
+    if response.status_code != 200 or response.streaming or response.has_header('Content-Encoding'):
+        return response, None
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+    if not encoding or len(response.content) < min_size:
+        return response, None
+
+    response.content = encoded if encoded is not None else compress(response.content, encoding)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(response.content))
+
+    # O corpo muda com a codificação, o ETag passa a ser fraco
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response.headers['ETag'] = f'W/{etag}'
+
+    return response, encoding
@@ -0,0 +1,43 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def version_etag(*parts):
+    """ETag of a representation identified by ``parts``, ex: resource, path and ``updated_at``."""
+    key = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(key.encode()).hexdigest())
+
+
+def body_etag(content):
+    return quote_etag(hashlib.sha1(content).hexdigest())
+
+
+def etag_validators(etag, modified):
+    """``(etag, last modified timestamp)`` of an object changed at the datetime ``modified``."""
+    return etag, int(modified.timestamp()) if modified else None
+
+
+def not_modified(request, etag, last_modified):
+    """304 response when the ``If-None-Match``/``If-Modified-Since`` of ``request`` match, else None."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response.headers['ETag'] = etag
+        if last_modified:
+            response.headers['Last-Modified'] = http_date(last_modified)
+
+    return response
+
+
+def conditional_response(request, response, etag=None, last_modified=None):
+    """Set ``ETag`` (the body hash by default) and ``Last-Modified`` and answer 304 when they match."""
+    if response.status_code != 200 or response.streaming:
+        return response
+
+    etag = etag or body_etag(response.content)
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified)
+
+    return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
@@ -1,7 +1,10 @@
-from datetime import timedelta
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+import json
+from threading import Lock
 
 import calendar
-from dateutil import rrule
 from dateutil.relativedelta import relativedelta
 from django.utils import timezone
 import pytz
@@ -17,13 +20,18 @@ def get_weekday(day):
     return calendar.day_name[day]
 
 
+@lru_cache(maxsize=None)
+def get_timezone(tz):
+    return pytz.timezone(tz)
+
+
 class Dates(object):
     # last 12 months, this4, last4, last4quarters
     def __init__(self, tz='UTC', remove_tz=True):
         if remove_tz:
-            self.now = timezone.now().astimezone(tz=pytz.timezone(tz)).replace(tzinfo=None)
+            self.now = timezone.now().astimezone(tz=get_timezone(tz)).replace(tzinfo=None)
         else:
-            self.now = timezone.now().astimezone(tz=pytz.timezone(tz))
+            self.now = timezone.now().astimezone(tz=get_timezone(tz))
 
         self.start = self.now.replace(
             hour=0, minute=0, second=0, microsecond=0)
@@ -183,7 +191,43 @@ class Dates(object):
         return self.start, self.end
 
 
+# Períodos já resolvidos, pela data local (mudam à meia-noite do timezone)
+resolved = OrderedDict()
+resolved_lock = Lock()
+RESOLVED_LIMIT = 1024
+
+
+def resolve_period(period, tz='UTC', remove_tz=True, args=()):
+    """``Dates(tz, remove_tz).<period>(*args)``, memoized for the local day.
+
+    Every ``Dates`` period is built from the start and end of the local day,
+    so the same range is returned all day long; segments with many date rules
+    do the date math once. The results are datetimes or tuples of them, safe
+    to share between callers and threads.
+    """
+    today = timezone.now().astimezone(get_timezone(tz)).date()
+    key = (period, tz, remove_tz, json.dumps(args, sort_keys=True, default=str), today)
+    with resolved_lock:
+        value = resolved.get(key)
+        if value is not None:
+            resolved.move_to_end(key)
+            return value
+
+    value = getattr(Dates(tz, remove_tz), period)(*args)
+    if isinstance(value, list):
+        value = tuple(value)
+
+    with resolved_lock:
+        resolved[key] = value
+        if len(resolved) > RESOLVED_LIMIT:
+            resolved.popitem(last=False)
+
+    return value
+
+
 def range_months(date_start, date_end):
+    from dateutil import rrule
+
     return list(
         rrule.rrule(
             rrule.MONTHLY,
@@ -196,6 +240,8 @@ def range_months(date_start, date_end):
 
 
 def range_days(date_start, date_end):
+    from dateutil import rrule
+
     return list(
         rrule.rrule(
             rrule.DAILY,
@@ -206,6 +252,8 @@ def range_days(date_start, date_end):
 
 
 def range_hour(date_start, date_end):
+    from dateutil import rrule
+
     return list(
         rrule.rrule(
             rrule.HOURLY,
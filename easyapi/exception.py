@@ -6,3 +6,7 @@ class HTTPException(Exception):
     def render(self, exception):
         (status, detail) = exception.args
         return JsonResponse({'success': False, 'status': status, 'detail': detail}, status=status)
+
+
+class QueryBudgetExceeded(Exception):
+    """A resource ran more queries than its ``max_queries`` budget."""
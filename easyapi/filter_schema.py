@@ -0,0 +1,211 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Count, Q
+from django.utils.timezone import is_naive, make_aware
+
+from .dates import get_timezone
+from .exception import HTTPException
+
+# Modificadores aceitos em filter_fields, além da igualdade (o campo sem sufixo)
+LOOKUPS = ['in', 'isnull', 'gte', 'lte', 'lt', 'gt', 'startswith']
+
+# Lookups de texto, o valor não é convertido para o tipo do campo
+TEXT_LOOKUPS = {'startswith'}
+
+BOOLEANS = {'true': True, '1': True, 'false': False, '0': False}
+
+# Tipos em que as comparações de ordem (gte, lte, lt, gt) fazem sentido
+ORDERED_TYPES = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField', 'FloatField',
+    'DecimalField', 'DateField', 'DateTimeField', 'TimeField', 'DurationField',
+}
+TEXT_TYPES = {'CharField', 'TextField', 'EmailField', 'SlugField', 'URLField'}
+
+# Operadores de ?tags_operator=, ver m2m_filter
+M2M_OPERATORS = ['OR', 'AND', 'NOT']
+
+
+def model_field(model, name):
+    """Resolve ``name`` (``field``, ``field_id`` or ``related__field``) on ``model``."""
+    field = None
+    for part in name.split('__'):
+        if not model:
+            return None
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            if not part.endswith('_id'):
+                return None
+            try:
+                field = model._meta.get_field(part[:-3])
+            except FieldDoesNotExist:
+                return None
+        model = field.related_model if field.is_relation else None
+
+    return field
+
+
+def to_boolean(value):
+    try:
+        return BOOLEANS[value.lower()]
+    except KeyError:
+        raise ValidationError(f'"{value}" is not true or false')
+
+
+def untyped(value):
+    """Fields that are not on the model keep the old behavior: only true/false are converted."""
+    lower = value.lower()
+    if lower in ('true', 'false'):
+        return lower == 'true'
+
+    return value
+
+
+def localize(value, timezone):
+    """Datetimes without timezone are in the user's ``timezone``, as in ``Metrics``."""
+    if settings.USE_TZ and isinstance(value, datetime) and is_naive(value):
+        return make_aware(value, get_timezone(timezone))
+
+    return value
+
+
+def target_field(field):
+    """The field compared by a filter on ``field``: the related key for relations."""
+    if field.is_relation:
+        if field.concrete and (field.many_to_one or field.one_to_one):
+            return field.target_field
+        return field.related_model._meta.pk
+
+    return field
+
+
+def field_lookups(field):
+    """``LOOKUPS`` that make sense for the type of ``field``, all of them when unknown."""
+    if field is None:
+        return LOOKUPS
+
+    internal_type = target_field(field).get_internal_type()
+    return [
+        lookup for lookup in LOOKUPS
+        if lookup in ('in', 'isnull')
+        or (lookup in TEXT_LOOKUPS and internal_type in TEXT_TYPES)
+        or (lookup not in TEXT_LOOKUPS and internal_type in ORDERED_TYPES)
+    ]
+
+
+def coercer(field):
+    """Function converting a query string value to the Python type of ``field``."""
+    if field is None:
+        return untyped
+
+    # Filtros em relações comparam a chave do model relacionado
+    field = target_field(field)
+
+    if field.get_internal_type() in ('BooleanField', 'NullBooleanField'):
+        return to_boolean
+
+    return field.to_python
+
+
+def m2m_path(model, name):
+    """``(through, source, target, related model)`` of the many to many ``name`` of ``model``.
+
+    ``source`` and ``target`` are the through model fields pointing to
+    ``model`` and to the related model, for both sides of the relation.
+    """
+    descriptor = getattr(model, name)
+    field = descriptor.field
+    source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+    if descriptor.reverse:
+        return descriptor.through, target, source, field.model
+
+    return descriptor.through, source, target, field.related_model
+
+
+def m2m_filter(model, name, ids, operator='OR'):
+    """``Q`` of the objects of ``model`` related by the many to many ``name`` to ``ids``.
+
+    ``OR`` keeps objects with any of the ids, ``AND`` with all of them and
+    ``NOT`` with none. Each is one subquery on the through table (grouped
+    with ``HAVING COUNT(DISTINCT ...)`` for ``AND``), so the rows are not
+    duplicated by a join.
+    """
+    through, source, target, related = m2m_path(model, name)
+    coerce = coercer(related._meta.pk)
+    try:
+        ids = {coerce(id) for id in ids if id}
+    except (ValidationError, ValueError, TypeError) as err:
+        messages = getattr(err, 'messages', None) or [str(err)]
+        raise HTTPException(400, f'{name}: {" ".join(messages)}')
+
+    links = through.objects.filter(**{f'{target}__in': ids})
+    if operator == 'AND':
+        links = links.values(source).annotate(
+            total=Count(target, distinct=True)
+        ).filter(total=len(ids))
+
+    condition = Q(pk__in=links.values(source))
+    return ~condition if operator == 'NOT' else condition
+
+
+class FilterSchema:
+    """``filter_fields`` of a resource compiled once per resource class.
+
+    Maps every accepted query parameter (``field`` and ``field__<lookup>``) to
+    the ORM lookup and the function converting its value to the type of the
+    model field, so numbers and dates reach the database typed. ``__in``
+    takes comma separated values, repeated or not.
+    """
+
+    def __init__(self, model, fields):
+        self.source = fields
+        # {parâmetro: (conversão, lista)}
+        self.params = {}
+
+        for name in fields or []:
+            coerce = coercer(model_field(model, name) if model else None)
+            self.params[name] = (coerce, False)
+            for lookup in LOOKUPS:
+                if lookup == 'isnull':
+                    self.params[f'{name}__{lookup}'] = (to_boolean, False)
+                elif lookup in TEXT_LOOKUPS:
+                    self.params[f'{name}__{lookup}'] = (str, False)
+                else:
+                    self.params[f'{name}__{lookup}'] = (coerce, lookup == 'in')
+
+    def filters(self, params, timezone='UTC'):
+        """ORM filters of the accepted parameters in the ``QueryDict`` ``params``.
+
+        Datetimes without timezone are read in ``timezone``.
+        """
+        filters = {}
+        for key, values in params.lists():
+            param = self.params.get(key)
+            if param is None:
+                continue
+
+            coerce, many = param
+            try:
+                if many:
+                    filters[key] = [
+                        localize(coerce(value), timezone) for raw in values for value in raw.split(',') if value
+                    ]
+                else:
+                    filters[key] = localize(coerce(values[0]), timezone)
+            except (ValidationError, ValueError, TypeError) as err:
+                messages = getattr(err, 'messages', None) or [str(err)]
+                raise HTTPException(400, f'{key}: {" ".join(messages)}')
+
+        return filters
+
+    @classmethod
+    def for_resource(cls, resource):
+        schema = resource.__dict__.get('_filter_schema')
+        if schema is None or schema.source is not resource.filter_fields:
+            schema = cls(resource.model, resource.filter_fields)
+            resource._filter_schema = schema
+
+        return schema
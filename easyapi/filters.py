@@ -10,7 +10,7 @@ from operator import __and__ as AND
 from pytz import timezone as pytz_timezone
 
 from .constants import CustomAttributePresentations
-from .dates import Dates
+from .dates import Dates, resolve_period
 from .util import make_list, normalize_field
 
 
@@ -95,8 +95,7 @@ class Filter(object):
 
     def filter_by_date(self, date_field, date_start=None, date_end=None, **kwargs):
         if kwargs.get('period') and hasattr(Dates, kwargs['period']):
-            period = getattr(Dates(self.tz), kwargs['period'])
-            self.date_start, self.date_end = period()
+            self.date_start, self.date_end = resolve_period(kwargs['period'], self.tz)
         else:
             self.date_start = date_start or self.date_start
             self.date_end = date_end or self.date_end
@@ -297,7 +296,7 @@ class Filter(object):
                             if not (value.get('type') and value.get('value')):
                                 continue
 
-                        d1, d2 = Dates(self.tz).age(value, operator)
+                        d1, d2 = resolve_period('age', self.tz, args=(value, operator))
                         if operator in ['range', 'exact']:
                             operator = 'range'
                             filter_list += [
@@ -312,8 +311,7 @@ class Filter(object):
                                 Q(**{'{}__{}'.format(field, operator): d2})
                             ]
                     else:
-                        method = getattr(Dates(self.tz), operator)
-                        d1, d2 = method()
+                        d1, d2 = resolve_period(operator, self.tz)
                         filter_list += [
                             Q(**{'{}__month__range'.format(field): [d1.month, d2.month]}),
                             Q(**{'{}__day__range'.format(field): [d1.day, d2.day]})
@@ -322,8 +320,7 @@ class Filter(object):
                     continue
 
                 elif _type == 'date' and hasattr(Dates, operator) and apply_dates and not coalesce:
-                    method = getattr(Dates(self.tz, False), operator)
-                    value = method()
+                    value = resolve_period(operator, self.tz, False)
                     operator = 'range'
 
                 elif _type == 'date' and 'age' in operator:
@@ -342,7 +339,7 @@ class Filter(object):
                         if not (value.get('type') and value.get('value')):
                             continue
 
-                    value = Dates(self.tz).age(value, operator)
+                    value = resolve_period('age', self.tz, args=(value, operator))
 
                     if operator == 'exact':
                         operator = 'range'
@@ -0,0 +1,168 @@
+from functools import lru_cache
+import re
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+
+from .exception import HTTPException
+
+NUMERIC = [
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'DecimalField', 'FloatField',
+    'IntegerField', 'BigIntegerField', 'PositiveIntegerField', 'PositiveBigIntegerField',
+    'PositiveSmallIntegerField', 'SmallIntegerField'
+]
+
+# Precedência e associatividade dos operadores aceitos nas fórmulas
+OPERATORS = {
+    '+': (1, 'left'),
+    '-': (1, 'left'),
+    '*': (2, 'left'),
+    '/': (2, 'left'),
+    '^': (3, 'right'),
+}
+
+re_field = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+re_number = re.compile(r'^-?\d+(\.\d+)?$')
+
+
+def numeric_field(model, name):
+    """Return ``name`` if it is a numeric field of ``model`` (``related__field`` allowed)."""
+    if not re_field.match(name):
+        raise HTTPException(400, f'Invalid field in formula: {name}')
+
+    field = None
+    for part in name.split('__'):
+        try:
+            field = model._meta.get_field(part)
+        except (FieldDoesNotExist, AttributeError):
+            raise HTTPException(400, f'Invalid field in formula: {name}')
+        model = field.related_model
+
+    if field.get_internal_type() not in NUMERIC:
+        raise HTTPException(400, f'Field {name} is not numeric')
+
+    return name
+
+
+def combine(operator, left, right):
+    if operator == '+':
+        return left + right
+    elif operator == '-':
+        return left - right
+    elif operator == '*':
+        return left * right
+    elif operator == '/':
+        return left / right
+
+    return left ** right
+
+
+class Parser:
+    """Recursive descent parser for the token list sent in ``calc.field``.
+
+    ``['amount', '*', '(', 'price', '-', 2, ')']`` becomes
+    ``F('amount') * (F('price') - Value(2))``.
+    """
+
+    def __init__(self, model, tokens):
+        self.model = model
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise HTTPException(400, 'Empty formula')
+
+        expression = self.expression(1)
+        if self.peek() is not None:
+            raise HTTPException(400, f'Unexpected token in formula: {self.peek()}')
+
+        return expression
+
+    def expression(self, min_precedence):
+        left = self.operand()
+
+        while True:
+            operator = self.peek()
+            if operator not in OPERATORS:
+                break
+
+            precedence, associativity = OPERATORS[operator]
+            if precedence < min_precedence:
+                break
+
+            self.next()
+            next_precedence = precedence + 1 if associativity == 'left' else precedence
+            right = self.expression(next_precedence)
+            left = combine(operator, left, right)
+
+        return left
+
+    def operand(self):
+        token = self.next()
+
+        if token is None:
+            raise HTTPException(400, 'Incomplete formula')
+
+        if token == '(':
+            expression = self.expression(1)
+            if self.next() != ')':
+                raise HTTPException(400, 'Missing ) in formula')
+            return expression
+
+        if token == '-':
+            # Menos unário: -a ^ 2 == -(a ^ 2)
+            return combine('*', models.Value(-1), self.expression(OPERATORS['^'][0]))
+
+        if isinstance(token, bool):
+            raise HTTPException(400, f'Invalid token in formula: {token}')
+
+        if isinstance(token, (int, float)):
+            return models.Value(token)
+
+        if not isinstance(token, str):
+            raise HTTPException(400, f'Invalid token in formula: {token}')
+
+        if re_number.match(token):
+            return models.Value(float(token) if '.' in token else int(token))
+
+        return models.F(numeric_field(self.model, token))
+
+
+def formula_fields(tokens):
+    """Field names referenced by a ``calc.field`` token list."""
+    return [
+        token for token in tokens
+        if isinstance(token, str) and token not in OPERATORS and token not in '()' and
+        not re_number.match(token)
+    ]
+
+
+@lru_cache(maxsize=1024)
+def _compile(model, tokens):
+    expression = Parser(model, tokens).parse()
+    if isinstance(expression, models.F):
+        return expression
+
+    # Misturar inteiros, decimais e floats exige um output_field explícito
+    return models.ExpressionWrapper(expression, output_field=models.FloatField())
+
+
+def compile_formula(model, tokens):
+    """Expression for a ``calc.field`` token list, cached by model and tokens."""
+    try:
+        tokens = tuple(tokens)
+        hash(tokens)
+    except TypeError:
+        raise HTTPException(400, 'Invalid formula')
+
+    return _compile(model, tokens)
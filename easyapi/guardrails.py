@@ -0,0 +1,158 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+
+from .exception import HTTPException
+
+logger = logging.getLogger('easyapi.guardrails')
+
+# Consultas barradas desde o início do processo, por motivo: buckets, estimate e timeout
+counters = Counter()
+
+# Tempo máximo de cada query, em milissegundos, na requisição atual
+statement_timeout = ContextVar('statement_timeout', default=None)
+
+# MySQL: "maximum statement execution time exceeded"
+MYSQL_TIMEOUT = 3024
+
+# Quantas instruções da VM do SQLite entre as verificações do tempo
+SQLITE_PROGRESS_STEPS = 10000
+
+re_select = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
+
+
+def reject(reason, status, detail):
+    counters[reason] += 1
+    logger.warning('Query rejected (%s): %s', reason, detail)
+    raise HTTPException(status, detail)
+
+
+def limit_statement(execute, sql, params, many, context):
+    """Apply ``statement_timeout`` on the database side.
+
+    MySQL gets a ``MAX_EXECUTION_TIME`` hint on SELECTs and SQLite a progress
+    handler interrupting the statement; other databases are not limited.
+    """
+    timeout = statement_timeout.get()
+    if not timeout:
+        return execute(sql, params, many, context)
+
+    connection = context['connection']
+    if connection.vendor == 'mysql':
+        sql = re_select.sub(f'SELECT /*+ MAX_EXECUTION_TIME({int(timeout)}) */', sql, count=1)
+        return execute(sql, params, many, context)
+
+    if connection.vendor == 'sqlite':
+        deadline = time.monotonic() + timeout / 1000
+        connection.connection.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            connection.connection.set_progress_handler(None, 0)
+
+    return execute(sql, params, many, context)
+
+
+def install_limit(sender, connection, **kwargs):
+    if limit_statement not in connection.execute_wrappers:
+        connection.execute_wrappers.append(limit_statement)
+
+
+# Como em queries.py, instalado em toda conexão e só age com um timeout ativo
+connection_created.connect(install_limit)
+
+
+def is_timeout(err):
+    cause = err.__cause__ or err
+    if cause.args and cause.args[0] == MYSQL_TIMEOUT:
+        return True
+
+    return str(cause) == 'interrupted'
+
+
+@contextmanager
+def statement_limit(timeout):
+    """Queries run inside take at most ``timeout`` ms, or a 503 is raised."""
+    token = statement_timeout.set(timeout)
+    try:
+        yield
+    except OperationalError as err:
+        if timeout and is_timeout(err):
+            reject('timeout', 503, f'Query took more than {timeout} ms, try a smaller period or fewer groups')
+        raise
+    finally:
+        statement_timeout.reset(token)
+
+
+def explain_rows(queryset):
+    """Rows MySQL expects to examine for ``queryset``, from ``EXPLAIN``.
+
+    The estimates of the joined tables are multiplied, like the nested loop
+    runs them. None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'mysql':
+        return None
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN {sql}', params)
+        columns = [column[0].lower() for column in cursor.description]
+        plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    joined = 1
+    others = 0
+    for step in plan:
+        rows = (step.get('rows') or 1) * float(step.get('filtered') or 100) / 100
+        if step.get('select_type') in ('SIMPLE', 'PRIMARY'):
+            joined *= rows
+        else:
+            others = max(others, rows)
+
+    return int(max(joined, others))
+
+
+class QueryGuard:
+    """Limits checked before running an expensive query.
+
+    ``max_buckets`` is the number of date buckets of a grouping and
+    ``max_estimated_rows`` the rows ``EXPLAIN`` expects to examine.
+    """
+
+    def __init__(self, max_buckets=None, max_estimated_rows=None):
+        self.max_buckets = max_buckets
+        self.max_estimated_rows = max_estimated_rows
+
+    def check_buckets(self, count):
+        if self.max_buckets is None:
+            return
+
+        if count is None:
+            reject('buckets', 400, f'Date grouping needs a period start, maximum of {self.max_buckets} buckets')
+
+        if count > self.max_buckets:
+            reject(
+                'buckets', 400,
+                f'{count} date buckets, maximum is {self.max_buckets}. Use a shorter period or a larger grouping'
+            )
+
+    async def check_estimate(self, queryset):
+        if self.max_estimated_rows is None:
+            return
+
+        if not hasattr(queryset, 'query'):
+            queryset = queryset.all()
+
+        rows = await sync_to_async(explain_rows)(queryset)
+        if rows is not None and rows > self.max_estimated_rows:
+            reject(
+                'estimate', 400,
+                f'Query would examine about {rows} rows, maximum is {self.max_estimated_rows}. Add filters'
+            )
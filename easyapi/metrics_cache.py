@@ -0,0 +1,179 @@
+import asyncio
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from redis import asyncio as aioredis
+
+from .registry import metric_name, normalize_name
+from settings.env import REDIS_PREFIX
+
+REDIS_SERVER = os.environ['REDIS_SERVER']
+REDIS_DB = 1
+
+logger = logging.getLogger('easyapi.metrics')
+
+# Recálculos em segundo plano (stale-while-revalidate) ainda em execução
+background = set()
+
+
+def get_config():
+    """``settings.EASYAPI_METRICS_CACHE``, ex: ``{'ttl': 60, 'stale': 300}``.
+
+    ``ttl`` is how long a result is fresh and ``stale`` how long after that it is
+    still served while being recomputed in the background. Without the setting
+    the cache is disabled.
+    """
+    config = getattr(settings, 'EASYAPI_METRICS_CACHE', None)
+    if not config:
+        return None
+
+    return {'ttl': 60, 'stale': 0, **config}
+
+
+def prefix():
+    return f'{REDIS_PREFIX}:metrics' if REDIS_PREFIX else 'easyapi:metrics'
+
+
+def version_key(tenant, name):
+    return f'{prefix()}:version:{tenant}:{name}'
+
+
+def normalize_body(body):
+    return json.dumps(body, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+
+
+def time_bucket(body, timezone):
+    """Local day for bodies with relative periods, whose dates change at midnight."""
+    period = (body.get('filter_by') or {}).get('period') or {}
+    if period.get('start_delta') or period.get('end_delta'):
+        return datetime.now(timezone).strftime('%Y-%m-%d')
+
+    return ''
+
+
+def result_key(tenant, timezone, body):
+    digest = hashlib.sha1(normalize_body(body).encode('utf-8')).hexdigest()
+    return f'{prefix()}:result:{tenant}:{timezone.zone}:{time_bucket(body, timezone)}:{digest}'
+
+
+async def get_redis():
+    return await aioredis.Redis(
+        host=REDIS_SERVER, db=REDIS_DB, decode_responses=True
+    ).client()
+
+
+async def invalidate(model, tenant):
+    """Bump the write version of ``model``, making its cached results stale."""
+    if not get_config():
+        return
+
+    redis = await get_redis()
+    await redis.incr(version_key(tenant, metric_name(model)))
+    await redis.close()
+
+
+def sketch_key(tenant, name, version, digest, unit):
+    return f'{prefix()}:sketch:{tenant}:{name}:{version}:{digest}:{unit}'
+
+
+async def cached_sketches(tenant, name, digest, units):
+    """Write version of ``name`` and the cached sketches of each unit, by unit.
+
+    Units without an entry are left out. Without the cache setting nothing is
+    cached and ``None`` is returned as version.
+    """
+    if not get_config() or not units:
+        return None, {}
+
+    redis = await get_redis()
+    version = await redis.get(version_key(tenant, name)) or '0'
+    contents = await redis.mget(*[sketch_key(tenant, name, version, digest, unit) for unit in units])
+    await redis.close()
+
+    return version, {
+        unit: json.loads(content) for unit, content in zip(units, contents) if content is not None
+    }
+
+
+async def store_sketches(tenant, name, version, digest, sketches):
+    """Store the sketches of complete units, ``{unit: {group: sketch}}``.
+
+    They are tied to the write version like the results and kept for
+    ``sketch_ttl`` seconds (a day by default).
+    """
+    config = get_config()
+    if not config or version is None or not sketches:
+        return
+
+    ttl = config.get('sketch_ttl', 86400)
+    redis = await get_redis()
+    for unit, content in sketches.items():
+        await redis.set(sketch_key(tenant, name, version, digest, unit), json.dumps(content), ex=ttl)
+    await redis.close()
+
+
+async def store(redis, key, version, data, config):
+    content = json.dumps({'version': version, 'created': time.time(), 'data': data}, cls=DjangoJSONEncoder)
+    await redis.set(key, content)
+    await redis.expire(key, config['ttl'] + config['stale'])
+
+
+async def refresh(key, tenant, version, compute, config):
+    redis = await get_redis()
+    try:
+        data = await compute()
+        await store(redis, key, version, data, config)
+    except Exception:
+        logger.exception('Metrics background refresh failed')
+    finally:
+        await redis.delete(f'{key}:refreshing')
+        await redis.close()
+
+
+async def cached_results(tenant, timezone, body, compute):
+    """Result of ``compute()`` cached by tenant, body, timezone and time bucket.
+
+    Entries are also tied to the write version of the model, bumped by
+    ``invalidate``. With ``stale`` configured, expired or outdated entries are
+    returned right away while a single background task recomputes them.
+    """
+    config = get_config()
+    if not config:
+        return await compute()
+
+    key = result_key(tenant, timezone, body)
+    name = normalize_name(body.get('model'))
+
+    redis = await get_redis()
+    cached, version = await redis.mget(key, version_key(tenant, name))
+    version = version or '0'
+
+    if cached:
+        cached = json.loads(cached)
+        fresh = cached['version'] == version and time.time() - cached['created'] < config['ttl']
+
+        if fresh:
+            await redis.close()
+            return cached['data']
+
+        if config['stale']:
+            # Só uma requisição dispara o recálculo
+            if await redis.set(f'{key}:refreshing', 1, ex=max(config['ttl'], 10), nx=True):
+                task = asyncio.create_task(refresh(key, tenant, version, compute, config))
+                background.add(task)
+                task.add_done_callback(background.discard)
+
+            await redis.close()
+            return cached['data']
+
+    data = await compute()
+    await store(redis, key, version, data, config)
+    await redis.close()
+
+    return data
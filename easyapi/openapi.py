@@ -0,0 +1,316 @@
+import hashlib
+import json
+import re
+
+from .base import BaseResource
+from .filter_schema import field_lookups, model_field
+
+OPENAPI_VERSION = '3.0.3'
+
+TYPES = {
+    'AutoField': {'type': 'integer'},
+    'BigAutoField': {'type': 'integer', 'format': 'int64'},
+    'SmallAutoField': {'type': 'integer'},
+    'IntegerField': {'type': 'integer'},
+    'BigIntegerField': {'type': 'integer', 'format': 'int64'},
+    'SmallIntegerField': {'type': 'integer'},
+    'PositiveIntegerField': {'type': 'integer', 'minimum': 0},
+    'PositiveBigIntegerField': {'type': 'integer', 'format': 'int64', 'minimum': 0},
+    'PositiveSmallIntegerField': {'type': 'integer', 'minimum': 0},
+    'ForeignKey': {'type': 'integer'},
+    'OneToOneField': {'type': 'integer'},
+    'FloatField': {'type': 'number', 'format': 'double'},
+    'DecimalField': {'type': 'number'},
+    'BooleanField': {'type': 'boolean'},
+    'NullBooleanField': {'type': 'boolean'},
+    'DateField': {'type': 'string', 'format': 'date'},
+    'DateTimeField': {'type': 'string', 'format': 'date-time'},
+    'TimeField': {'type': 'string', 'format': 'time'},
+    'DurationField': {'type': 'string'},
+    'EmailField': {'type': 'string', 'format': 'email'},
+    'URLField': {'type': 'string', 'format': 'uri'},
+    'UUIDField': {'type': 'string', 'format': 'uuid'},
+    'JSONField': {'type': 'object'},
+    'ManyToManyField': {'type': 'array', 'items': {'type': 'integer'}},
+}
+
+re_group = re.compile(r'\((?:\?P<(?P<name>\w+)>|(?!\?))[^()]*\)')
+
+
+def field_schema(model, name):
+    field = model_field(model, name) if model else None
+    if not field:
+        return {'type': 'string'}
+
+    schema = dict(TYPES.get(field.get_internal_type(), {'type': 'string'}))
+    if getattr(field, 'null', False):
+        schema['nullable'] = True
+    if getattr(field, 'choices', None):
+        schema['enum'] = [choice for choice, _ in field.flatchoices]
+    if getattr(field, 'max_length', None) and schema['type'] == 'string':
+        schema['maxLength'] = field.max_length
+    if getattr(field, 'verbose_name', None):
+        schema['description'] = str(field.verbose_name)
+
+    return schema
+
+
+def object_schema(model, fields, related_fields=None, m2m_fields=None):
+    properties = {}
+    for name, related in (m2m_fields or {}).items():
+        related_model = getattr(model_field(model, name), 'related_model', None)
+        properties[name] = {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {field: field_schema(related_model, field) for field in related},
+            },
+        }
+
+    for name, related in (related_fields or {}).items():
+        related_model = getattr(model_field(model, name), 'related_model', None)
+        leaf = name.split('__')[-1]
+        properties[leaf] = {
+            'type': 'object',
+            'nullable': True,
+            'properties': {field: field_schema(related_model, field) for field in related},
+        }
+
+    for name in fields:
+        properties[name] = field_schema(model, name)
+
+    return {'type': 'object', 'properties': properties}
+
+
+def endpoint_path(route):
+    """Turn an endpoint regex (``'contacts(.*)$'``) into its OpenAPI base path."""
+    route = route.lstrip('^')
+    base = re.split(r'[\\\[\](){}.*+?|$]', route, maxsplit=1)[0]
+    return '/' + base.strip('/')
+
+
+def route_path(base, route):
+    """Turn a custom route regex (``r'(\\d*)/accept$'``) into an OpenAPI path."""
+    params = []
+
+    def replace(match):
+        name = match['name'] or ('id' if not params else f'param{len(params)}')
+        params.append(name)
+        return '{' + name + '}'
+
+    path = re_group.sub(replace, route['path'].strip('^$'))
+    path = path.replace('\\', '')
+    return f'{base}/{path.lstrip("/")}', params
+
+
+def path_parameter(name):
+    return {'name': name, 'in': 'path', 'required': True, 'schema': {'type': 'string'}}
+
+
+def query_parameter(name, schema, description=None):
+    parameter = {'name': name, 'in': 'query', 'required': False, 'schema': schema}
+    if description:
+        parameter['description'] = description
+    return parameter
+
+
+def list_parameters(resource):
+    model = resource.model
+    parameters = [
+        query_parameter('page', {'type': 'integer', 'default': resource.page}),
+        query_parameter('limit', {'type': 'integer', 'default': resource.limit}),
+        query_parameter('count', {'type': 'boolean'}, 'Return only the total of objects'),
+        query_parameter('fields', {'type': 'string'}, 'Comma separated list of fields'),
+        query_parameter('filter', {'type': 'string'}, 'JSON encoded segment conditions'),
+        query_parameter(
+            'ids', {'type': 'string'}, f'Comma separated ids, at most {resource.max_batch_ids}, returns objects and missing'
+        ),
+    ]
+
+    if resource.order_fields:
+        order = []
+        for field in resource.order_fields:
+            order += [field, f'-{field}']
+        parameters.append(query_parameter('order_by', {'type': 'string', 'enum': order}))
+
+    if resource.search_fields:
+        parameters.append(query_parameter(
+            'search', {'type': 'string'},
+            f'{resource.search_operator} on: ' + ', '.join(resource.search_fields)
+        ))
+
+    for field in resource.filter_fields:
+        parameters.append(query_parameter(field, field_schema(model, field)))
+        for lookup in field_lookups(model_field(model, field) if model else None):
+            if lookup == 'in':
+                parameters.append(query_parameter(f'{field}__in', {'type': 'string'}, 'Comma separated values'))
+                continue
+
+            schema = {'type': 'boolean'} if lookup == 'isnull' else field_schema(model, field)
+            parameters.append(query_parameter(f'{field}__{lookup}', schema))
+
+    return parameters
+
+
+def json_body(schema):
+    return {'required': True, 'content': {'application/json': {'schema': schema}}}
+
+
+def json_response(schema, description='Success'):
+    return {'description': description, 'content': {'application/json': {'schema': schema}}}
+
+
+def resource_paths(name, route, resource, components):
+    base = endpoint_path(route)
+    methods = resource.allowed_methods
+    model = resource.model
+    paths = {}
+    tags = [name]
+
+    if model:
+        fields = resource.model_fields()
+        list_fields, edit_fields = fields['list_fields'], fields['edit_fields']
+        components[name] = object_schema(model, edit_fields, resource.edit_related_fields)
+        components[f'{name}List'] = object_schema(
+            model, list_fields, resource.list_related_fields, resource.list_m2m_fields
+        )
+        update_fields = resource.update_fields or edit_fields
+        create_fields = resource.create_fields or edit_fields
+        components[f'{name}Update'] = object_schema(model, update_fields)
+        components[f'{name}Create'] = object_schema(model, create_fields)
+
+        ref = {'$ref': f'#/components/schemas/{name}'}
+        list_ref = {'$ref': f'#/components/schemas/{name}List'}
+
+        collection = {}
+        if 'get' in methods:
+            collection['get'] = {
+                'tags': tags,
+                'operationId': f'list{name}',
+                'parameters': list_parameters(resource),
+                'responses': {'200': json_response({
+                    'type': 'object',
+                    'properties': {
+                        'meta': {'type': 'object'},
+                        'objects': {'type': 'array', 'items': list_ref},
+                    },
+                })},
+            }
+        if 'post' in methods:
+            collection['post'] = {
+                'tags': tags,
+                'operationId': f'create{name}',
+                'requestBody': json_body({'$ref': f'#/components/schemas/{name}Create'}),
+                'responses': {'200': json_response(ref)},
+            }
+        if collection:
+            paths[base] = collection
+
+        detail = {}
+        if 'get' in methods:
+            detail['get'] = {
+                'tags': tags,
+                'operationId': f'get{name}',
+                'responses': {'200': json_response(ref), '404': {'description': 'Not found'}},
+            }
+        if 'patch' in methods:
+            detail['patch'] = {
+                'tags': tags,
+                'operationId': f'update{name}',
+                'requestBody': json_body({'$ref': f'#/components/schemas/{name}Update'}),
+                'responses': {'200': json_response(ref), '404': {'description': 'Not found'}},
+            }
+        if 'delete' in methods:
+            detail['delete'] = {
+                'tags': tags,
+                'operationId': f'delete{name}',
+                'responses': {'200': json_response({'type': 'object'})},
+            }
+        if 'get' in methods:
+            paths[f'{base}/batch'] = {'post': {
+                'tags': tags,
+                'operationId': f'batch{name}',
+                'requestBody': json_body({
+                    'type': 'object',
+                    'properties': {'ids': {'type': 'array', 'maxItems': resource.max_batch_ids}},
+                }),
+                'responses': {'200': json_response({
+                    'type': 'object',
+                    'properties': {
+                        'objects': {'type': 'array', 'items': ref},
+                        'missing': {'type': 'array'},
+                    },
+                })},
+            }}
+
+        if detail:
+            detail['parameters'] = [path_parameter('id')]
+            paths[f'{base}/{{id}}'] = detail
+
+    for custom in resource.routes:
+        path, params = route_path(base, custom)
+        operations = paths.setdefault(path, {})
+        if params:
+            operations['parameters'] = [path_parameter(param) for param in params]
+        for method in custom.get('allowed_methods') or methods:
+            operation = {
+                'tags': tags,
+                'operationId': f'{custom["func"]}{name}{method.capitalize()}',
+                'responses': {'200': json_response({'type': 'object'})},
+            }
+            if method in ['post', 'patch']:
+                operation['requestBody'] = json_body({'type': 'object'})
+            operations[method] = operation
+
+    return paths
+
+
+def build_schema(endpoints, title='easyapi', version='1.0.0'):
+    """OpenAPI document for the resources registered in ``get_routes``.
+
+    Only class attributes are read, so no resource is instantiated and the
+    database is never touched.
+    """
+    paths = {}
+    components = {}
+
+    for route, view in endpoints.items():
+        if not (isinstance(view, type) and issubclass(view, BaseResource)):
+            continue
+
+        name = view.__name__
+        paths.update(resource_paths(name, route, view, components))
+
+    paths['/metrics'] = {
+        'post': {
+            'tags': ['Metrics'],
+            'operationId': 'getMetrics',
+            'requestBody': json_body({'type': 'object'}),
+            'responses': {'200': json_response({'type': 'object'})},
+        }
+    }
+
+    return {
+        'openapi': OPENAPI_VERSION,
+        'info': {'title': title, 'version': version},
+        'paths': paths,
+        'components': {'schemas': components},
+    }
+
+
+class Schema:
+    """Lazily built OpenAPI document, kept as encoded bytes and its ETag."""
+
+    def __init__(self, endpoints, **kwargs):
+        self.endpoints = endpoints
+        self.kwargs = kwargs
+        self.content = None
+        self.etag = None
+
+    def get(self):
+        if self.content is None:
+            schema = build_schema(self.endpoints, **self.kwargs)
+            self.content = json.dumps(schema, separators=(',', ':'), default=str).encode('utf-8')
+            self.etag = '"{}"'.format(hashlib.sha1(self.content).hexdigest())
+
+        return self.content, self.etag
@@ -0,0 +1,32 @@
+from contextvars import ContextVar
+import time
+
+from django.db.backends.signals import connection_created
+
+# Objetos com add_query(sql, elapsed, alias) que recebem as queries da requisição
+query_observers = ContextVar('query_observers', default=())
+
+
+def observe_queries(execute, sql, params, many, context):
+    observers = query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        alias = context['connection'].alias
+        for observer in observers:
+            observer.add_query(sql, elapsed, alias)
+
+
+def install_observer(sender, connection, **kwargs):
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_queries)
+
+
+# As conexões dos tenants são criadas dinamicamente, então o wrapper é
+# instalado em toda conexão aberta e só age quando há observadores ativos
+connection_created.connect(install_observer)
@@ -0,0 +1,137 @@
+from threading import Lock
+
+from django.apps import apps
+from django.conf import settings
+
+from .exception import HTTPException
+
+DATE = ['DateField', 'DateTimeField']
+
+
+def metric_name(model):
+    """Name used in the ``model`` key of a metrics body, ex: ``contacts_Contact``.
+
+    Models living in ``modules/<module>/models.py`` use the module name, as the
+    old ``import_module`` lookup did; other models use their app label.
+    """
+    parts = model.__module__.split('.')
+    if len(parts) > 2 and parts[0] == 'modules':
+        module = parts[1]
+    else:
+        module = model._meta.app_label
+
+    return f'{module.lower()}_{model.__name__}'
+
+
+def normalize_name(name):
+    if not isinstance(name, str) or '_' not in name:
+        raise HTTPException(400, 'Invalid model')
+
+    module, class_name = name.split('_', 1)
+    return f'{module.lower()}_{class_name}'
+
+
+class MetricModel:
+    """A model enabled for metrics, with its field types precomputed.
+
+    ``field_types`` maps every concrete field, and the concrete fields of
+    models one foreign key away (``company__name``), to its internal type.
+    ``group_fields`` and ``calc_fields`` are None when every field is allowed.
+    """
+
+    def __init__(self, model, group_fields=None, calc_fields=None):
+        self.model = model
+        self.name = metric_name(model)
+        self.group_fields = set(group_fields) if group_fields is not None else None
+        self.calc_fields = set(calc_fields) if calc_fields is not None else None
+        self.field_types = {}
+
+        for field in model._meta.concrete_fields:
+            self.field_types[field.name] = field.get_internal_type()
+            if field.is_relation:
+                self.field_types[field.attname] = field.target_field.get_internal_type()
+                for related in field.related_model._meta.concrete_fields:
+                    self.field_types[f'{field.name}__{related.name}'] = related.get_internal_type()
+
+    def field_type(self, name):
+        return self.field_types.get(name)
+
+    def is_date(self, name):
+        return self.field_types.get(name) in DATE
+
+    def check_group(self, fields):
+        for field in fields:
+            if self.group_fields is not None and field not in self.group_fields:
+                raise HTTPException(403, f'Group by {field} is not allowed')
+
+    def check_calc(self, fields):
+        for field in fields:
+            if self.calc_fields is not None and field not in self.calc_fields:
+                raise HTTPException(403, f'Calc on {field} is not allowed')
+
+
+class Registry:
+    """Models available to ``Metrics``, built once from Django's app registry.
+
+    With ``settings.EASYAPI_METRICS_MODELS`` only the listed models are
+    enabled, as ``'app_label.Model'`` strings or as a dict::
+
+        EASYAPI_METRICS_MODELS = {
+            'contacts.Contact': {
+                'group_fields': ['status', 'owner_id'],
+                'calc_fields': ['id', 'amount'],
+            },
+        }
+
+    Without it, every model under ``modules.<module>.models`` is enabled with all
+    of its fields.
+    """
+
+    def __init__(self):
+        self.models = None
+        self.lock = Lock()
+
+    def build(self):
+        models = {}
+        allowed = getattr(settings, 'EASYAPI_METRICS_MODELS', None)
+
+        if allowed is None:
+            for model in apps.get_models():
+                if model.__module__.startswith('modules.'):
+                    metric = MetricModel(model)
+                    models[metric.name] = metric
+
+        else:
+            if not isinstance(allowed, dict):
+                allowed = {label: {} for label in allowed}
+
+            for label, options in allowed.items():
+                metric = MetricModel(
+                    apps.get_model(label),
+                    options.get('group_fields'),
+                    options.get('calc_fields'),
+                )
+                models[metric.name] = metric
+
+        return models
+
+    def all(self):
+        if self.models is None:
+            with self.lock:
+                if self.models is None:
+                    self.models = self.build()
+
+        return self.models
+
+    def get(self, name):
+        metric = self.all().get(normalize_name(name))
+        if not metric:
+            raise HTTPException(400, f'Invalid model: {name}')
+
+        return metric
+
+    def clear(self):
+        self.models = None
+
+
+registry = Registry()
@@ -0,0 +1,520 @@
+import calendar
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum, UniqueConstraint
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, Trunc
+from django.urls import get_resolver
+from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_date, parse_datetime
+import pytz
+
+USE_TZ = settings.USE_TZ
+
+GRANULARITIES = ['month', 'day', 'hour']
+
+# Agrupamentos de data que cada granularidade consegue responder
+ANSWERS = {
+    'hour': ['hour', 'day', 'week', 'month', 'quarter', 'year', 'weekday', 'weekdayhour'],
+    'day': ['day', 'week', 'month', 'quarter', 'year', 'weekday'],
+    'month': ['month', 'quarter', 'year'],
+}
+
+MEASURES = {'count': Count, 'sum': Sum, 'min': Min, 'max': Max}
+
+# Como somar novamente as medidas de vários buckets
+COMBINE = {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'}
+
+LABELS = {
+    'hour': '%Y-%m-%d %H',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+LOOKUPS = [
+    'exact', 'iexact', 'in', 'gt', 'gte', 'lt', 'lte', 'isnull', 'contains', 'icontains',
+    'startswith', 'istartswith', 'endswith', 'iendswith', 'range',
+]
+
+
+def measure_name(calc, field):
+    return f'{calc}_{field}'
+
+
+def unique_on(model, fields):
+    """Whether ``model`` has a unique constraint (or ``unique_together``) on exactly ``fields``."""
+    fields = set(fields)
+    constraints = [
+        constraint.fields for constraint in model._meta.constraints
+        if isinstance(constraint, UniqueConstraint) and constraint.condition is None
+    ]
+    return any(set(unique) == fields for unique in [*constraints, *model._meta.unique_together])
+
+
+class Rollup:
+    """A table with ``source`` pre-aggregated by a date bucket and group fields.
+
+    ``model`` must have a ``bucket`` datetime field (the start of the bucket),
+    one field per group, one per measure, named ``<calc>_<field>``, and a
+    unique constraint on ``bucket`` and the groups::
+
+        class ContactResource(BaseResource):
+            model = Contact
+            rollups = [
+                Rollup(
+                    ContactDaily, date_field='created_at', granularity='day',
+                    groups=['status', 'company_id'],
+                    measures=[('count', 'id'), ('sum', 'amount')],
+                ),
+            ]
+
+    Metrics bodies covered by a rollup are answered from it. Writes made through
+    the resource recompute the affected rows; ``RollupCommand`` rebuilds them.
+    """
+
+    def __init__(
+        self, model, date_field, granularity, groups=None, measures=None, source=None, timezone=None
+    ):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f'Rollup granularity must be one of {", ".join(GRANULARITIES)}')
+
+        self.model = model
+        self.source = source
+        self.date_field = date_field
+        self.granularity = granularity
+        self.groups = list(groups or [])
+        self.measures = [tuple(measure) for measure in (measures or [('count', 'id')])]
+        self.timezone = pytz.timezone(timezone or settings.TIME_ZONE)
+
+        # Sem ela, dois writes no mesmo bucket criam linhas duplicadas
+        if not unique_on(model, ['bucket', *self.groups]):
+            raise ValueError(
+                f'{model.__name__} needs a unique constraint on {", ".join(["bucket", *self.groups])}'
+            )
+
+    def __repr__(self):
+        return f'<Rollup {self.model.__name__}>'
+
+    # Buckets
+
+    def floor(self, value):
+        """Start of the bucket containing ``value``."""
+        if USE_TZ:
+            value = value.astimezone(self.timezone).replace(tzinfo=None)
+
+        if self.granularity == 'hour':
+            value = value.replace(minute=0, second=0, microsecond=0)
+        elif self.granularity == 'day':
+            value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            value = value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        return self.timezone.localize(value) if USE_TZ else value
+
+    def next(self, bucket):
+        """Start of the bucket after ``bucket``."""
+        if self.granularity == 'hour':
+            return bucket + timedelta(hours=1)
+
+        local = bucket.astimezone(self.timezone).replace(tzinfo=None) if USE_TZ else bucket
+        if self.granularity == 'day':
+            local += timedelta(days=1)
+        else:
+            local += relativedelta(months=1)
+
+        return self.timezone.localize(local) if USE_TZ else local
+
+    def to_datetime(self, value):
+        """``value`` as a datetime, aware when USE_TZ is on, or None."""
+        if isinstance(value, str):
+            try:
+                parsed = parse_datetime(value) or parse_date(value)
+            except ValueError:
+                return None
+            if parsed and not isinstance(parsed, datetime):
+                parsed = datetime(parsed.year, parsed.month, parsed.day)
+            value = parsed
+
+        if not isinstance(value, datetime):
+            return None
+
+        if USE_TZ and django_timezone.is_naive(value):
+            # Como o Django interpreta datas sem timezone nos filtros
+            value = django_timezone.make_aware(value, django_timezone.get_default_timezone())
+
+        return value
+
+    def aligned(self, start, end):
+        """Whether a ``__gte start`` / ``__lte end`` period covers whole buckets."""
+        if start is not None and self.floor(start) != start:
+            return False
+
+        if end is not None:
+            following = self.next(self.floor(end))
+            if following - end > timedelta(seconds=1):
+                return False
+
+        return True
+
+    # Roteamento
+
+    def covers(self, query, timezone):
+        """Whether the metrics ``query`` can be answered from this rollup."""
+        if query['distinct'] or query['extra'] or query['metric'].model is not self.source:
+            return False
+
+        on_field = query['on_field'] or 'id'
+        if not isinstance(on_field, str) or not self.formulas(query['calc'], on_field):
+            return False
+
+        fields = [*query['groups'], *query['additional_fields']]
+        if any(field not in self.groups for field in fields):
+            return False
+
+        for key in query['filters']:
+            parts = key.split('__')
+            if len(parts) == 2 and parts[1] in LOOKUPS:
+                parts = parts[:1]
+            if len(parts) != 1 or parts[0] not in self.groups:
+                return False
+
+        names = [*fields, *query['calc']]
+        if any(str(field).lstrip('-') not in names for field in query['order']):
+            return False
+
+        date_group = query['date_group']
+        if date_group:
+            if date_group.get('field') != self.date_field:
+                return False
+            if (date_group.get('group_by') or '').lower() not in ANSWERS[self.granularity]:
+                return False
+
+        period = query['period']
+        if period and (period.get('start_date') or period.get('end_date') or
+                       period.get('start_delta') or period.get('end_delta')):
+            if period.get('field') != self.date_field:
+                return False
+
+            start = self.to_datetime(query['start_date']) if query['start_date'] else None
+            end = self.to_datetime(query['end_date']) if query['end_date'] else None
+            if (query['start_date'] and not start) or (query['end_date'] and not end):
+                return False
+
+            if not self.aligned(start, end):
+                return False
+
+        if (date_group or period) and timezone.zone != self.timezone.zone:
+            return False
+
+        return True
+
+    def formulas(self, calc, field):
+        """Measures needed by each formula, or None if one is not available."""
+        needed = {}
+        for formula in calc:
+            if formula == 'avg':
+                measures = [('sum', field), ('count', field)]
+            elif formula in MEASURES:
+                measures = [(formula, field)]
+            else:
+                return None
+
+            if any(measure not in self.measures for measure in measures):
+                return None
+            needed[formula] = measures
+
+        return needed
+
+    def needed(self, query):
+        needed = self.formulas(query['calc'], query['on_field'] or 'id')
+        measures = {measure_name(*measure) for measures in needed.values() for measure in measures}
+        return needed, measures
+
+    def rows(self, query, measures):
+        rows = self.model.objects.filter(**query['filters'])
+        if query['start_date']:
+            rows = rows.filter(bucket__gte=self.to_datetime(query['start_date']))
+        if query['end_date']:
+            rows = rows.filter(bucket__lte=self.floor(self.to_datetime(query['end_date'])))
+
+        aggregates = {
+            name: MEASURES[COMBINE[name.split('_', 1)[0]]](name) for name in measures
+        }
+        return rows, aggregates
+
+    async def aggregate(self, query):
+        """``{'total': ...}`` of an ungrouped metrics query, from the rollup."""
+        needed, measures = self.needed(query)
+        rows, aggregates = self.rows(query, measures)
+
+        data = await rows.aaggregate(**aggregates)
+        return {'total': self.compute(query['calc'][0], needed, data)}
+
+    async def group_by(self, query):
+        """Rows and groups like ``calc.group_by``, from the rollup."""
+        needed, measures = self.needed(query)
+        rows, aggregates = self.rows(query, measures)
+
+        date_group = query['date_group']
+        groups = list(dict.fromkeys([*query['groups'], *query['additional_fields']]))
+        keys = list(query['groups'])
+        columns = groups
+
+        if date_group:
+            # Buckets menores são somados pelo banco no agrupamento pedido (ex: dias em meses)
+            group_by = date_group['group_by'].lower()
+            periods = self.periods(group_by)
+            rows = rows.annotate(**periods)
+            columns = [*periods, *groups]
+            keys.insert(0, 'extracted_' + self.date_field)
+
+        results = []
+        async for row in rows.values(*columns).annotate(**aggregates):
+            result = {}
+            if date_group:
+                result[keys[0]] = self.label(row, group_by)
+
+            for group in groups:
+                result[group] = row[group]
+            for formula in query['calc']:
+                result[formula] = self.compute(formula, needed, row)
+
+            results.append(result)
+
+        order = list(query['order'])
+        if order and date_group:
+            order.insert(0, keys[0])
+
+        # Ordenação estável, da última chave para a primeira, com nulos por último
+        for field in reversed(order):
+            name = field.lstrip('-')
+            results.sort(
+                key=lambda result: (result[name] is None, result[name] if result[name] is not None else 0),
+                reverse=field.startswith('-'),
+            )
+
+        if query['limit']:
+            results = results[:query['limit']]
+
+        return results, keys
+
+    def compute(self, formula, needed, data):
+        names = [measure_name(*measure) for measure in needed[formula]]
+        values = [data[name] for name in names]
+
+        if formula == 'avg':
+            total, count = values
+            return float(total) / count if count else None
+
+        value = values[0]
+        if formula == 'count':
+            return int(value or 0)
+        if formula == 'sum' and value is not None:
+            # Como em get_formulas, sum é sempre Float
+            return float(value)
+
+        return value
+
+    def periods(self, group_by):
+        tzinfo = self.timezone if USE_TZ else None
+        if group_by == 'weekday':
+            return {'weekday': ExtractIsoWeekDay('bucket', tzinfo=tzinfo)}
+        if group_by == 'weekdayhour':
+            return {
+                'weekday': ExtractIsoWeekDay('bucket', tzinfo=tzinfo),
+                'hour': ExtractHour('bucket', tzinfo=tzinfo),
+            }
+
+        return {'period': Trunc('bucket', group_by, tzinfo=tzinfo)}
+
+    def label(self, row, group_by):
+        """Label ``calc.EXTRACT`` gives to the period of ``row``."""
+        if group_by in ['weekday', 'weekdayhour']:
+            if row['weekday'] is None:
+                return None
+
+            label = calendar.day_name[row['weekday'] - 1]
+            return f'{label} {row["hour"]:02d}' if group_by == 'weekdayhour' else label
+
+        period = row['period']
+        if period is None:
+            return None
+
+        if USE_TZ:
+            period = period.astimezone(self.timezone)
+
+        if group_by == 'quarter':
+            return f'{period.year} {(period.month - 1) // 3 + 1}Q'
+        if group_by == 'week':
+            year, week, _ = period.isocalendar()
+            return f'{year}-W{week:02d}'
+
+        return period.strftime(LABELS[group_by])
+
+    # Manutenção
+
+    def source_rows(self, using=None):
+        manager = self.source.objects
+        return manager.using(using) if using else manager.all()
+
+    def rollup_rows(self, using=None):
+        manager = self.model.objects
+        return manager.using(using) if using else manager.all()
+
+    def aggregations(self):
+        return {
+            measure_name(calc, field): MEASURES[calc](field) for calc, field in self.measures
+        }
+
+    def rebuild(self, start=None, end=None, using=None):
+        """Recompute the buckets between ``start`` and ``end`` (everything by default)."""
+        source = self.source_rows(using)
+        rollups = self.rollup_rows(using)
+
+        if start is not None:
+            start = self.floor(start)
+            source = source.filter(**{f'{self.date_field}__gte': start})
+            rollups = rollups.filter(bucket__gte=start)
+
+        if end is not None:
+            end = self.next(self.floor(end))
+            source = source.filter(**{f'{self.date_field}__lt': end})
+            rollups = rollups.filter(bucket__lt=end)
+
+        trunc = Trunc(self.date_field, self.granularity, tzinfo=self.timezone if USE_TZ else None)
+        rows = source.annotate(bucket=trunc).values('bucket', *self.groups).annotate(**self.aggregations())
+
+        created = 0
+        with transaction.atomic(using=using or rollups.db):
+            rollups.delete()
+
+            batch = []
+            for row in rows.iterator():
+                batch.append(self.model(**row))
+                if len(batch) >= 1000:
+                    created += len(self.model.objects.using(rollups.db).bulk_create(batch))
+                    batch = []
+
+            created += len(self.model.objects.using(rollups.db).bulk_create(batch))
+
+        return created
+
+    async def refresh(self, values):
+        """Recompute the rows of the buckets and groups in ``values``.
+
+        ``values`` are dicts with the date and group fields of created, updated
+        (before and after) or deleted objects.
+        """
+        cells = {}
+        for value in values:
+            if not value:
+                continue
+
+            date = value.get(self.date_field)
+            bucket = self.floor(date) if date else None
+            groups = tuple(value.get(group) for group in self.groups)
+            cells[(bucket, groups)] = True
+
+        for bucket, groups in cells:
+            source = self.source_rows()
+            if bucket is None:
+                source = source.filter(**{f'{self.date_field}__isnull': True})
+            else:
+                source = source.filter(**{
+                    f'{self.date_field}__gte': bucket, f'{self.date_field}__lt': self.next(bucket)
+                })
+
+            cell = {}
+            for group, value in zip(self.groups, groups):
+                if value is None:
+                    source = source.filter(**{f'{group}__isnull': True})
+                else:
+                    source = source.filter(**{group: value})
+                cell[group] = value
+
+            data = await source.aaggregate(rollup_rows=Count('pk'), **self.aggregations())
+            rows = self.rollup_rows().filter(bucket=bucket, **cell)
+
+            if not data.pop('rollup_rows'):
+                await rows.adelete()
+            else:
+                # Trava a linha e, com a unique constraint, writes concorrentes não a duplicam
+                await self.rollup_rows().aupdate_or_create(bucket=bucket, **cell, defaults=data)
+
+
+class Registry:
+    """Rollups declared by resources, by source model."""
+
+    def __init__(self):
+        self.rollups = {}
+
+    def register(self, rollup):
+        rollups = self.rollups.setdefault(rollup.source, [])
+        if rollup not in rollups:
+            rollups.append(rollup)
+
+    def for_model(self, model):
+        return self.rollups.get(model, [])
+
+    def all(self):
+        return [rollup for rollups in self.rollups.values() for rollup in rollups]
+
+    def fields(self, model):
+        """Fields of ``model`` read by its rollups (date and group fields)."""
+        fields = []
+        for rollup in self.for_model(model):
+            fields += [rollup.date_field, *rollup.groups]
+
+        return list(dict.fromkeys(fields))
+
+    def find(self, query, timezone):
+        """The smallest rollup covering ``query``: coarsest granularity, fewest groups."""
+        candidates = [
+            rollup for rollup in self.for_model(query['metric'].model)
+            if rollup.covers(query, timezone)
+        ]
+        if not candidates:
+            return None
+
+        return min(
+            candidates, key=lambda rollup: (GRANULARITIES.index(rollup.granularity), len(rollup.groups))
+        )
+
+
+registry = Registry()
+
+
+class RollupCommand(BaseCommand):
+    """Rebuilds the rollups declared by the resources.
+
+    easyapi is not a Django app, so add it to one of yours as
+    ``management/commands/rollup.py``::
+
+        from easyapi.rollup import RollupCommand as Command
+    """
+
+    help = 'Rebuild the easyapi rollup tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help='rollup model name, ex: ContactDaily')
+        parser.add_argument('--start', help='first date to rebuild, ex: 2024-01-01')
+        parser.add_argument('--end', help='last date to rebuild')
+        parser.add_argument('--database', help='database alias, ex: a tenant database')
+
+    def handle(self, *args, **options):
+        # Os rollups são registrados quando os resources são importados pelas urls
+        get_resolver().url_patterns
+
+        for rollup in registry.all():
+            if options['model'] and rollup.model.__name__ != options['model']:
+                continue
+
+            start = rollup.to_datetime(options['start']) if options['start'] else None
+            end = rollup.to_datetime(options['end']) if options['end'] else None
+            created = rollup.rebuild(start, end, using=options['database'])
+            if options['verbosity']:
+                self.stdout.write(f'{rollup.model.__name__}: {created} rows')
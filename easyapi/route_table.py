@@ -0,0 +1,103 @@
+import re
+
+re_flags = re.compile(r'\(\?[aiLmsux-]')
+
+# Metacaracteres que encerram o sufixo literal de uma rota
+SPECIAL = set('.^$*+?{}[]()|\\')
+
+
+def literal_suffix(path):
+    """Return the literal text a route path must end with, or ''.
+
+    Only end anchored paths (``...$``) without alternations or inline flags have
+    a usable suffix, e.g. ``r'(\\d*)/accept$'`` -> ``'/accept'``.
+    """
+    if not path.endswith('$') or path.endswith('\\$'):
+        return ''
+
+    if '|' in path or re_flags.search(path):
+        return ''
+
+    chars = []
+    i = len(path) - 2
+    while i >= 0:
+        char = path[i]
+        escaped = i > 0 and path[i - 1] == '\\' and not (i > 1 and path[i - 2] == '\\')
+
+        if escaped:
+            if char.isalnum():
+                break
+            chars.append(char)
+            i -= 2
+            continue
+
+        if char in SPECIAL:
+            break
+
+        chars.append(char)
+        i -= 1
+
+    return ''.join(reversed(chars))
+
+
+class RouteTable:
+    """Custom resource routes compiled once per resource class.
+
+    Every route path is compiled a single time and end anchored paths are
+    indexed by their literal suffix, so a request only runs the patterns of
+    the routes that can possibly match, in declaration order. The result is
+    the same route and groups as running ``re.search`` over every route.
+    """
+
+    def __init__(self, routes):
+        self.source = routes
+        self.routes = list(routes)
+        self.patterns = [re.compile(route['path']) for route in self.routes]
+
+        # {tamanho do sufixo: {sufixo: [índices das rotas]}}
+        self.suffixes = {}
+        # Rotas sem sufixo literal são sempre candidatas
+        self.always = []
+
+        for i, route in enumerate(self.routes):
+            suffix = literal_suffix(route['path'])
+            if suffix:
+                self.suffixes.setdefault(len(suffix), {}).setdefault(suffix, []).append(i)
+            else:
+                self.always.append(i)
+
+    def candidates(self, path):
+        # "$" também casa antes de um "\n" final
+        tail = path[:-1] if path.endswith('\n') else None
+
+        indexes = list(self.always)
+        for size, suffixes in self.suffixes.items():
+            found = suffixes.get(path[-size:])
+            if found:
+                indexes += found
+            if tail is not None:
+                found = suffixes.get(tail[-size:])
+                if found:
+                    indexes += found
+
+        if len(indexes) > 1:
+            indexes.sort()
+
+        return indexes
+
+    def match(self, path):
+        for index in self.candidates(path):
+            match = self.patterns[index].search(path)
+            if match:
+                return self.routes[index], match.groupdict()
+
+        return None, None
+
+    @classmethod
+    def for_resource(cls, resource):
+        table = resource.__dict__.get('_route_table')
+        if table is None or table.source is not resource.routes:
+            table = cls(resource.routes)
+            resource._route_table = table
+
+        return table
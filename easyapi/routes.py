@@ -2,6 +2,8 @@ from django.urls import path, re_path
 from django.http import HttpResponse
 
 from .calc_resource import Metrics
+from .conditional import not_modified
+from .openapi import Schema
 
 
 def get_route(route, view):
@@ -13,24 +15,16 @@ def get_route(route, view):
 
 
 def get_routes(endpoints):
+    schema = Schema(endpoints)
 
     def docs(request, *args, **kwargs):
-        for route, view in endpoints.items():
-            print(route, view)
-            print(view.model)
-            print(view.__dict__)
-            methods = view.allowed_methods
-            edit_fields = view.edit_fields
-            list_fields = view.edit_fields
-            update_fields = view.update_fields
-            print(methods, edit_fields, list_fields, update_fields)
-
-            model = view.model
-            if model:
-                print(model.__dict__)
-                print(view.fields)
-
-        return HttpResponse('Docs')
+        content, etag = schema.get()
+
+        response = not_modified(request, etag, None)
+        if response:
+            return response
+
+        return HttpResponse(content, content_type='application/json', headers={'ETag': etag})
 
     return [
         get_route(key, value) for key, value in endpoints.items()
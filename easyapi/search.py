@@ -0,0 +1,296 @@
+import copy
+from functools import reduce
+import operator
+import re
+import unicodedata
+
+from django.core.management.base import BaseCommand
+from django.db import connections, models, transaction
+from django.db.models import Q
+from django.urls import get_resolver
+
+# Nome da expressão de relevância usada para ordenar as buscas
+RELEVANCE = 'search_relevance'
+
+re_word = re.compile(r'\w+')
+
+# Operadores da busca booleana do MySQL
+re_boolean = re.compile(r'[+\-<>()~*"@]+')
+
+
+def words(text):
+    """Lowercase words of ``text`` without accents."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re_word.findall(text.lower())
+
+
+def id_match(term):
+    # isdigit aceita dígitos unicode ('²', '٣') que o int() não converte
+    return Q(pk=int(term)) if term.isascii() and term.isdigit() else Q(pk__in=[])
+
+
+class LikeSearch:
+    """``<field>__<search_operator>`` on every ``search_fields`` entry and id, joined by OR.
+
+    The default backend. With ``icontains`` it is a ``LIKE '%term%'``, which
+    can not use indexes.
+    """
+
+    source = None
+    fields = None
+
+    def bind(self, resource):
+        """Called on the copy of each resource class with a model (see ``bound``)."""
+        if self.source is None:
+            self.source = resource.model
+        if self.fields is None:
+            self.fields = list(resource.search_fields)
+
+    def bound(self, resource):
+        """Copy of the declared backend bound to ``resource``.
+
+        Subclasses inheriting the backend get their own copy, with their model
+        and ``search_fields``, instead of the one of the parent class.
+        """
+        declared = getattr(self, 'declared', self)
+        backend = copy.copy(declared)
+        backend.declared = declared
+        backend.bind(resource)
+        return backend
+
+    def filter(self, resource, queryset, term):
+        fields = resource.search_fields + ['id']
+        return queryset.filter(reduce(operator.or_, [
+            Q((f'{field}__{resource.search_operator}', term)) for field in fields
+        ]))
+
+    def relevance(self, queryset, term):
+        """Expression to order the results by, best first, or None."""
+        return None
+
+    async def index(self, id):
+        pass
+
+    async def remove(self, id):
+        pass
+
+
+class PrefixSearch(LikeSearch):
+    """``istartswith`` on every search field, a ``LIKE 'term%'`` using the column indexes.
+
+    Exact matches come first.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = fields
+
+    def filter(self, resource, queryset, term):
+        return queryset.filter(reduce(operator.or_, [
+            Q(**{f'{field}__istartswith': term}) for field in self.fields
+        ], id_match(term)))
+
+    def relevance(self, queryset, term):
+        return models.Case(
+            *[models.When(**{f'{field}__iexact': term}, then=models.Value(2)) for field in self.fields],
+            default=models.Value(1),
+            output_field=models.IntegerField(),
+        )
+
+
+class Match(models.Func):
+    """MySQL ``MATCH (columns) AGAINST (query IN BOOLEAN MODE)``."""
+    template = 'MATCH (%(expressions)s) AGAINST (%%s IN BOOLEAN MODE)'
+    output_field = models.FloatField()
+
+    def __init__(self, *fields, query):
+        super().__init__(*[models.F(field) for field in fields])
+        self.query = query
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return sql, (*params, self.query)
+
+
+class Matches(Match):
+    """``MATCH (...) AGAINST (...)`` as a condition of the WHERE."""
+    output_field = models.BooleanField()
+
+
+class FullTextSearch(LikeSearch):
+    """MySQL ``FULLTEXT`` search, ordered by its relevance.
+
+    Needs a ``FULLTEXT`` index with exactly the ``fields`` (columns of the
+    model itself). Every word of the term must be found, as a word prefix.
+    On other databases it falls back to ``LikeSearch``.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = fields
+
+    def query(self, term):
+        return ' '.join(f'+{word}*' for word in re_boolean.sub(' ', term).split())
+
+    def supported(self, queryset):
+        return connections[queryset.db].vendor == 'mysql'
+
+    def filter(self, resource, queryset, term):
+        if not self.supported(queryset):
+            return super().filter(resource, queryset, term)
+
+        query = self.query(term)
+        if not query:
+            return queryset.filter(id_match(term))
+
+        return queryset.filter(Q(Matches(*self.fields, query=query)) | id_match(term))
+
+    def relevance(self, queryset, term):
+        query = self.query(term)
+        if not self.supported(queryset) or not query:
+            return None
+
+        return Match(*self.fields, query=query)
+
+
+class TokenSearch(LikeSearch):
+    """Search on a token table kept current by easyapi from the write path.
+
+    ``model`` has ``object_id`` (indexed), ``token`` (indexed ``CharField`` of
+    ``max_length``) and ``weight``. Every word of the search fields is stored
+    with weight 2 and its prefixes from ``min_prefix`` letters with weight 1,
+    so each word of the term is an indexed equality lookup. Results must have
+    every word and are ordered by the sum of the matched weights.
+    """
+
+    def __init__(self, model, fields=None, min_prefix=2, max_length=32):
+        self.model = model
+        self.fields = fields
+        self.min_prefix = min_prefix
+        self.max_length = max_length
+
+    def bind(self, resource):
+        super().bind(resource)
+        registry.register(self)
+
+    def terms(self, term):
+        return list(dict.fromkeys(word[:self.max_length] for word in words(term)))
+
+    def tokens(self, values):
+        """``{token: weight}`` of the field values of one object."""
+        tokens = {}
+        for value in values:
+            if value is None:
+                continue
+
+            for word in words(value):
+                word = word[:self.max_length]
+                for size in range(self.min_prefix, len(word)):
+                    tokens.setdefault(word[:size], 1)
+                tokens[word] = 2
+
+        return tokens
+
+    def rows(self, objects):
+        for values in objects:
+            id = values.pop('pk')
+            for token, weight in self.tokens(values.values()).items():
+                yield self.model(object_id=id, token=token, weight=weight)
+
+    def index_for(self, queryset):
+        return self.model.objects.using(queryset.db)
+
+    def filter(self, resource, queryset, term):
+        terms = self.terms(term)
+        if not terms:
+            return queryset.filter(id_match(term))
+
+        index = self.index_for(queryset)
+        return queryset.filter(reduce(operator.and_, [
+            Q(pk__in=index.filter(token=token).values('object_id')) for token in terms
+        ]) | id_match(term))
+
+    def relevance(self, queryset, term):
+        terms = self.terms(term)
+        if not terms:
+            return None
+
+        weights = self.index_for(queryset).filter(
+            object_id=models.OuterRef('pk'), token__in=terms
+        ).values('object_id').annotate(total=models.Sum('weight')).values('total')
+        return models.Subquery(weights, output_field=models.IntegerField())
+
+    async def index(self, id):
+        values = await self.source.objects.filter(pk=id).values('pk', *self.fields).afirst()
+        await self.model.objects.filter(object_id=id).adelete()
+        if values:
+            await self.model.objects.abulk_create(list(self.rows([values])))
+
+    async def remove(self, id):
+        await self.model.objects.filter(object_id=id).adelete()
+
+    def rebuild(self, using=None):
+        """Recreate the whole token table from the source model."""
+        source = self.source.objects.using(using) if using else self.source.objects
+        index = self.model.objects.using(using) if using else self.model.objects
+
+        created = 0
+        with transaction.atomic(using=index.db):
+            index.all().delete()
+
+            batch = []
+            for row in self.rows(source.values('pk', *self.fields).iterator(chunk_size=2000)):
+                batch.append(row)
+                if len(batch) >= 1000:
+                    index.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+
+            index.bulk_create(batch)
+            created += len(batch)
+
+        return created
+
+
+class Registry:
+    """Token indexes declared by the resources, rebuilt by ``SearchIndexCommand``."""
+
+    def __init__(self):
+        self.indexes = {}
+
+    def register(self, index):
+        # Subclasses do mesmo resource têm cópias iguais do índice, reconstruído uma vez só
+        self.indexes.setdefault((index.model, index.source, tuple(index.fields)), index)
+
+    def all(self):
+        return list(self.indexes.values())
+
+
+registry = Registry()
+
+
+class SearchIndexCommand(BaseCommand):
+    """Rebuilds the ``TokenSearch`` tables declared by the resources.
+
+    easyapi is not a Django app, so add it to one of yours as
+    ``management/commands/search_index.py``::
+
+        from easyapi.search import SearchIndexCommand as Command
+    """
+
+    help = 'Rebuild the easyapi search token tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', help='token model name, ex: ContactToken')
+        parser.add_argument('--database', help='database alias, ex: a tenant database')
+
+    def handle(self, *args, **options):
+        # Os índices são registrados quando os resources são importados pelas urls
+        get_resolver().url_patterns
+
+        for index in registry.all():
+            if options['model'] and index.model.__name__ != options['model']:
+                continue
+
+            created = index.rebuild(using=options['database'])
+            if options['verbosity']:
+                self.stdout.write(f'{index.model.__name__}: {created} tokens')
@@ -0,0 +1,157 @@
+from contextlib import contextmanager
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('easyapi.timing')
+
+
+class Timing:
+    """Per request timings, in milliseconds, grouped by phase.
+
+    Phases measured more than once (ex: ``filters``) are accumulated. A phase
+    measured inside another one (``serialize`` inside ``handler``) is left out
+    of the outer one, so no time is counted twice. Queries executed on any
+    connection while the timing is active are counted in ``queries`` and
+    their time in ``db``.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        # Tempo das fases internas de cada fase aberta
+        self.nested = []
+        self.queries = 0
+        self.db = 0.0
+        self.total = None
+
+    def add(self, phase, elapsed):
+        self.phases[phase] = self.phases.get(phase, 0.0) + elapsed * 1000
+
+    @contextmanager
+    def measure(self, phase):
+        start = time.perf_counter()
+        self.nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add(phase, elapsed - self.nested.pop())
+            if self.nested:
+                self.nested[-1] += elapsed
+
+    def add_query(self, sql, elapsed, alias):
+        self.queries += 1
+        self.db += elapsed * 1000
+
+    def finish(self):
+        self.total = (time.perf_counter() - self.started) * 1000
+        return self
+
+    def header(self):
+        items = [f'{phase};dur={value:.2f}' for phase, value in self.phases.items()]
+        items.append(f'db;dur={self.db:.2f};desc="{self.queries} queries"')
+        if self.total is not None:
+            items.append(f'total;dur={self.total:.2f}')
+
+        return ', '.join(items)
+
+    def as_dict(self):
+        return {
+            'phases': {phase: round(value, 3) for phase, value in self.phases.items()},
+            'queries': self.queries,
+            'db': round(self.db, 3),
+            'total': round(self.total, 3) if self.total is not None else None,
+        }
+
+
+class NullTiming:
+    """Used when the timing middleware is not installed."""
+
+    queries = 0
+
+    @contextmanager
+    def measure(self, phase):
+        yield
+
+    def add(self, phase, elapsed):
+        pass
+
+    def add_query(self, sql, elapsed, alias):
+        pass
+
+
+NULL_TIMING = NullTiming()
+
+
+def get_timing(request):
+    return getattr(request, 'timing', None) or NULL_TIMING
+
+
+def log_sink(request, response, timing):
+    logger.info(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'status': getattr(response, 'status_code', None),
+        **timing.as_dict(),
+    }))
+
+
+def get_sink():
+    sink = getattr(settings, 'EASYAPI_TIMING_SINK', None)
+    if not sink:
+        return log_sink
+
+    return import_string(sink) if isinstance(sink, str) else sink
+
+
+class TimingMiddleware:
+    """Adds a ``Server-Timing`` header with the phases measured in ``dispatch``.
+
+    Every request is also sent to the sink configured in
+    ``settings.EASYAPI_TIMING_SINK`` (a callable or its dotted path receiving
+    ``request, response, timing``), a JSON log line by default.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sink = get_sink()
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timing = self.start(request)
+        response = self.get_response(request)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = self.start(request)
+        response = await self.get_response(request)
+        return self.finish(request, response, timing)
+
+    def start(self, request):
+        timing = Timing()
+        request.timing = timing
+        return timing
+
+    def finish(self, request, response, timing):
+        timing.finish()
+        response['Server-Timing'] = timing.header()
+
+        try:
+            self.sink(request, response, timing)
+        except Exception:
+            logger.exception('Timing sink failed')
+
+        return response
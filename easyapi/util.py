@@ -1,3 +1,6 @@
+from functools import lru_cache
+import importlib
+
 
 def make_list(data):
     if not data:
@@ -19,3 +22,33 @@ def normalize_field(name):
         return 'Null'
     else:
         return name
+
+
+class LazyModule:
+    """Module imported on first use, ex: ``pd = LazyModule('pandas')``.
+
+    Keeps heavy dependencies out of ``import easyapi``: only the requests that
+    use them pay for the import.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+
+        value = getattr(self._module, attr)
+        # Próximos acessos não passam mais pelo __getattr__
+        setattr(self, attr, value)
+        return value
+
+
+@lru_cache(maxsize=None)
+def optional_import(name):
+    """Module ``name``, or None when it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None